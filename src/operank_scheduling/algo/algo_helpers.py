@@ -18,3 +18,73 @@ def lazy_permute(in_lst: List) -> List:
         for j in range(i + 1, len(in_lst)):
             permutations.append((in_lst[i], in_lst[j]))
     return permutations
+
+
+def first_fit_decreasing(item_sizes: List[int], capacity: int) -> List[List[int]]:
+    """
+    Pack items into bins of the given capacity, longest first, each into the
+    first bin it fits in. Returns the item indices of every bin.
+    """
+    bins, bin_loads = list(), list()
+    for item_idx in sorted(
+        range(len(item_sizes)), key=lambda idx: item_sizes[idx], reverse=True
+    ):
+        for bin_idx, bin_load in enumerate(bin_loads):
+            if bin_load + item_sizes[item_idx] <= capacity:
+                bins[bin_idx].append(item_idx)
+                bin_loads[bin_idx] += item_sizes[item_idx]
+                break
+        else:
+            bins.append([item_idx])
+            bin_loads.append(item_sizes[item_idx])
+    return bins
+
+
+def best_fit_decreasing(item_sizes: List[int], capacity: int) -> List[List[int]]:
+    """
+    Pack items into bins of the given capacity, longest first, each into the
+    fullest bin it still fits in. Returns the item indices of every bin.
+    """
+    bins, bin_loads = list(), list()
+    for item_idx in sorted(
+        range(len(item_sizes)), key=lambda idx: item_sizes[idx], reverse=True
+    ):
+        best_bin_idx = None
+        for bin_idx, bin_load in enumerate(bin_loads):
+            if bin_load + item_sizes[item_idx] <= capacity and (
+                best_bin_idx is None or bin_load > bin_loads[best_bin_idx]
+            ):
+                best_bin_idx = bin_idx
+        if best_bin_idx is None:
+            bins.append([item_idx])
+            bin_loads.append(item_sizes[item_idx])
+        else:
+            bins[best_bin_idx].append(item_idx)
+            bin_loads[best_bin_idx] += item_sizes[item_idx]
+    return bins
+
+
+def l1_lower_bound(item_sizes: List[int], capacity: int) -> int:
+    """
+    The continuous bin packing bound: ceil(sum of sizes / capacity)
+    """
+    return -(-sum(item_sizes) // capacity)
+
+
+def l2_lower_bound(item_sizes: List[int], capacity: int) -> int:
+    """
+    The Martello-Toth L2 bin packing bound. For every threshold `alpha` <= capacity / 2,
+    items larger than half a bin each need their own bin, and the items between
+    `alpha` and half a bin can only partially fill the space those bins leave.
+    """
+    best_bound = l1_lower_bound(item_sizes, capacity)
+    thresholds = {0} | {size for size in item_sizes if size <= capacity / 2}
+    for alpha in thresholds:
+        large_items = [size for size in item_sizes if size > capacity - alpha]
+        big_items = [size for size in item_sizes if capacity / 2 < size <= capacity - alpha]
+        small_items = [size for size in item_sizes if alpha <= size <= capacity / 2]
+        space_left_by_big_items = len(big_items) * capacity - sum(big_items)
+        overflow = max(0, sum(small_items) - space_left_by_big_items)
+        bound = len(large_items) + len(big_items) + l1_lower_bound([overflow], capacity)
+        best_bound = max(best_bound, bound)
+    return best_bound
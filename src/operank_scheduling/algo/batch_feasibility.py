@@ -0,0 +1,159 @@
+import datetime
+from typing import Dict, List, Tuple
+
+import numpy as np
+from loguru import logger
+
+from ..models.operank_models import (
+    OperatingRoom,
+    Patient,
+    SchedulingContext,
+    Surgeon,
+)
+from ..models.room_day_schedule import RoomDaySchedule
+
+"""
+# General Idea
+    Answer "which (room, day, surgeon) can take this patient" for the whole waitlist
+    at once, with the same rules as `suggest_feasible_dates`:
+        1. The room has every requirement of the surgery (`capable`)
+        2. The room-day has a long-enough free timeslot (`max_free_slot`)
+        3. The surgeon is eligible for the surgery (`eligible`)
+        4. A long-enough window of the surgeon starts when the room becomes
+           available on that day (`surgeon_window`)
+    Feasibility is the broadcast AND of these arrays. Bookings only change the row
+    of their room-day and the column of their surgeon, so `record_booking` refreshes
+    just those instead of rebuilding the arrays.
+    Room-days are taken from the schedules when building - rebuild after rescheduling.
+"""
+
+
+def get_surgeon_window(surgeon: Surgeon, start_time: datetime.datetime) -> int:
+    """
+    Length in minutes of the surgeon's availability window that starts exactly at
+    `start_time` (see `Surgeon.is_surgeon_available_at`), or 0 if there is none.
+    """
+    if start_time.date() not in surgeon.availability:
+        return 0
+    return surgeon.availability.window_length(start_time)
+
+
+def get_max_free_slot(day_schedule: RoomDaySchedule) -> int:
+    return max(day_schedule.bin_counts(), default=0)
+
+
+class BatchFeasibility:
+    def __init__(self, patients: List[Patient], context: SchedulingContext) -> None:
+        self.patients = patients
+        self.context = context
+        self.patient_index = {patient.uuid: idx for idx, patient in enumerate(patients)}
+        self.surgeon_index = {
+            surgeon.name: idx for idx, surgeon in enumerate(context.surgeons)
+        }
+        room_index = {room.id: idx for idx, room in enumerate(context.rooms)}
+
+        self.room_days: List[Tuple[OperatingRoom, datetime.date]] = [
+            (room, day) for room in context.rooms for day in sorted(room.schedule)
+        ]
+        self.room_day_index: Dict[Tuple[str, datetime.date], int] = {
+            (room.id, day): idx for idx, (room, day) in enumerate(self.room_days)
+        }
+        self.room_day_to_room = np.array(
+            [room_index[room.id] for room, _ in self.room_days], dtype=int
+        )
+
+        # Patient arrays
+        surgeries = [context.get_surgery_by_patient(patient) for patient in patients]
+        self.durations = np.array([surgery.duration for surgery in surgeries])
+        self.capable = np.zeros((len(patients), len(context.rooms)), dtype=bool)
+        self.eligible = np.zeros((len(patients), len(context.surgeons)), dtype=bool)
+        for patient_idx, surgery in enumerate(surgeries):
+            for room in context.room_capabilities.find_rooms(surgery.requirements):
+                self.capable[patient_idx, room_index[room.id]] = True
+            for surgeon in context.get_eligible_surgeons(surgery):
+                self.eligible[patient_idx, self.surgeon_index[surgeon.name]] = True
+
+        # Room-day arrays
+        self.max_free_slot = np.zeros(len(self.room_days), dtype=int)
+        self.surgeon_window = np.zeros(
+            (len(self.room_days), len(context.surgeons)), dtype=int
+        )
+        for room_day_idx in range(len(self.room_days)):
+            self._refresh_room_day(room_day_idx)
+
+    def _refresh_room_day(self, room_day_idx: int) -> None:
+        room, day = self.room_days[room_day_idx]
+        self.max_free_slot[room_day_idx] = get_max_free_slot(room.schedule[day])
+        self.surgeon_window[room_day_idx] = [
+            get_surgeon_window(surgeon, room.available_time[day])
+            for surgeon in self.context.surgeons
+        ]
+
+    def record_booking(
+        self, operating_room: OperatingRoom, day: datetime.date, surgeon_name: str
+    ) -> None:
+        """
+        Refresh the arrays after a patient was booked in `operating_room` on `day`.
+        """
+        self._refresh_room_day(self.room_day_index[(operating_room.id, day)])
+        surgeon_idx = self.surgeon_index[surgeon_name]
+        surgeon = self.context.surgeons[surgeon_idx]
+        for room_day_idx, (room, room_day) in enumerate(self.room_days):
+            if room_day == day:
+                self.surgeon_window[room_day_idx, surgeon_idx] = get_surgeon_window(
+                    surgeon, room.available_time[room_day]
+                )
+
+    def feasibility_matrix(self) -> np.ndarray:
+        """
+        Boolean array of patients x room-days x surgeons.
+        """
+        fits_in_room_day = self.capable[:, self.room_day_to_room] & (
+            self.durations[:, None] <= self.max_free_slot[None, :]
+        )
+        return (
+            fits_in_room_day[:, :, None]
+            & self.eligible[:, None, :]
+            & (self.durations[:, None, None] <= self.surgeon_window[None, :, :])
+        )
+
+    def earliest_start_matrix(self) -> np.ndarray:
+        """
+        Start time of every feasible (patient, room-day, surgeon), NaT where infeasible.
+        """
+        room_day_starts = np.array(
+            [room.available_time[day] for room, day in self.room_days],
+            dtype="datetime64[m]",
+        )
+        return np.where(
+            self.feasibility_matrix(),
+            room_day_starts[None, :, None],
+            np.datetime64("NaT"),
+        )
+
+    def patient_options(self, patient: Patient) -> np.ndarray:
+        """
+        Boolean array of room-days x surgeons for a single patient.
+        """
+        patient_idx = self.patient_index[patient.uuid]
+        duration = self.durations[patient_idx]
+        fits_in_room_day = self.capable[patient_idx, self.room_day_to_room] & (
+            duration <= self.max_free_slot
+        )
+        return (
+            fits_in_room_day[:, None]
+            & self.eligible[patient_idx][None, :]
+            & (duration <= self.surgeon_window)
+        )
+
+    def has_options(self, patient: Patient) -> bool:
+        return bool(self.patient_options(patient).any())
+
+    def log_summary(self) -> None:
+        # Reduced per patient, never holding the full matrix
+        without_options = sum(not self.has_options(p) for p in self.patients)
+        logger.info(
+            f"[Feasibility] {len(self.patients)} patients x {len(self.room_days)}"
+            f" room-days x {len(self.context.surgeons)} surgeons,"
+            f" {without_options} patients without options"
+        )
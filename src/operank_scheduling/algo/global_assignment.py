@@ -0,0 +1,378 @@
+import datetime
+from bisect import bisect_left
+from typing import Any, Dict, List, Tuple
+
+from loguru import logger
+from ortools.sat.python import cp_model
+
+from .solver_config import SolverConfig
+from ..models.operank_models import (
+    Patient,
+    SchedulingContext,
+    Timeslot,
+    schedule_patient_to_timeslot,
+)
+
+"""
+# General Idea
+    Assign the whole waitlist at once, instead of booking patients one by one:
+        1. Every patient gets at most one (room-day, surgeon) option, and a start time.
+        2. The surgeries of a room-day run back to back from the time the room
+           becomes available, each in its own long-enough free timeslot.
+        3. A surgeon's surgeries don't overlap, and fall within the surgeon's windows.
+        4. Maximize the amount of scheduled patients, then minimize the
+           priority-weighted day offsets (urgent patients first).
+    The options of each patient are limited to the earliest `max_options_per_patient`.
+    A greedy assignment in waitlist order is the warm start (and the fallback).
+"""
+
+MINUTES_IN_DAY = 24 * 60
+# Assignment: patient index -> (room-day index, surgeon index, start minute)
+Assignment = Dict[int, Tuple[int, int, int]]
+
+
+def to_minutes(time: datetime.time) -> int:
+    return time.hour * 60 + time.minute
+
+
+def restructure_assignment_data(
+    patients: List[Patient],
+    context: SchedulingContext,
+    max_options_per_patient: int = 50,
+) -> Dict[str, Any]:
+    data = dict()
+    data["room_days"] = [
+        (room, day) for room in context.rooms for day in sorted(room.schedule)
+    ]
+    first_day = min((day for _, day in data["room_days"]), default=None)
+    data["day_offsets"] = [(day - first_day).days for _, day in data["room_days"]]
+    data["room_day_starts"] = [
+        to_minutes(room.available_time[day].time()) for room, day in data["room_days"]
+    ]
+    data["room_day_slots"] = [
+        sorted(
+            duration
+            for duration, amount in room.schedule[day].bin_counts().items()
+            for _ in range(amount)
+        )
+        for room, day in data["room_days"]
+    ]
+
+    data["surgeons"] = context.surgeons
+    # surgeon_windows[s][day] = free windows of surgeon s on day, in minutes
+    data["surgeon_windows"] = [
+        {
+            day: [(to_minutes(start), to_minutes(end)) for start, end in windows]
+            for day, windows in surgeon.availability.items()
+        }
+        for surgeon in context.surgeons
+    ]
+    surgeon_index = {surgeon.name: idx for idx, surgeon in enumerate(context.surgeons)}
+
+    surgeries = [context.get_surgery_by_patient(patient) for patient in patients]
+    data["patients"] = list(range(len(patients)))
+    data["durations"] = [surgery.duration for surgery in surgeries]
+    data["required_bins"] = [
+        Timeslot(surgery.duration).duration for surgery in surgeries
+    ]
+    max_priority = max((patient.priority for patient in patients), default=0)
+    data["weights"] = [max_priority - patient.priority + 1 for patient in patients]
+
+    # options[p] = (room-day, surgeon) pairs available to patient p, earliest first
+    data["options"] = list()
+    for patient_idx, surgery in enumerate(surgeries):
+        capable_rooms = set(context.room_capabilities.find_rooms(surgery.requirements))
+        eligible_surgeons = [
+            surgeon_index[surgeon.name]
+            for surgeon in context.get_eligible_surgeons(surgery)
+        ]
+        duration = data["durations"][patient_idx]
+        required_bin = data["required_bins"][patient_idx]
+        patient_options = list()
+        for room_day_idx, (room, day) in enumerate(data["room_days"]):
+            slots = data["room_day_slots"][room_day_idx]
+            if room not in capable_rooms or not len(slots) or slots[-1] < required_bin:
+                continue
+            room_start = data["room_day_starts"][room_day_idx]
+            for surgeon_idx in eligible_surgeons:
+                windows = data["surgeon_windows"][surgeon_idx].get(day) or []
+                if any(end - max(room_start, s) >= duration for s, end in windows):
+                    patient_options.append((room_day_idx, surgeon_idx))
+        patient_options.sort(key=lambda option: data["day_offsets"][option[0]])
+        data["options"].append(patient_options[:max_options_per_patient])
+    return data
+
+
+def greedy_assignment(data: Dict[str, Any]) -> Assignment:
+    """
+    Book the patients in waitlist order, each at the earliest option where it fits
+    right after the surgeries already placed in that room-day.
+    """
+    room_day_next_start = list(data["room_day_starts"])
+    room_day_free_slots = [list(slots) for slots in data["room_day_slots"]]
+    surgeon_busy: Dict[Tuple[int, datetime.date], List[Tuple[int, int]]] = dict()
+    assignment = dict()
+    for p in data["patients"]:
+        duration = data["durations"][p]
+        for room_day_idx, surgeon_idx in data["options"][p]:
+            free_slots = room_day_free_slots[room_day_idx]
+            slot_idx = bisect_left(free_slots, data["required_bins"][p])
+            if slot_idx == len(free_slots):
+                continue
+            start = room_day_next_start[room_day_idx]
+            end = start + duration
+            day = data["room_days"][room_day_idx][1]
+            windows = data["surgeon_windows"][surgeon_idx].get(day) or []
+            if not any(w_start <= start and end <= w_end for w_start, w_end in windows):
+                continue
+            busy = surgeon_busy.setdefault((surgeon_idx, day), list())
+            if any(start < b_end and b_start < end for b_start, b_end in busy):
+                continue
+            del free_slots[slot_idx]
+            room_day_next_start[room_day_idx] = end
+            busy.append((start, end))
+            assignment[p] = (room_day_idx, surgeon_idx, start)
+            break
+    return assignment
+
+
+def get_unassigned_penalty(data: Dict[str, Any]) -> int:
+    """
+    Scheduling another patient always outweighs the day offsets of all the others.
+    """
+    return sum(data["weights"]) * max(data["day_offsets"], default=0) + 1
+
+
+def assignment_cost(data: Dict[str, Any], assignment: Assignment) -> int:
+    """
+    Objective of `solve_global_assignment` for a given assignment.
+    """
+    unassigned_penalty = get_unassigned_penalty(data)
+    return unassigned_penalty * (len(data["patients"]) - len(assignment)) + sum(
+        data["weights"][p] * data["day_offsets"][room_day_idx]
+        for p, (room_day_idx, _, _) in assignment.items()
+    )
+
+
+def solve_global_assignment(
+    data: Dict[str, Any], solver_config: SolverConfig, warm_start: Assignment
+) -> Assignment:
+    model = cp_model.CpModel()
+
+    # Variables ---------------------------------------------
+    # y[p, rd, s] = 1 if patient p is operated in room-day rd by surgeon s
+    # x[p, rd] = 1 if patient p is operated in room-day rd
+    # start[p] = start minute of patient p (within its day)
+    y, x, start, assigned = {}, {}, {}, {}
+    for p in data["patients"]:
+        start[p] = model.NewIntVar(
+            0, MINUTES_IN_DAY - data["durations"][p], f"start_{p}"
+        )
+        assigned[p] = model.NewBoolVar(f"assigned_{p}")
+        for room_day_idx, surgeon_idx in data["options"][p]:
+            y[p, room_day_idx, surgeon_idx] = model.NewBoolVar(
+                f"y_{p}_{room_day_idx}_{surgeon_idx}"
+            )
+            if (p, room_day_idx) not in x:
+                x[p, room_day_idx] = model.NewBoolVar(f"x_{p}_{room_day_idx}")
+    # End Variables -----------------------------------------
+
+    # Constraints -------------------------------------------
+    patients_by_room_day = {idx: list() for idx in range(len(data["room_days"]))}
+    intervals_by_surgeon_day = dict()
+    for p in data["patients"]:
+        duration = data["durations"][p]
+        room_days = {room_day_idx for room_day_idx, _ in data["options"][p]}
+        # Each patient is assigned at most once
+        model.Add(sum(x[p, room_day_idx] for room_day_idx in room_days) == assigned[p])
+        for room_day_idx in room_days:
+            patients_by_room_day[room_day_idx].append(p)
+            model.Add(
+                sum(
+                    y[p, rd, s] for rd, s in data["options"][p] if rd == room_day_idx
+                )
+                == x[p, room_day_idx]
+            )
+            model.Add(start[p] >= data["room_day_starts"][room_day_idx]).OnlyEnforceIf(
+                x[p, room_day_idx]
+            )
+        for room_day_idx, surgeon_idx in data["options"][p]:
+            day = data["room_days"][room_day_idx][1]
+            intervals_by_surgeon_day.setdefault((surgeon_idx, day), list()).append(
+                model.NewOptionalFixedSizeIntervalVar(
+                    start[p],
+                    duration,
+                    y[p, room_day_idx, surgeon_idx],
+                    f"surgeon_interval_{p}_{room_day_idx}_{surgeon_idx}",
+                )
+            )
+
+    for room_day_idx, room_day_patients in patients_by_room_day.items():
+        if not len(room_day_patients):
+            continue
+        # Surgeries of a room-day don't overlap, and run back to back from its start
+        model.AddNoOverlap(
+            model.NewOptionalFixedSizeIntervalVar(
+                start[p],
+                data["durations"][p],
+                x[p, room_day_idx],
+                f"room_interval_{p}_{room_day_idx}",
+            )
+            for p in room_day_patients
+        )
+        booked_minutes = sum(
+            data["durations"][p] * x[p, room_day_idx] for p in room_day_patients
+        )
+        for p in room_day_patients:
+            model.Add(
+                start[p] + data["durations"][p]
+                <= data["room_day_starts"][room_day_idx] + booked_minutes
+            ).OnlyEnforceIf(x[p, room_day_idx])
+        # Every surgery can get its own long-enough timeslot. Bins are nested, so it
+        # is enough that the surgeries that don't fit in the slots shorter than each
+        # bin size are no more than the slots of that size or longer.
+        slots = data["room_day_slots"][room_day_idx]
+        shorter_bin_size = 0
+        for slot_idx, bin_size in enumerate(slots):
+            if bin_size == shorter_bin_size:
+                continue
+            model.Add(
+                sum(
+                    x[p, room_day_idx]
+                    for p in room_day_patients
+                    if data["required_bins"][p] > shorter_bin_size
+                )
+                <= len(slots) - slot_idx
+            )
+            shorter_bin_size = bin_size
+
+    for (surgeon_idx, day), intervals in intervals_by_surgeon_day.items():
+        # Surgeons operate once at a time, and only within their windows
+        blocked_start = 0
+        windows = sorted(data["surgeon_windows"][surgeon_idx][day])
+        for window_start, window_end in windows:
+            if window_start > blocked_start:
+                intervals.append(
+                    model.NewFixedSizeIntervalVar(
+                        blocked_start,
+                        window_start - blocked_start,
+                        f"blocked_{surgeon_idx}_{day}_{blocked_start}",
+                    )
+                )
+            blocked_start = max(blocked_start, window_end)
+        if blocked_start < MINUTES_IN_DAY:
+            intervals.append(
+                model.NewFixedSizeIntervalVar(
+                    blocked_start,
+                    MINUTES_IN_DAY - blocked_start,
+                    f"blocked_{surgeon_idx}_{day}_{blocked_start}",
+                )
+            )
+        model.AddNoOverlap(intervals)
+    # End Constraints ---------------------------------------
+
+    # Optimization ------------------------------------------
+    unassigned_penalty = get_unassigned_penalty(data)
+    model.Minimize(
+        sum(unassigned_penalty * (1 - assigned[p]) for p in data["patients"])
+        + sum(
+            data["weights"][p] * data["day_offsets"][room_day_idx] * x[p, room_day_idx]
+            for p, room_day_idx in x
+        )
+    )
+    # Warm start
+    for p in data["patients"]:
+        model.AddHint(assigned[p], int(p in warm_start))
+        if p in warm_start:
+            model.AddHint(start[p], warm_start[p][2])
+    for p, room_day_idx in x:
+        model.AddHint(
+            x[p, room_day_idx],
+            int(p in warm_start and warm_start[p][0] == room_day_idx),
+        )
+    for p, room_day_idx, surgeon_idx in y:
+        model.AddHint(
+            y[p, room_day_idx, surgeon_idx],
+            int(warm_start.get(p, (None, None))[:2] == (room_day_idx, surgeon_idx)),
+        )
+
+    solver = solver_config.create_solver()
+    status = solver.Solve(model)
+    if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+        logger.warning(
+            f"[Global] Failed to solve, status: {solver.StatusName(status)}."
+            " Using the greedy assignment"
+        )
+        return warm_start
+
+    assignment = dict()
+    for p, room_day_idx, surgeon_idx in y:
+        if solver.Value(y[p, room_day_idx, surgeon_idx]):
+            assignment[p] = (room_day_idx, surgeon_idx, solver.Value(start[p]))
+    logger.info(
+        f"[Global] Solve status: {solver.StatusName(status)}, assigned"
+        f" {len(assignment)}/{len(data['patients'])} patients"
+        f" (greedy: {len(warm_start)}) in {solver.WallTime():.2f}s"
+    )
+    if assignment_cost(data, assignment) > assignment_cost(data, warm_start):
+        logger.warning("[Global] Solver didn't improve the greedy assignment, using it")
+        return warm_start
+    return assignment
+
+
+def apply_assignment(
+    assignment: Assignment,
+    patients: List[Patient],
+    data: Dict[str, Any],
+    context: SchedulingContext,
+) -> None:
+    patients_by_room_day = dict()
+    for p, (room_day_idx, surgeon_idx, start) in assignment.items():
+        patients_by_room_day.setdefault(room_day_idx, list()).append(p)
+
+    for room_day_idx, room_day_patients in patients_by_room_day.items():
+        room, day = data["room_days"][room_day_idx]
+        # Match surgeries to timeslots, longest first, each to the shortest free slot
+        free_timeslots = sorted(
+            room.schedule[day].free_timeslots(),
+            key=lambda timeslot: timeslot.duration,
+        )
+        patient_timeslots = dict()
+        for p in sorted(room_day_patients, key=lambda p: -data["required_bins"][p]):
+            timeslot = next(
+                ts for ts in free_timeslots if ts.duration >= data["required_bins"][p]
+            )
+            free_timeslots.remove(timeslot)
+            patient_timeslots[p] = timeslot
+
+        for p in sorted(room_day_patients, key=lambda p: assignment[p][2]):
+            _, surgeon_idx, start = assignment[p]
+            start_time = datetime.datetime.combine(day, datetime.time())
+            schedule_patient_to_timeslot(
+                patients[p],
+                start_time + datetime.timedelta(minutes=start),
+                patient_timeslots[p],
+                room,
+                context,
+                data["surgeons"][surgeon_idx].name,
+            )
+
+
+def assign_patients_globally(
+    patients: List[Patient],
+    context: SchedulingContext,
+    solver_config: SolverConfig = None,
+    max_options_per_patient: int = 50,
+) -> List[Patient]:
+    """
+    Assign all the given patients in a single CP-SAT model, warm-started with a greedy
+    assignment, and book them. Returns the patients that could not be scheduled.
+    Patients should be given by priority, as the greedy warm start books them in order.
+    """
+    if solver_config is None:
+        solver_config = SolverConfig()
+    data = restructure_assignment_data(patients, context, max_options_per_patient)
+    warm_start = greedy_assignment(data)
+    assignment = solve_global_assignment(data, solver_config, warm_start)
+    apply_assignment(assignment, patients, data, context)
+    return [patient for p, patient in enumerate(patients) if p not in assignment]
@@ -0,0 +1,288 @@
+import datetime
+from typing import Dict, List, Tuple, Union
+
+from loguru import logger
+from ortools.sat.python import cp_model
+
+from .algo_helpers import first_fit_decreasing
+from .solver_config import SolverConfig
+from .surgery_distribution_models import greedy_room_assignment
+from ..models.operank_models import OperatingRoom, Timeslot
+
+"""
+# General Idea
+    After preliminary scheduling, patients keep being added and cancelled.
+    Instead of re-running the whole pipeline, apply the change as a delta:
+        1. Removed timeslots are taken out of the room-day they were placed in.
+        2. Added timeslots are packed into the free capacity of the upcoming days
+           of all rooms.
+        3. Timeslots that don't fit are queued in the least loaded rooms, which
+           open new days for them only if needed.
+    Booked surgeries and the timeslots that are already in place are never moved.
+"""
+
+WORK_DAY_IN_MINUTES = 480
+
+
+def remove_timeslots(
+    operating_rooms: List[OperatingRoom], removed_timeslots: List[Timeslot]
+) -> Dict[OperatingRoom, List[datetime.date]]:
+    """
+    Remove open timeslots from the rooms they were queued in.
+    Timeslots that were already replaced by a booked surgery are left alone.
+    Returns the days that were freed, per room.
+    """
+    freed_days = dict()
+    removed_ids = {id(timeslot) for timeslot in removed_timeslots}
+    found_ids = set()
+    for room in operating_rooms:
+        room_found_ids = set()
+        for day, day_schedule in room.schedule.items():
+            day_removals = [
+                timeslot
+                for timeslot in day_schedule.free_timeslots()
+                if id(timeslot) in removed_ids
+            ]
+            for timeslot in day_removals:
+                day_schedule.remove(timeslot)
+                room.free_slots.remove(day, timeslot.duration)
+                room_found_ids.add(id(timeslot))
+            if len(day_removals):
+                freed_days.setdefault(room, list()).append(day)
+        if len(room.schedule) == 0:
+            # Not placed in calendar days yet
+            room_found_ids = {
+                id(ts) for ts in room.timeslots_to_schedule if id(ts) in removed_ids
+            }
+        if len(room_found_ids) == 0:
+            continue
+        for daily_timeslots in room.timeslots_by_day:
+            daily_timeslots[:] = [
+                ts for ts in daily_timeslots if id(ts) not in room_found_ids
+            ]
+        room.timeslots_to_schedule[:] = [
+            ts for ts in room.timeslots_to_schedule if id(ts) not in room_found_ids
+        ]
+        found_ids |= room_found_ids
+
+    if len(found_ids) < len(removed_ids):
+        logger.warning(
+            f"{len(removed_ids) - len(found_ids)} removed timeslots were not queued in"
+            " any room, or were already booked"
+        )
+    return freed_days
+
+
+def pack_into_free_capacity(
+    timeslot_durations: List[int],
+    day_capacities: List[int],
+    solver_config: SolverConfig,
+    work_day_in_minutes=WORK_DAY_IN_MINUTES,
+) -> Union[List[List[int]], None]:
+    """
+    Pack timeslots into existing days with the given free capacities, or into new days.
+    New days are only opened when needed, and earlier days are preferred.
+    Returns the timeslot indices per day: existing days first (in the given order),
+    followed by the new days.
+    """
+    timeslots = list(range(len(timeslot_durations)))
+    new_days_amt = len(first_fit_decreasing(timeslot_durations, work_day_in_minutes))
+    capacities = list(day_capacities) + [work_day_in_minutes] * new_days_amt
+    existing_days = list(range(len(day_capacities)))
+    new_days = list(range(len(day_capacities), len(capacities)))
+    model = cp_model.CpModel()
+
+    # Variables ---------------------------------------------
+    # x[i, j] = 1 if timeslot i is assigned to **day** j.
+    x = {}
+    for i in timeslots:
+        for j in existing_days + new_days:
+            x[(i, j)] = model.NewBoolVar(f"x_{i}_{j}")
+
+    # y[j] = 1 if new day `j` is opened.
+    y = {}
+    for j in new_days:
+        y[j] = model.NewBoolVar(f"y_{j}")
+    # End Variables -----------------------------------------
+
+    # Constraints -------------------------------------------
+    for timeslot in timeslots:
+        model.AddExactlyOne(x[timeslot, day] for day in existing_days + new_days)
+
+    for day in existing_days:
+        model.Add(
+            sum(x[ts, day] * timeslot_durations[ts] for ts in timeslots)
+            <= capacities[day]
+        )
+    for day in new_days:
+        model.Add(
+            sum(x[ts, day] * timeslot_durations[ts] for ts in timeslots)
+            <= capacities[day] * y[day]
+        )
+    # End Constraints ---------------------------------------
+
+    # Optimization ------------------------------------------
+    # Opening a new day costs more than pushing every timeslot to the latest day
+    day_order_cost = sum(
+        day * x[ts, day] for ts in timeslots for day in existing_days + new_days
+    )
+    new_day_weight = len(timeslots) * len(capacities) + 1
+    model.Minimize(new_day_weight * sum(y.values()) + day_order_cost)
+    solver = solver_config.create_solver()
+    status = solver.Solve(model)
+
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        timeslot_indices_by_day = [
+            [ts for ts in timeslots if solver.Value(x[ts, day])]
+            for day in existing_days + new_days
+        ]
+        return timeslot_indices_by_day
+    logger.warning(
+        f"[Incremental] Failed to solve, status: {solver.StatusName(status)}"
+    )
+    return None
+
+
+def free_capacity(room: OperatingRoom, day: datetime.date) -> int:
+    return WORK_DAY_IN_MINUTES - room.schedule[day].used_minutes()
+
+
+def add_timeslots_to_existing_days(
+    operating_rooms: List[OperatingRoom],
+    new_timeslots: List[Timeslot],
+    starting_day: datetime.date,
+    solver_config: SolverConfig,
+) -> Tuple[Dict[OperatingRoom, List[datetime.date]], List[Timeslot]]:
+    """
+    Pack new timeslots into the free capacity of the upcoming days of all rooms.
+    Returns the modified days per room, and the timeslots that only fit in new days.
+    """
+    shortest_duration = min(ts.duration for ts in new_timeslots)
+    candidate_room_days = sorted(
+        (day, room_idx)
+        for room_idx, room in enumerate(operating_rooms)
+        for day in room.schedule
+        if day >= starting_day and free_capacity(room, day) >= shortest_duration
+    )
+    day_capacities = [
+        free_capacity(operating_rooms[room_idx], day)
+        for day, room_idx in candidate_room_days
+    ]
+    timeslot_indices_by_day = pack_into_free_capacity(
+        [ts.duration for ts in new_timeslots], day_capacities, solver_config
+    )
+    if timeslot_indices_by_day is None:
+        return dict(), new_timeslots
+
+    modified_days = dict()
+    for (day, room_idx), indices in zip(candidate_room_days, timeslot_indices_by_day):
+        if len(indices) == 0:
+            continue
+        room = operating_rooms[room_idx]
+        daily_timeslots = [new_timeslots[idx] for idx in indices]
+        room.timeslots_to_schedule.extend(daily_timeslots)
+        room.add_timeslots_to_day(day, daily_timeslots)
+        modified_days.setdefault(room, list()).append(day)
+    overflow_timeslots = [
+        new_timeslots[idx]
+        for indices in timeslot_indices_by_day[len(candidate_room_days) :]
+        for idx in indices
+    ]
+    return modified_days, overflow_timeslots
+
+
+def add_timeslots_to_room_schedule(
+    room: OperatingRoom,
+    new_timeslots: List[Timeslot],
+    starting_day: datetime.date,
+    solver_config: SolverConfig,
+) -> List[datetime.date]:
+    """
+    Place new timeslots in the upcoming days of a room, without moving
+    anything that is already scheduled. Returns the days that were modified.
+    """
+    scheduled_days = sorted(room.schedule.keys())
+    shortest_duration = min(ts.duration for ts in new_timeslots)
+    candidate_days = [
+        day
+        for day in scheduled_days
+        if day >= starting_day and free_capacity(room, day) >= shortest_duration
+    ]
+    day_capacities = [free_capacity(room, day) for day in candidate_days]
+    timeslot_indices_by_day = pack_into_free_capacity(
+        [ts.duration for ts in new_timeslots], day_capacities, solver_config
+    )
+    if timeslot_indices_by_day is None:
+        return list()
+
+    used_new_day_indices = [
+        indices
+        for indices in timeslot_indices_by_day[len(candidate_days):]
+        if len(indices)
+    ]
+    last_day = max(scheduled_days + [starting_day - datetime.timedelta(days=1)])
+    new_days = room.get_next_working_days(
+        datetime.datetime.combine(last_day + datetime.timedelta(days=1), datetime.time()),
+        len(used_new_day_indices),
+    )
+
+    modified_days = list()
+    for day, indices in zip(
+        candidate_days + new_days,
+        timeslot_indices_by_day[: len(candidate_days)] + used_new_day_indices,
+    ):
+        if len(indices) == 0:
+            continue
+        room.add_timeslots_to_day(day, [new_timeslots[idx] for idx in indices])
+        modified_days.append(day)
+    return modified_days
+
+
+def reschedule_incrementally(
+    operating_rooms: List[OperatingRoom],
+    added_timeslots: List[Timeslot] = None,
+    removed_timeslots: List[Timeslot] = None,
+    starting_day: datetime.date = None,
+    solver_config: SolverConfig = None,
+) -> Dict[OperatingRoom, List[datetime.date]]:
+    """
+    Apply a change in the patient list to an existing schedule, touching only
+    the rooms and days that the change affects.
+    Returns the modified days of every affected room.
+    """
+    if added_timeslots is None:
+        added_timeslots = list()
+    if removed_timeslots is None:
+        removed_timeslots = list()
+    if solver_config is None:
+        solver_config = SolverConfig()
+    if starting_day is None:
+        starting_day = datetime.datetime.now().date()
+
+    affected_days = remove_timeslots(operating_rooms, removed_timeslots)
+    overflow_timeslots = added_timeslots
+    if len(added_timeslots):
+        packed_days, overflow_timeslots = add_timeslots_to_existing_days(
+            operating_rooms, added_timeslots, starting_day, solver_config
+        )
+        for room, modified_days in packed_days.items():
+            affected_days.setdefault(room, list()).extend(modified_days)
+            logger.debug(f"[Incremental] Packed into {room} at {modified_days}")
+
+    # Only timeslots that need a new day go to the least loaded rooms
+    room_to_timeslot = greedy_room_assignment(overflow_timeslots, operating_rooms)
+    for room, new_timeslots in room_to_timeslot.items():
+        if len(new_timeslots) == 0:
+            continue
+        room.timeslots_to_schedule.extend(new_timeslots)
+        modified_days = add_timeslots_to_room_schedule(
+            room, new_timeslots, starting_day, solver_config
+        )
+        affected_days.setdefault(room, list()).extend(modified_days)
+        logger.debug(f"[Incremental] Added {new_timeslots} to {room} at {modified_days}")
+
+    logger.info(
+        f"[Incremental] Added {len(added_timeslots)} and removed"
+        f" {len(removed_timeslots)} timeslots, affecting {len(affected_days)} rooms"
+    )
+    return affected_days
@@ -1,43 +1,117 @@
 import time
-from typing import Dict, List
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, List, Union
 
+import numpy as np
 from loguru import logger
 
-from operank_scheduling.models.operank_models import OperatingRoom, Timeslot
-
 from ortools.sat.python import cp_model
 
 
-class SurgeryToRoomSolutionCallback(cp_model.CpSolverSolutionCallback):
+@dataclass
+class SolutionSample:
+    solution_count: int
+    elapsed_time: float
+    objective: float
+    best_bound: float
+    room_durations: Union[List[int], None] = None
+
+
+class SolutionTelemetryCallback(cp_model.CpSolverSolutionCallback):
+    """
+    Records solver progress with low overhead on the solver thread.
+
+    Every solution only increments a counter. A sample (objective, bound, elapsed time)
+    is taken every `every_n_solutions` solutions, or every `every_seconds` seconds if
+    given, into a ring buffer holding the latest `buffer_size` samples.
+    If `track_room_durations` was called, the total duration of each room is read in
+    one batch from the solver response. Nothing is logged while solving - use
+    `log_summary` or `samples` once the solve is done.
+    """
+
     def __init__(
-        self, data: Dict, timeslots: List[Timeslot], rooms: List[OperatingRoom], x
+        self,
+        every_n_solutions: int = 1,
+        every_seconds: Union[float, None] = None,
+        buffer_size: int = 256,
     ):
         cp_model.CpSolverSolutionCallback.__init__(self)
-        self.data = data
-        self.timeslots = timeslots
-        self.rooms = rooms
+        self.every_n_solutions = every_n_solutions
+        self.every_seconds = every_seconds
+        self.buffer = deque(maxlen=buffer_size)
         self.solution_count = 0
         self.start_time = time.time()
-        self.x = x
-
-    def find_total_lengths(self):
-        operating_room_timeslot_lengths = []
-        for operating_room_idx in self.data["rooms"]:
-            total_duration = 0
-            for timeslot_idx in self.data["timeslots"]:
-                timeslot = self.timeslots[timeslot_idx]
-                if self.Value(self.x[timeslot_idx, operating_room_idx]) > 0:
-                    total_duration += timeslot.duration
-            operating_room_timeslot_lengths.append(total_duration)
-        return operating_room_timeslot_lengths
+        self.last_sample_time = None
+        self.variable_indices = None
+        self.timeslot_durations = None
+
+    def track_room_durations(self, data: Dict, x: Dict):
+        """
+        Precompute the solution indices of x[timeslot, room], so the room durations
+        of a solution are a single array lookup and product.
+        """
+        self.variable_indices = np.array(
+            [[x[i, j].Index() for j in data["rooms"]] for i in data["timeslots"]]
+        )
+        self.timeslot_durations = np.array(data["timeslot_durations"])
+
+    def restart_clock(self):
+        self.start_time = time.time()
+        self.last_sample_time = None
+
+    def should_sample(self, current_time: float) -> bool:
+        if self.every_seconds is not None:
+            return (
+                self.last_sample_time is None
+                or current_time - self.last_sample_time >= self.every_seconds
+            )
+        return self.solution_count % self.every_n_solutions == 0
 
     def on_solution_callback(self):
-        current_time = time.time()
-        elapsed_time = current_time - self.start_time
         self.solution_count += 1
-        operating_room_timeslot_lengths = self.find_total_lengths()
+        current_time = time.time()
+        if not self.should_sample(current_time):
+            return
+        self.last_sample_time = current_time
+
+        room_durations = None
+        if self.variable_indices is not None:
+            solution = np.asarray(self.Response().solution)
+            room_durations = (
+                self.timeslot_durations @ solution[self.variable_indices]
+            ).tolist()
+        self.buffer.append(
+            SolutionSample(
+                solution_count=self.solution_count,
+                elapsed_time=current_time - self.start_time,
+                objective=self.ObjectiveValue(),
+                best_bound=self.BestObjectiveBound(),
+                room_durations=room_durations,
+            )
+        )
+
+    @property
+    def samples(self) -> List[SolutionSample]:
+        return list(self.buffer)
 
+    def log_summary(self, initial_objective: Union[int, None] = None):
+        for sample in self.buffer:
+            logger.debug(
+                f"[S{sample.solution_count}] @ {sample.elapsed_time:.2f}s | "
+                f"Objective: {sample.objective} (bound: {sample.best_bound})"
+                + (
+                    f", improved by {initial_objective - sample.objective:.0f} over"
+                    f" the initial assignment ({initial_objective})"
+                    if initial_objective is not None
+                    else ""
+                )
+                + (
+                    f"\nDurations: {sample.room_durations}"
+                    if sample.room_durations is not None
+                    else ""
+                )
+            )
         logger.debug(
-            f"[S{self.solution_count}] @ {elapsed_time:.2f}s =============="
-            f"\nDurations: {operating_room_timeslot_lengths}"
+            f"Found {self.solution_count} solutions, kept {len(self.buffer)} samples"
         )
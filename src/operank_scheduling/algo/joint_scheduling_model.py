@@ -0,0 +1,157 @@
+import datetime
+from typing import Any, Dict, List, Union
+
+import numpy as np
+from loguru import logger
+from ortools.sat.python import cp_model
+
+from .algo_helpers import first_fit_decreasing
+from .solver_config import SolverConfig
+from ..models.operank_models import OperatingRoom, Timeslot
+
+"""
+# General Idea
+    Choose the room and the day of every timeslot in a single model, instead of
+    assigning rooms first and packing days per room afterwards.
+        1. Every room has a sequence of working days (skipping its `non_working_days`).
+        2. Each timeslot has an optional one-day interval per room; exactly one is present.
+        3. Per room, a cumulative constraint keeps the daily duration under the work day.
+        4. Minimize the total amount of room-days used, then the last calendar day used.
+"""
+
+
+def restructure_joint_data(
+    timeslots: List[Timeslot],
+    rooms: List[OperatingRoom],
+    starting_day: datetime.date,
+    work_day_in_minutes=480,
+) -> Dict[str, Any]:
+    data = dict()
+    data["timeslot_durations"] = [timeslot.duration for timeslot in timeslots]
+    data["timeslots"] = list(range(len(timeslots)))
+    data["rooms"] = list(range(len(rooms)))
+    data["daily_limit"] = work_day_in_minutes
+
+    # Enough weeks for all rooms together to fit a first-fit-decreasing packing
+    packed_days = len(first_fit_decreasing(data["timeslot_durations"], work_day_in_minutes))
+    weekly_room_days = sum(7 - len(room.non_working_days) for room in rooms)
+    if weekly_room_days == 0:
+        raise ValueError("None of the rooms has any working days")
+    data["weeks"] = max(1, int(np.ceil(packed_days / weekly_room_days)))
+
+    # working_days[j][k] is the calendar offset (from `starting_day`) of the k-th working day of room j
+    starting_datetime = datetime.datetime.combine(starting_day, datetime.time())
+    data["working_days"] = list()
+    for room in rooms:
+        room_days = room.get_next_working_days(
+            starting_datetime, data["weeks"] * (7 - len(room.non_working_days))
+        )
+        data["working_days"].append([(day - starting_day).days for day in room_days])
+    data["horizon"] = max(max(days) for days in data["working_days"]) + 1
+    return data
+
+
+def distribute_timeslots_to_rooms_and_days(
+    timeslots: List[Timeslot],
+    rooms: List[OperatingRoom],
+    solver_config: SolverConfig = None,
+    starting_day: datetime.date = None,
+) -> Union[Dict[OperatingRoom, List[List[Timeslot]]], None]:
+    """
+    Assign every timeslot to a room and a working day of that room, and fill
+    `timeslots_to_schedule` and `timeslots_by_day` of the rooms.
+    The days of each room are consecutive working days, as expected by
+    `OperatingRoom.schedule_timeslots_to_days` with the same starting day.
+    Rooms without working days are left empty.
+    """
+    if solver_config is None:
+        solver_config = SolverConfig()
+    if starting_day is None:
+        starting_day = datetime.datetime.now().date()
+    closed_rooms = [room for room in rooms if len(set(room.non_working_days)) >= 7]
+    rooms = [room for room in rooms if room not in closed_rooms]
+    data = restructure_joint_data(timeslots, rooms, starting_day)
+    model = cp_model.CpModel()
+
+    # Variables ---------------------------------------------
+    # p[i, j] = 1 if timeslot i is assigned to room j.
+    # d[i, j] = index of the working day of room j that timeslot i is assigned to.
+    p, d, intervals = {}, {}, {}
+    for j in data["rooms"]:
+        room_days_amt = len(data["working_days"][j])
+        for i in data["timeslots"]:
+            p[(i, j)] = model.NewBoolVar(f"p_{i}_{j}")
+            d[(i, j)] = model.NewIntVar(0, room_days_amt - 1, f"d_{i}_{j}")
+            intervals[(i, j)] = model.NewOptionalFixedSizeIntervalVar(
+                d[(i, j)], 1, p[(i, j)], f"interval_{i}_{j}"
+            )
+
+    # last_day[j] = index of the last working day used in room j, used[j] = 1 if room j is used
+    last_day, used = {}, {}
+    for j in data["rooms"]:
+        last_day[j] = model.NewIntVar(
+            0, len(data["working_days"][j]) - 1, f"last_day_{j}"
+        )
+        used[j] = model.NewBoolVar(f"used_{j}")
+    # End Variables -----------------------------------------
+
+    # Constraints -------------------------------------------
+    # Each timeslot must be in exactly one room.
+    for i in data["timeslots"]:
+        model.AddExactlyOne(p[i, j] for j in data["rooms"])
+
+    for j in data["rooms"]:
+        # The daily duration can't exceed the maximum (work day limit)
+        model.AddCumulative(
+            [intervals[i, j] for i in data["timeslots"]],
+            data["timeslot_durations"],
+            data["daily_limit"],
+        )
+        for i in data["timeslots"]:
+            model.Add(last_day[j] >= d[i, j]).OnlyEnforceIf(p[i, j])
+            model.AddImplication(p[i, j], used[j])
+            # Absent timeslots are pinned, so they don't branch
+            model.Add(d[i, j] == 0).OnlyEnforceIf(p[i, j].Not())
+        model.Add(last_day[j] == 0).OnlyEnforceIf(used[j].Not())
+
+    # The last calendar day used, over the used rooms
+    makespan = model.NewIntVar(0, data["horizon"], "makespan")
+    for j in data["rooms"]:
+        last_calendar_day = model.NewIntVar(0, data["horizon"], f"last_calendar_day_{j}")
+        model.AddElement(last_day[j], data["working_days"][j], last_calendar_day)
+        model.Add(makespan >= last_calendar_day).OnlyEnforceIf(used[j])
+    # End Constraints ---------------------------------------
+
+    # Optimization ------------------------------------------
+    # A room that is used occupies days 0..last_day, so it uses last_day + 1 days
+    total_days_used = sum(last_day[j] + used[j] for j in data["rooms"])
+    model.Minimize((data["horizon"] + 1) * total_days_used + makespan)
+    solver = solver_config.create_solver()
+    status = solver.Solve(model)
+
+    if status != cp_model.OPTIMAL and status != cp_model.FEASIBLE:
+        logger.warning(
+            f"[Joint] Failed to solve, status: {solver.StatusName(status)}"
+        )
+        return None
+
+    room_to_days = {room: list() for room in closed_rooms}
+    for j in data["rooms"]:
+        room = rooms[j]
+        days = [list() for _ in data["working_days"][j]]
+        for i in data["timeslots"]:
+            if solver.Value(p[i, j]):
+                days[solver.Value(d[i, j])].append(timeslots[i])
+        days = [day for day in days if len(day)]
+        for day in days:
+            room.timeslots_to_schedule.extend(day)
+            room.timeslots_by_day.append(day)
+        room_to_days[room] = days
+        logger.debug(f"[Joint] {room}: {len(days)} days, {days}")
+
+    logger.info(
+        f"[Joint] Solve status: {solver.StatusName(status)}, "
+        f"{sum(len(days) for days in room_to_days.values())} room-days used, "
+        f"finishing after {solver.Value(makespan) + 1} calendar days"
+    )
+    return room_to_days
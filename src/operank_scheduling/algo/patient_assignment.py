@@ -1,22 +1,21 @@
-from typing import List, Tuple
+from typing import List, Tuple, Union
 
 from loguru import logger
 import datetime
-from ..algo.algo_helpers import intersection_size
+import numpy as np
 
 from ..models.operank_models import (
     OperatingRoom,
     Patient,
+    SchedulingContext,
     Surgeon,
     Surgery,
     Timeslot,
     get_all_surgeons,
-    get_surgeon_by_name,
 )
 
-from random import choice
-
 from ..models.parse_hopital_data import load_surgeon_schedules
+from ..models.surgeon_availability import surgeons_available_at
 
 
 def sort_patients_by_priority(patient_list: List[Patient]) -> List[Patient]:
@@ -66,40 +65,35 @@ def get_surgeons_by_team(team_name: str, surgeons: List[Surgeon]) -> List[Surgeo
 
 
 def find_suitable_operating_rooms(
-    procedure: Surgery, rooms: List[OperatingRoom]
+    procedure: Surgery, rooms: Union[List[OperatingRoom], SchedulingContext]
 ) -> List[OperatingRoom]:
-    suitable_rooms = []
-    for room in rooms:
-        match_strength = intersection_size(procedure.requirements, room.properties)
-        if match_strength >= len(procedure.requirements):
-            suitable_rooms.append(room)
-    return suitable_rooms
+    """
+    Finds all rooms that have every requirement of the procedure.
+    If `rooms` is a `SchedulingContext`, its memoized capability bitmasks are used.
+    """
+    if isinstance(rooms, SchedulingContext):
+        return list(rooms.room_capabilities.find_rooms(procedure.requirements))
+    requirements = set(procedure.requirements)
+    return [room for room in rooms if requirements.issubset(room.properties)]
 
 
 def find_suitable_surgeons(
-    procedure: Surgery, surgeons: List[Surgeon]
+    procedure: Surgery, surgeons: Union[List[Surgeon], SchedulingContext]
 ) -> List[Surgeon]:
     """
     Finds all surgeons that can perform a specific procedure.
+    If `surgeons` is a `SchedulingContext`, its eligibility index is used.
+    An empty list means that no surgeon can perform the procedure.
     """
-    suitable_surgeons = list()
-    schedule_by_ward = False
-
-    if len(procedure.suitable_teams) == 0:
-        schedule_by_ward = True
-
-    for surgeon in surgeons:
-        if schedule_by_ward and surgeon.ward in procedure.suitable_wards:
-            suitable_surgeons.append(surgeon)
-
-        elif surgeon.team in procedure.suitable_teams:
-            suitable_surgeons.append(surgeon)
+    if isinstance(surgeons, SchedulingContext):
+        suitable_surgeons = list(surgeons.get_eligible_surgeons(procedure))
+    else:
+        suitable_surgeons = [
+            surgeon for surgeon in surgeons if procedure.can_be_performed_by(surgeon)
+        ]
 
     if len(suitable_surgeons) == 0:
-        logger.warning(
-            f"Allocated random surgeon for {procedure.name}, no suitable surgeons found"
-        )
-        return [choice(surgeons)]
+        logger.warning(f"No suitable surgeons found for {procedure.name}")
 
     return suitable_surgeons
 
@@ -107,37 +101,76 @@ def find_suitable_surgeons(
 def remove_duplicate_suggestions(
     suggestions: List[Tuple[OperatingRoom, datetime.datetime, Timeslot, str]]
 ):
-    # For each day, return just one per day
-    final_suggestions = []
-    seen_datetimes = []
+    """
+    Keep one suggestion per distinct start time: the one with the shortest timeslot
+    on its date (the first one, on ties). Done in one pass, grouping by date.
+    """
+    minimal_suggestion_by_date = dict()
+    seen_datetimes = dict()  # Ordered set
     for suggestion in suggestions:
         operation_datetime = suggestion[1]
-        if operation_datetime not in seen_datetimes:
-            seen_datetimes.append(operation_datetime)
-            operations_at_this_date = [
-                x for x in suggestions if x[1].date() == operation_datetime.date()
-            ]
-            minimal_suggestion = min(
-                operations_at_this_date, key=lambda x: x[2].duration
-            )
-            final_suggestions.append(minimal_suggestion)
-    return final_suggestions
+        seen_datetimes.setdefault(operation_datetime, None)
+        minimal_suggestion = minimal_suggestion_by_date.get(operation_datetime.date())
+        if (
+            minimal_suggestion is None
+            or suggestion[2].duration < minimal_suggestion[2].duration
+        ):
+            minimal_suggestion_by_date[operation_datetime.date()] = suggestion
+    return [
+        minimal_suggestion_by_date[operation_datetime.date()]
+        for operation_datetime in seen_datetimes
+    ]
 
 
 def get_more_free_surgeons(
     suggestions: List[Tuple[OperatingRoom, datetime.datetime, Timeslot, str]],
-    surgeons: List[Surgeon],
+    surgeons: Union[List[Surgeon], SchedulingContext],
 ):
-    surgeon_scheduling_frequency = list()
-    for slot in suggestions:
-        surgeon = get_surgeon_by_name(slot[3], surgeons)
-        surgeon_scheduling_frequency.append(surgeon.scheduled_operations)
-    minimal_frequency = min(surgeon_scheduling_frequency)
+    """
+    Keep the suggestions whose surgeon has the fewest scheduled operations.
+    """
+    if isinstance(surgeons, SchedulingContext):
+        surgeons_by_name = surgeons.surgeons_by_name
+    else:
+        surgeons_by_name = dict()
+        for surgeon in surgeons:
+            surgeons_by_name.setdefault(surgeon.name, surgeon)
+    surgeon_loads = [
+        surgeons_by_name[suggestion[3]].scheduled_operations
+        for suggestion in suggestions
+    ]
+    minimal_load = min(surgeon_loads)
     return [
+        suggestion
+        for suggestion, surgeon_load in zip(suggestions, surgeon_loads)
+        if surgeon_load == minimal_load
+    ]
+
+
+def select_top_suggestions(
+    suggestions: List[Tuple[OperatingRoom, datetime.datetime, Timeslot, str]],
+    surgeons: Union[List[Surgeon], SchedulingContext],
+    amount: int = 3,
+):
+    """
+    Deduplicate the suggestions by date, prefer the least loaded surgeons, and return
+    the first `amount` suggestions - only the shortest timeslots, if there are enough.
+    """
+    # Remove "duplicates"
+    suggestions = remove_duplicate_suggestions(suggestions)
+    # Find surgeons with minimal number of already-scheduled-operations
+    # and prefer them
+    suggestions = get_more_free_surgeons(suggestions, surgeons)
+
+    minimal_duration = min(suggestion[2].duration for suggestion in suggestions)
+    minimal_suggestions = [
         suggestion
         for suggestion in suggestions
-        if get_surgeon_by_name(suggestion[3], surgeons).scheduled_operations == minimal_frequency
+        if suggestion[2].duration == minimal_duration
     ]
+    if len(minimal_suggestions) >= amount:
+        return minimal_suggestions[:amount]
+    return suggestions[:amount]
 
 
 def find_suitable_timeslots(
@@ -148,80 +181,53 @@ def find_suitable_timeslots(
     suitable_timeslots = list()
 
     # For each room,
-    #   For each day:
-    #       Check if a long-enough slot exists
+    #   For each day with a long-enough free slot (from the room's free slot index):
     #       Check if at this slot one of the surgeons is available
 
     for room in suitable_rooms:
-        for day in room.schedule:
-            available_timeslots = [
-                ts for ts in room.schedule[day] if isinstance(ts, Timeslot)
-            ]
-            long_enough_timeslots = [
-                ts for ts in available_timeslots if procedure.can_fit_in(ts)
-            ]
-            for timeslot in long_enough_timeslots:
-                earliest_surgeon_timeslots = list()
-                available_surgeons = [
-                    surgeon
-                    for surgeon in suitable_surgeons
-                    if surgeon.is_available_at(day)
-                ]
-                for surgeon in available_surgeons:
-                    # TODO: Rename function!!
-                    earliest_timeslot = surgeon.is_surgeon_available_at(
-                        room.available_time[day], procedure.duration
-                    )
-                    if earliest_timeslot is not None:
-                        # Surgeon has an empty spot for the procedure
-                        earliest_surgeon_timeslots.append(earliest_timeslot)
-                if len(earliest_surgeon_timeslots) > 0:
-                    earliest_surgeon_timeslots.sort(key=lambda x: x[1])
-                    # Add three good options to the pool for this date:
-                    for i in range(len(earliest_surgeon_timeslots)):
-                        (
-                            selected_surgeon,
-                            best_slot,
-                        ) = earliest_surgeon_timeslots[i]
-                        suitable_timeslots.append(
-                            (room, best_slot, timeslot, selected_surgeon.name)
-                        )
+        # Only the shortest long-enough slot of each day can end up in the suggestions
+        for day, slot_duration in room.free_slots.iter_days(procedure.duration):
+            timeslot = room.get_free_timeslot(day, slot_duration)
+            room_start_time = room.available_time[day]
+            # Check all the surgeons against the surgeons' availability bits at once
+            available_surgeons = surgeons_available_at(
+                suitable_surgeons, room_start_time, procedure.duration
+            )
+            for surgeon_idx in np.flatnonzero(available_surgeons):
+                surgeon_name = suitable_surgeons[surgeon_idx].name
+                suitable_timeslots.append(
+                    (room, room_start_time, timeslot, surgeon_name)
+                )
 
     # Check if we can get 3 options for minimal timeslots
     if len(suitable_timeslots) == 0:
         logger.warning(f"Failed to schedule surgery {procedure}")
         return None
     else:
-        # Remove "duplicates"
-        suitable_timeslots = remove_duplicate_suggestions(suitable_timeslots)
-        # Find surgeons with minimal number of already-scheduled-operations
-        # and prefer them
-        suitable_timeslots = get_more_free_surgeons(
-            suitable_timeslots, suitable_surgeons
-        )
-
-        minimal_timeslot = min(suitable_timeslots, key=lambda x: x[2].duration)
-        suitable_minimal_timeslots = [
-            timeslot
-            for timeslot in suitable_timeslots
-            if timeslot[2].duration == minimal_timeslot[2].duration
-        ]
-
-        if len(suitable_minimal_timeslots) > 2:
-            return suitable_minimal_timeslots[:3]
-        else:
-            return suitable_timeslots[:3]
+        return select_top_suggestions(suitable_timeslots, suitable_surgeons)
 
 
 def suggest_feasible_dates(
     patient: Patient,
-    surgeries: List[Surgery],
-    rooms: List[OperatingRoom],
-    surgeons: List[Surgeon],
+    surgeries: Union[List[Surgery], SchedulingContext],
+    rooms: List[OperatingRoom] = None,
+    surgeons: List[Surgeon] = None,
 ) -> List[Tuple[OperatingRoom, datetime.date, Timeslot]]:
-    procedure = get_surgery_by_patient(patient, surgeries)
-    suitable_rooms = find_suitable_operating_rooms(procedure, rooms)
-    suitable_surgeons = find_suitable_surgeons(procedure, surgeons)
+    """
+    `surgeries` may be a `SchedulingContext`, which provides the rooms and the surgeons
+    as well, and finds the patient's surgery through its index.
+    """
+    if isinstance(surgeries, SchedulingContext):
+        context = surgeries
+        procedure = context.get_surgery_by_patient(patient)
+        suitable_surgeons = find_suitable_surgeons(procedure, context)
+        suitable_rooms = find_suitable_operating_rooms(procedure, context)
+    else:
+        procedure = get_surgery_by_patient(patient, surgeries)
+        suitable_surgeons = find_suitable_surgeons(procedure, surgeons)
+        suitable_rooms = find_suitable_operating_rooms(procedure, rooms)
+    if len(suitable_surgeons) == 0:
+        return None
     suitable_timeslots = find_suitable_timeslots(
         procedure, suitable_rooms, suitable_surgeons
     )
@@ -0,0 +1,129 @@
+import datetime
+from dataclasses import dataclass
+from typing import List
+
+from loguru import logger
+
+from .algo_helpers import first_fit_decreasing
+from ..models.operank_models import OperatingRoom, Timeslot
+
+
+@dataclass
+class RoomSelection:
+    rooms: List[OperatingRoom]
+    required_room_days: int
+    expected_completion_date: datetime.date
+
+
+def estimate_completion_date(
+    rooms: List[OperatingRoom],
+    required_room_days: int,
+    starting_day: datetime.date,
+) -> datetime.date:
+    """
+    Walk the calendar from `starting_day`, counting the rooms that work each day,
+    until enough room-days were collected.
+    """
+    if required_room_days == 0:
+        return starting_day
+    if all(len(set(room.non_working_days)) >= 7 for room in rooms):
+        raise ValueError("None of the rooms has any working days")
+    collected_room_days = 0
+    current_day = starting_day
+    while True:
+        collected_room_days += sum(
+            1 for room in rooms if current_day.weekday() not in room.non_working_days
+        )
+        if collected_room_days >= required_room_days:
+            return current_day
+        current_day += datetime.timedelta(days=1)
+
+
+def get_completion_date(
+    rooms: List[OperatingRoom], starting_day: datetime.date
+) -> datetime.date:
+    """
+    The last calendar day of the rooms' `timeslots_by_day`, once they are placed in
+    working days from `starting_day` (as `OperatingRoom.schedule_timeslots_to_days`
+    would place them).
+    """
+    starting_datetime = datetime.datetime.combine(starting_day, datetime.time())
+    last_days = [
+        room.get_next_working_days(starting_datetime, len(room.timeslots_by_day))[-1]
+        for room in rooms
+        if len(room.timeslots_by_day)
+    ]
+    return max(last_days, default=starting_day)
+
+
+def count_working_days(
+    room: OperatingRoom, starting_day: datetime.date, days_amt: int
+) -> int:
+    return sum(
+        1
+        for offset in range(days_amt)
+        if (starting_day + datetime.timedelta(days=offset)).weekday()
+        not in room.non_working_days
+    )
+
+
+def select_operating_rooms(
+    timeslots: List[Timeslot],
+    rooms: List[OperatingRoom],
+    starting_day: datetime.date = None,
+    target_horizon_days: int = None,
+    work_day_in_minutes=480,
+) -> RoomSelection:
+    """
+    Pick the rooms to schedule the waitlist in.
+    The amount of room-days needed is estimated with a first-fit-decreasing packing.
+    Rooms are added in order of how many days they work (within the target horizon, if
+    given), and the smallest subset is chosen that:
+        - Finishes within `target_horizon_days` of `starting_day`, if given
+        - Otherwise, finishes as early as using all the rooms would
+    """
+    if starting_day is None:
+        starting_day = datetime.datetime.now().date()
+    required_room_days = len(
+        first_fit_decreasing([ts.duration for ts in timeslots], work_day_in_minutes)
+    )
+    if target_horizon_days is not None:
+        ranked_rooms = sorted(
+            rooms,
+            key=lambda room: count_working_days(room, starting_day, target_horizon_days),
+            reverse=True,
+        )
+        deadline = starting_day + datetime.timedelta(days=target_horizon_days - 1)
+    else:
+        ranked_rooms = sorted(
+            rooms, key=lambda room: 7 - len(room.non_working_days), reverse=True
+        )
+        deadline = estimate_completion_date(rooms, required_room_days, starting_day)
+
+    selected_rooms = list(ranked_rooms)
+    for rooms_amt in range(1, len(ranked_rooms) + 1):
+        completion_date = estimate_completion_date(
+            ranked_rooms[:rooms_amt], required_room_days, starting_day
+        )
+        if completion_date <= deadline:
+            selected_rooms = ranked_rooms[:rooms_amt]
+            break
+    else:
+        logger.warning(
+            f"Can't finish {required_room_days} room-days by {deadline}, using all rooms"
+        )
+
+    # Keep the order in which the rooms were given
+    selected_rooms = [room for room in rooms if room in selected_rooms]
+    selection = RoomSelection(
+        rooms=selected_rooms,
+        required_room_days=required_room_days,
+        expected_completion_date=estimate_completion_date(
+            selected_rooms, required_room_days, starting_day
+        ),
+    )
+    logger.info(
+        f"Selected {len(selected_rooms)}/{len(rooms)} rooms for {required_room_days}"
+        f" room-days, expected to finish on {selection.expected_completion_date}"
+    )
+    return selection
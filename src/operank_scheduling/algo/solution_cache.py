@@ -0,0 +1,156 @@
+import datetime
+import hashlib
+import json
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, List, Union
+
+from loguru import logger
+
+from ..models.operank_models import OperatingRoom, Timeslot
+
+"""
+Preliminary scheduling only depends on the binned durations of the timeslots and on
+the availability of the rooms, so near-identical inputs produce interchangeable
+solutions. A solution is stored as durations per room (and per day), and rebuilt
+on a cache hit by handing out the given timeslots of matching durations.
+"""
+
+
+def instance_key(
+    timeslots: List[Timeslot],
+    rooms: List[OperatingRoom],
+    variant: str = "",
+    starting_day: datetime.date = None,
+) -> str:
+    """
+    Canonical hash of a scheduling instance: the sorted timeslot durations, the
+    working weekdays of each room (in order) and the weekday of `starting_day`, which
+    decides how the days of a solution line up with the rooms' weeks. `variant`
+    separates solutions that were produced with different scheduling options.
+    """
+    instance = {
+        "durations": sorted(timeslot.duration for timeslot in timeslots),
+        "room_working_weekdays": [
+            sorted(set(range(7)) - set(room.non_working_days)) for room in rooms
+        ],
+        "starting_weekday": starting_day.weekday() if starting_day else None,
+        "variant": variant,
+    }
+    return hashlib.sha256(json.dumps(instance).encode("utf-8")).hexdigest()
+
+
+def extract_solution(rooms: List[OperatingRoom]) -> List[Dict[str, List]]:
+    return [
+        {
+            "timeslots_to_schedule": [ts.duration for ts in room.timeslots_to_schedule],
+            "timeslots_by_day": [
+                [ts.duration for ts in day] for day in room.timeslots_by_day
+            ],
+        }
+        for room in rooms
+    ]
+
+
+def apply_solution(
+    solution: List[Dict[str, List]],
+    timeslots: List[Timeslot],
+    rooms: List[OperatingRoom],
+) -> None:
+    timeslots_by_duration = dict()
+    for timeslot in timeslots:
+        timeslots_by_duration.setdefault(timeslot.duration, list()).append(timeslot)
+
+    for room, room_solution in zip(rooms, solution):
+        room_timeslots = [
+            timeslots_by_duration[duration].pop()
+            for duration in room_solution["timeslots_to_schedule"]
+        ]
+        room.timeslots_to_schedule.extend(room_timeslots)
+
+        room_timeslots_by_duration = dict()
+        for timeslot in room_timeslots:
+            room_timeslots_by_duration.setdefault(timeslot.duration, list()).append(
+                timeslot
+            )
+        for day in room_solution["timeslots_by_day"]:
+            room.timeslots_by_day.append(
+                [room_timeslots_by_duration[duration].pop() for duration in day]
+            )
+
+
+class PreliminarySchedulingCache:
+    """
+    In-memory LRU cache of preliminary scheduling solutions, optionally backed by
+    a directory of JSON files that outlives the process.
+    """
+
+    def __init__(self, max_entries: int = 128, cache_dir: Union[str, Path] = None):
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        self.entries: "OrderedDict[str, List]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.cache_dir is not None:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _disk_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Union[List[Dict[str, List]], None]:
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+        if self.cache_dir is not None and self._disk_path(key).exists():
+            with open(self._disk_path(key), "r") as json_fp:
+                solution = json.load(json_fp)
+            self._insert(key, solution)
+            return solution
+        return None
+
+    def put(self, key: str, solution: List[Dict[str, List]]) -> None:
+        self._insert(key, solution)
+        if self.cache_dir is not None:
+            with open(self._disk_path(key), "w") as json_fp:
+                json.dump(solution, json_fp)
+
+    def _insert(self, key: str, solution: List[Dict[str, List]]) -> None:
+        self.entries[key] = solution
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def restore(
+        self,
+        timeslots: List[Timeslot],
+        rooms: List[OperatingRoom],
+        variant: str = "",
+        starting_day: datetime.date = None,
+    ) -> bool:
+        """
+        Fill `timeslots_to_schedule` and `timeslots_by_day` of the rooms from a cached
+        solution of an identical instance. Returns whether there was a cache hit.
+        """
+        solution = self.get(instance_key(timeslots, rooms, variant, starting_day))
+        if solution is None:
+            self.misses += 1
+            return False
+        apply_solution(solution, timeslots, rooms)
+        self.hits += 1
+        logger.info("[Cache] Restored preliminary scheduling from cache")
+        return True
+
+    def store(
+        self,
+        timeslots: List[Timeslot],
+        rooms: List[OperatingRoom],
+        variant: str = "",
+        starting_day: datetime.date = None,
+    ) -> None:
+        self.put(
+            instance_key(timeslots, rooms, variant, starting_day),
+            extract_solution(rooms),
+        )
@@ -0,0 +1,66 @@
+from dataclasses import dataclass
+from typing import Optional
+
+from loguru import logger
+from ortools.sat.python import cp_model
+
+
+@dataclass
+class SolverConfig:
+    """
+    Settings shared by all CP-SAT models in the scheduling pipeline.
+
+    - `num_workers`: amount of parallel search workers (0 lets CP-SAT use all cores)
+    - `max_time_in_seconds`: time budget for a single solve (None for no limit)
+    - `relative_gap_limit`: stop once |objective - bound| / |objective| drops below this
+    - `random_seed`: fixes the solver seed; with more than one worker the search is
+       also interleaved, so repeated runs return the same solution
+    - `log_search_progress`: print the CP-SAT search log
+    """
+
+    num_workers: int = 0
+    max_time_in_seconds: Optional[float] = 30.0
+    relative_gap_limit: float = 0.0
+    random_seed: Optional[int] = None
+    log_search_progress: bool = False
+
+    @classmethod
+    def interactive(cls) -> "SolverConfig":
+        """
+        Short time budget and a loose gap, for solves the user is waiting on.
+        """
+        return cls(max_time_in_seconds=5.0, relative_gap_limit=0.05)
+
+    @classmethod
+    def deterministic(cls, random_seed: int = 0) -> "SolverConfig":
+        return cls(random_seed=random_seed)
+
+    def solution_quality_key(self) -> str:
+        """
+        The settings that decide how good (and which) a solution is, to tell apart
+        solutions that were solved with different budgets.
+        """
+        return (
+            f"time-{self.max_time_in_seconds}-gap-{self.relative_gap_limit}"
+            f"-seed-{self.random_seed}-workers-{self.num_workers}"
+        )
+
+    def apply_to(self, solver: cp_model.CpSolver) -> cp_model.CpSolver:
+        solver.parameters.num_search_workers = self.num_workers
+        if self.max_time_in_seconds is not None:
+            solver.parameters.max_time_in_seconds = self.max_time_in_seconds
+        solver.parameters.relative_gap_limit = self.relative_gap_limit
+        if self.random_seed is not None:
+            solver.parameters.random_seed = self.random_seed
+            solver.parameters.interleave_search = self.num_workers != 1
+        solver.parameters.log_search_progress = self.log_search_progress
+        return solver
+
+    def create_solver(self) -> cp_model.CpSolver:
+        solver = self.apply_to(cp_model.CpSolver())
+        logger.debug(
+            f"Solver workers: {self.num_workers or 'all cores'}, "
+            f"time budget: {self.max_time_in_seconds} [s], "
+            f"relative gap: {self.relative_gap_limit}"
+        )
+        return solver
@@ -1,11 +1,25 @@
 from ortools.sat.python import cp_model
 
-from typing import Dict, List, Any
+import datetime
+import heapq
+from concurrent.futures import ProcessPoolExecutor
+from enum import Enum, auto
+from functools import partial
+from typing import Dict, List, Any, Tuple, Union
 from loguru import logger
 import numpy as np
 
-from .algo_helpers import lazy_permute
-from .intermediate_solutions_cb import SurgeryToRoomSolutionCallback
+from .algo_helpers import (
+    best_fit_decreasing,
+    first_fit_decreasing,
+    l2_lower_bound,
+    lazy_permute,
+)
+from .intermediate_solutions_cb import SolutionTelemetryCallback
+from .joint_scheduling_model import distribute_timeslots_to_rooms_and_days
+from .room_selection import get_completion_date, select_operating_rooms
+from .solution_cache import PreliminarySchedulingCache
+from .solver_config import SolverConfig
 
 from ..models.operank_models import OperatingRoom, Timeslot
 
@@ -36,10 +50,101 @@ def restructure_data(
     return model_data
 
 
-def distribute_timeslots_to_operating_rooms(
-    timeslots: List[Timeslot], rooms: List[OperatingRoom]
-) -> Dict[OperatingRoom, List[Timeslot]]:
-    data = restructure_data(timeslots, rooms)
+class RoomBalancingObjective(Enum):
+    """
+    Formulations for balancing the normalized load between operating rooms.
+
+    PAIRWISE penalizes the difference between every pair of rooms, which grows
+    quadratically with the amount of rooms. SPREAD (max - min) and MEAN_DEVIATION
+    (sum of deviations from the mean) only add a constant amount of variables per room.
+    """
+
+    PAIRWISE = auto()
+    SPREAD = auto()
+    MEAN_DEVIATION = auto()
+
+
+def add_pairwise_balancing_objective(
+    model: cp_model.CpModel, room_loads: List, data: Dict[str, Any]
+):
+    """
+    Minimize the absolute differences between the normalized durations
+    of each room from one another.
+
+    If the durations for each room were [12, 16, 4] we expect [4, 8, 12]
+    """
+    abs_losses = []
+    all_perms = lazy_permute(room_loads)
+    for idx, permutation in enumerate(all_perms):
+        difference = model.NewIntVar(
+            0, data["max_total_duration"], f"diff_{idx}"
+        )  # temporary variable, as a workaround for abs val
+        model.Add(permutation[0] - permutation[1] <= difference)
+        model.Add(permutation[1] - permutation[0] <= difference)
+        abs_losses.append(difference)
+    model.Minimize(sum(abs_losses))
+
+
+def add_spread_balancing_objective(
+    model: cp_model.CpModel, room_loads: List, data: Dict[str, Any]
+):
+    """
+    Minimize the gap between the most loaded and the least loaded room.
+    """
+    max_load = model.NewIntVar(0, MAX_VAL_LIM, "max_load")
+    min_load = model.NewIntVar(0, MAX_VAL_LIM, "min_load")
+    for room_load in room_loads:
+        model.Add(room_load <= max_load)
+        model.Add(room_load >= min_load)
+    model.Minimize(max_load - min_load)
+
+
+def add_mean_deviation_balancing_objective(
+    model: cp_model.CpModel, room_loads: List, data: Dict[str, Any]
+):
+    """
+    Minimize the sum of absolute deviations of each room from the mean load.
+    To stay in integers, both sides are scaled by the amount of rooms:
+        |R * load_j - sum(loads)|
+    """
+    rooms_amt = len(room_loads)
+    total_load = model.NewIntVar(0, MAX_VAL_LIM * rooms_amt, "total_load")
+    model.Add(total_load == sum(room_loads))
+    deviations = []
+    for j, room_load in enumerate(room_loads):
+        deviation = model.NewIntVar(0, MAX_VAL_LIM * rooms_amt, f"dev_{j}")
+        model.Add(rooms_amt * room_load - total_load <= deviation)
+        model.Add(total_load - rooms_amt * room_load <= deviation)
+        deviations.append(deviation)
+    model.Minimize(sum(deviations))
+
+
+def evaluate_balancing_objective(
+    normalized_room_loads: List[int], balancing_objective: RoomBalancingObjective
+) -> int:
+    """
+    Compute the objective value of a given assignment, as the model would.
+    """
+    if balancing_objective is RoomBalancingObjective.PAIRWISE:
+        return sum(abs(a - b) for a, b in lazy_permute(normalized_room_loads))
+    if balancing_objective is RoomBalancingObjective.SPREAD:
+        return max(normalized_room_loads) - min(normalized_room_loads)
+    total_load = sum(normalized_room_loads)
+    rooms_amt = len(normalized_room_loads)
+    return sum(abs(rooms_amt * load - total_load) for load in normalized_room_loads)
+
+
+balancing_objectives = {
+    RoomBalancingObjective.PAIRWISE: add_pairwise_balancing_objective,
+    RoomBalancingObjective.SPREAD: add_spread_balancing_objective,
+    RoomBalancingObjective.MEAN_DEVIATION: add_mean_deviation_balancing_objective,
+}
+
+
+def build_room_distribution_model(
+    data: Dict[str, Any],
+    balancing_objective: RoomBalancingObjective = RoomBalancingObjective.PAIRWISE,
+) -> Tuple[cp_model.CpModel, Dict]:
     model = cp_model.CpModel()
 
     # Variables ---------------------------------------------
@@ -63,11 +168,12 @@ def distribute_timeslots_to_operating_rooms(
             ]
         )
 
+    # Division only accepts affine expressions, so each room total gets its own variable
+    room_durations = list()
     for j in data["rooms"]:
-        model.Add(
-            total_room_duration(j)
-            <= data["max_total_duration"] * data["weekly_room_availability"][j]
-        )
+        room_capacity = data["max_total_duration"] * data["weekly_room_availability"][j]
+        room_durations.append(model.NewIntVar(0, room_capacity, f"room_{j}"))
+        model.Add(room_durations[j] == total_room_duration(j))
 
     room_durartions_normalized = list()
 
@@ -77,66 +183,123 @@ def distribute_timeslots_to_operating_rooms(
         )
         model.AddDivisionEquality(
             room_durartions_normalized[j],
-            total_room_duration(j),
+            room_durations[j],
             data["weekly_room_availability"][j],
         )
-
-    abs_losses = []
-
-    def total_room_duration_differences():
-        """
-        Populate a pre-existing list with the absolute differences between
-        the total surgery duration of each room from one another.
-
-        If the durations for each room were [12, 16, 4] we expect [4, 8]
-        """
-        # total_room_durations = [total_room_duration(room) for room in data["rooms"]]
-        total_room_durations = room_durartions_normalized
-        all_perms = lazy_permute(total_room_durations)
-        for idx, permutation in enumerate(all_perms):
-            difference = model.NewIntVar(
-                0, data["max_total_duration"], f"diff_{idx}"
-            )  # temporary variable, as a workaround for abs val
-            model.Add(permutation[0] - permutation[1] <= difference)
-            model.Add(permutation[1] - permutation[0] <= difference)
-            abs_losses.append(difference)
-
-    total_room_duration_differences()
     # End Constraints ---------------------------------------
 
     # Optimization ------------------------------------------
-    model.Minimize(sum(abs_losses))
-    solver = cp_model.CpSolver()
-    solution_cb = SurgeryToRoomSolutionCallback(data, timeslots, rooms, x)
-    solver.parameters.enumerate_all_solutions = True
-    # solver.parameters.max_time_in_seconds = 10.0 * 60
-    solver.parameters.max_time_in_seconds = 30.0
-    # solver.parameters.num_search_workers = 4
+    balancing_objectives[balancing_objective](model, room_durartions_normalized, data)
+    return model, x
+
+
+def add_room_assignment_hint(
+    model: cp_model.CpModel,
+    x: Dict,
+    data: Dict[str, Any],
+    timeslots: List[Timeslot],
+    rooms: List[OperatingRoom],
+    initial_assignment: Dict[OperatingRoom, List[Timeslot]],
+    balancing_objective: RoomBalancingObjective,
+) -> Union[int, None]:
+    """
+    Feed an existing room assignment to the solver as a hint.
+    Returns the objective value of the assignment if it is complete and feasible,
+    and None otherwise (the hint is still added for the timeslots it covers).
+    Timeslots that aren't being scheduled are skipped, and make the hint incomplete.
+    """
+    timeslot_indices = {id(timeslot): idx for idx, timeslot in enumerate(timeslots)}
+    room_durations = [0 for _ in data["rooms"]]
+    hinted_timeslots = set()
+    unknown_timeslots = 0
+    for room_idx, room in enumerate(rooms):
+        for timeslot in initial_assignment.get(room, []):
+            timeslot_idx = timeslot_indices.get(id(timeslot))
+            if timeslot_idx is None:
+                unknown_timeslots += 1
+                continue
+            for j in data["rooms"]:
+                model.AddHint(x[timeslot_idx, j], int(j == room_idx))
+            hinted_timeslots.add(timeslot_idx)
+            room_durations[room_idx] += timeslot.duration
+
+    is_complete = (
+        len(hinted_timeslots) == len(data["timeslots"]) and unknown_timeslots == 0
+    )
+    is_feasible = all(
+        room_durations[j]
+        <= data["max_total_duration"] * data["weekly_room_availability"][j]
+        for j in data["rooms"]
+    )
+    if not (is_complete and is_feasible):
+        logger.warning(
+            f"Initial assignment covers {len(hinted_timeslots)}/{len(data['timeslots'])}"
+            f" timeslots and {unknown_timeslots} unknown ones (feasible:"
+            f" {is_feasible}), using it as a partial hint only"
+        )
+        return None
+    normalized_room_durations = [
+        room_durations[j] // data["weekly_room_availability"][j] for j in data["rooms"]
+    ]
+    return evaluate_balancing_objective(normalized_room_durations, balancing_objective)
+
+
+def distribute_timeslots_to_operating_rooms(
+    timeslots: List[Timeslot],
+    rooms: List[OperatingRoom],
+    balancing_objective: RoomBalancingObjective = RoomBalancingObjective.PAIRWISE,
+    solver_config: SolverConfig = None,
+    initial_assignment: Dict[OperatingRoom, List[Timeslot]] = None,
+    warm_start: bool = False,
+    telemetry: SolutionTelemetryCallback = None,
+) -> Dict[OperatingRoom, List[Timeslot]]:
+    """
+    Assign timeslots to rooms such that the normalized load of the rooms is balanced.
+
+    An `initial_assignment` (or, with `warm_start`, the greedy assignment)
+    is passed to the solver as a hint. If it is complete and feasible, the result is
+    never worse than it: when the solver does not improve on it in time, it is kept.
+
+    Pass a `telemetry` callback to control how solutions are sampled, and to read
+    its samples after the solve.
+    """
+    if solver_config is None:
+        solver_config = SolverConfig()
+    if initial_assignment is None and warm_start:
+        initial_assignment = greedy_room_assignment(timeslots, rooms)
+    data = restructure_data(timeslots, rooms)
+    model, x = build_room_distribution_model(data, balancing_objective)
+    initial_objective = None
+    if initial_assignment is not None:
+        initial_objective = add_room_assignment_hint(
+            model, x, data, timeslots, rooms, initial_assignment, balancing_objective
+        )
+
+    solver = solver_config.create_solver()
+    if telemetry is None:
+        telemetry = SolutionTelemetryCallback()
+    telemetry.track_room_durations(data, x)
     logger.warning(
         f"Set max solve time to be: {solver.parameters.max_time_in_seconds} [s]"
     )
-    status = solver.Solve(model, solution_cb)
+    telemetry.restart_clock()
+    status = solver.Solve(model, telemetry)
+    telemetry.log_summary(initial_objective)
 
+    room_to_timeslot = None
     if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
         logger.info(f"Solve status: {solver.StatusName(status)}")
         logger.info(f"Total timeslots to schedule: {len(data['timeslots'])}")
         logger.debug(f"Optimal difference (lower is better): {solver.ObjectiveValue()}")
-        for operating_room_idx in data["rooms"]:
-            operating_room = rooms[operating_room_idx]
-            total_duration = 0
-            for timeslot_idx in data["timeslots"]:
-                timeslot = timeslots[timeslot_idx]
-                if solver.Value(x[timeslot_idx, operating_room_idx]) > 0:
-                    operating_room.timeslots_to_schedule.append(timeslot)
-                    total_duration += timeslot.duration
-
-            logger.debug(
-                f"Timeslots in {operating_room}: {operating_room.timeslots_to_schedule}"
-            )
-            logger.debug(
-                f"Total queue duration in {operating_room} is {total_duration} [m]"
-            )
-
+        if initial_objective is None or solver.ObjectiveValue() <= initial_objective:
+            room_to_timeslot = {
+                rooms[operating_room_idx]: [
+                    timeslots[timeslot_idx]
+                    for timeslot_idx in data["timeslots"]
+                    if solver.Value(x[timeslot_idx, operating_room_idx]) > 0
+                ]
+                for operating_room_idx in data["rooms"]
+            }
         logger.debug(f"Solver took {solver.WallTime():.2f} [ms] to finish")
     else:
         logger.warning(
@@ -144,130 +307,438 @@ def distribute_timeslots_to_operating_rooms(
             f"The solution status was deemed {solver.StatusName(status)}"
         )
 
+    if room_to_timeslot is None and initial_objective is not None:
+        logger.warning(
+            f"Solver did not improve on the initial assignment ({initial_objective}),"
+            " keeping it"
+        )
+        room_to_timeslot = {room: initial_assignment.get(room, []) for room in rooms}
+    if room_to_timeslot is None:
+        return None
+
+    for operating_room, room_timeslots in room_to_timeslot.items():
+        operating_room.timeslots_to_schedule.extend(room_timeslots)
+        total_duration = sum(timeslot.duration for timeslot in room_timeslots)
+        logger.debug(
+            f"Timeslots in {operating_room}: {operating_room.timeslots_to_schedule}"
+        )
+        logger.debug(
+            f"Total queue duration in {operating_room} is {total_duration} [m]"
+        )
+    return room_to_timeslot
+
+
+def get_normalized_room_loads(
+    room_to_timeslot: Dict[OperatingRoom, List[Timeslot]]
+) -> Dict[OperatingRoom, float]:
+    """
+    Assigned minutes per working day of each room.
+    """
+    return {
+        room: sum(ts.duration for ts in room_timeslots) / (7 - len(room.non_working_days))
+        for room, room_timeslots in room_to_timeslot.items()
+    }
+
 
-def weighted_round_robin_surgery_to_room(
+def greedy_room_assignment(
     timeslots: List[Timeslot], rooms: List[OperatingRoom]
 ) -> Dict[OperatingRoom, List[Timeslot]]:
     """
     Balance timeslots between rooms based on the availability of these rooms.
-    Rooms that are available 5 days a week get x5 the timeslots w.r.t rooms
-    that are available only 1 day a week.
+    Timeslots are placed longest-first, each in the room with the lowest normalized
+    load (assigned minutes / working days), counting what is already queued in the room.
+    The rooms are kept in a heap, so this takes O(n log R) after sorting.
     """
     room_to_timeslot = {room: list() for room in rooms}
+    room_availability = [7 - len(room.non_working_days) for room in rooms]
+    room_heap = [
+        (sum(ts.duration for ts in room.timeslots_to_schedule) / room_availability[idx], idx)
+        for idx, room in enumerate(rooms)
+    ]
+    heapq.heapify(room_heap)
+    for timeslot in sorted(timeslots, key=lambda ts: ts.duration, reverse=True):
+        room_load, room_idx = heapq.heappop(room_heap)
+        room_to_timeslot[rooms[room_idx]].append(timeslot)
+        room_load += timeslot.duration / room_availability[room_idx]
+        heapq.heappush(room_heap, (room_load, room_idx))
+    return room_to_timeslot
+
 
-    room_availability = {room: (7 - len(room.non_working_days)) for room in rooms}
-    current_room = 0
-    assigned_to_room = 0
-    for timeslot in timeslots:
-        if assigned_to_room < room_availability[rooms[current_room]]:
-            room_to_timeslot[rooms[current_room]].append(timeslot)
-            assigned_to_room += 1
-        else:
-            current_room = (current_room + 1) % len(rooms)
-            assigned_to_room = 0
-
-    normalized_room_durations = dict()
+def greedy_surgery_to_room(
+    timeslots: List[Timeslot], rooms: List[OperatingRoom]
+) -> Dict[OperatingRoom, List[Timeslot]]:
+    """
+    Queue the greedy assignment in each room, and report how balanced it is.
+    """
+    room_to_timeslot = greedy_room_assignment(timeslots, rooms)
     for room in room_to_timeslot:
         room.timeslots_to_schedule.extend(room_to_timeslot[room])
-        normalized_room_durations[room] = sum([ts.duration for ts in room_to_timeslot[room]]) / room_availability[room]
+
+    normalized_room_durations = get_normalized_room_loads(
+        {room: room.timeslots_to_schedule for room in rooms}
+    )
+    if len(normalized_room_durations):
+        loads = list(normalized_room_durations.values())
+        logger.info(
+            f"Room load imbalance (max - min): {max(loads) - min(loads):.1f} [m/day], "
+            f"mean load: {np.mean(loads):.1f} [m/day]"
+        )
     return room_to_timeslot
 
 
-def restructure_day_optimization_data(room: OperatingRoom, work_day_in_minutes=480):
+def build_day_optimization_data(
+    timeslot_durations: List[int], work_day_in_minutes=480
+) -> Dict[str, Any]:
     data = dict()
-    data["timeslots"] = list(range(len(room.timeslots_to_schedule)))
-    data["timeslot_durations"] = [
-        timeslot.duration for timeslot in room.timeslots_to_schedule
-    ]
-    max_days = 1 + (sum(data["timeslot_durations"]) // work_day_in_minutes)
-    data["days"] = list(range(max_days + 1))
+    data["timeslots"] = list(range(len(timeslot_durations)))
+    data["timeslot_durations"] = list(timeslot_durations)
+    data["heuristic_packing"], data["min_days"] = presolve_day_distribution(
+        data["timeslot_durations"], work_day_in_minutes
+    )
+    # The heuristic packing is feasible, so the optimum never needs more days
+    data["days"] = list(range(len(data["heuristic_packing"])))
     data["daily_limit"] = work_day_in_minutes
     return data
 
 
-def distribute_timeslots_to_days(rooms: List[OperatingRoom]):
+def presolve_day_distribution(
+    timeslot_durations: List[int], work_day_in_minutes=480
+) -> Tuple[List[List[int]], int]:
     """
-    For each room, build a model that will assign operations to days such that:
-        1. The total daily surgery duration will be lower than the daily operating hours
-        2. (Speculation) each day has at least two kinds of surgery (short and medium, for ex.)
+    Pack the timeslots into days with first-fit and best-fit decreasing, and bound
+    the optimal amount of days from below (L2 dominates L1).
+    Returns the heuristic packing with the least days, and the lower bound.
+    """
+    packings = [
+        first_fit_decreasing(timeslot_durations, work_day_in_minutes),
+        best_fit_decreasing(timeslot_durations, work_day_in_minutes),
+    ]
+    best_packing = min(packings, key=len)
+    lower_bound = l2_lower_bound(timeslot_durations, work_day_in_minutes)
+    return best_packing, lower_bound
+
+
+def restructure_day_optimization_data(room: OperatingRoom, work_day_in_minutes=480):
+    return build_day_optimization_data(
+        [timeslot.duration for timeslot in room.timeslots_to_schedule],
+        work_day_in_minutes,
+    )
+
+
+class DayPackingModel(Enum):
     """
-    for room in rooms:
-        data = restructure_day_optimization_data(room)
-        model = cp_model.CpModel()
-
-        # Variables ---------------------------------------------
-        # x[i, j] = 1 if timeslot i is assigned to **day** j.
-        x = {}
-        for i in data["timeslots"]:
-            for j in data["days"]:
-                x[(i, j)] = model.NewIntVar(0, 1, f"x_{i}_{j}")
-
-        # y[j] = 1 if day `j` is used.
-        y = {}
+    Formulations for packing the timeslots of a room into days.
+
+    ASSIGNMENT has a boolean for every timeslot-day pair. BIN_COUNTS uses an
+    integer count per distinct duration per day, so its size depends on the
+    amount of `Timeslot.bins` rather than on the amount of timeslots.
+    """
+
+    ASSIGNMENT = auto()
+    BIN_COUNTS = auto()
+
+
+def solve_day_assignment_model(
+    data: Dict[str, Any], solver_config: SolverConfig
+) -> Union[List[List[int]], None]:
+    model = cp_model.CpModel()
+
+    # Variables ---------------------------------------------
+    # x[i, j] = 1 if timeslot i is assigned to **day** j.
+    x = {}
+    for i in data["timeslots"]:
         for j in data["days"]:
-            y[j] = model.NewIntVar(0, 1, f"y_{j}")
-        # End Variables -----------------------------------------
+            x[(i, j)] = model.NewIntVar(0, 1, f"x_{i}_{j}")
 
-        # Constraints -------------------------------------------
-        # Each timeslot must be scheduled in one day only.
-        for timeslot in data["timeslots"]:
-            model.Add(sum(x[timeslot, day] for day in data["days"]) == 1)
+    # y[j] = 1 if day `j` is used.
+    y = {}
+    for j in data["days"]:
+        y[j] = model.NewIntVar(0, 1, f"y_{j}")
+    # End Variables -----------------------------------------
 
-        # The daily duration can't exceed the maximum (work day limit)
-        for day in data["days"]:
-            model.Add(
-                sum(
-                    x[timeslot, day] * data["timeslot_durations"][timeslot]
-                    for timeslot in data["timeslots"]
-                )
-                <= data["daily_limit"] * y[day]
+    # Constraints -------------------------------------------
+    # Each timeslot must be scheduled in one day only.
+    for timeslot in data["timeslots"]:
+        model.Add(sum(x[timeslot, day] for day in data["days"]) == 1)
+
+    # The daily duration can't exceed the maximum (work day limit)
+    for day in data["days"]:
+        model.Add(
+            sum(
+                x[timeslot, day] * data["timeslot_durations"][timeslot]
+                for timeslot in data["timeslots"]
             )
-        # End Constraints ---------------------------------------
-
-        # Optimization ------------------------------------------
-        def days_used():
-            return [y[day] for day in data["days"]]
-
-        model.Minimize(sum(days_used()))
-        solver = cp_model.CpSolver()
-        status = solver.Solve(model)
-
-        if status == cp_model.OPTIMAL:
-            logger.debug(f"[Optimization] For Room: {room}")
-            timeslots = room.timeslots_to_schedule
-            for day in data["days"]:
-                daily_timeslots = list()
-                if solver.Value(y[day]):
-                    out_str = f"Day: {day} | "
-                    for timeslot_idx in data["timeslots"]:
-                        timeslot = timeslots[timeslot_idx]
-                        if solver.Value(x[timeslot_idx, day]) > 0:
-                            out_str += f" {timeslot}"
-                            daily_timeslots.append(timeslot)
-                    logger.debug(out_str)
-                if len(daily_timeslots):
-                    room.timeslots_by_day.append(daily_timeslots)
-        else:
-            logger.warning(f"[Optimization] Failed to solve, status: {status}")
+            <= data["daily_limit"] * y[day]
+        )
+    # End Constraints ---------------------------------------
 
+    # Optimization ------------------------------------------
+    def days_used():
+        return [y[day] for day in data["days"]]
 
-def perform_preliminary_scheduling(
-    timeslot_list: List[Timeslot], operating_rooms: List[OperatingRoom]
-):
-    # if len(timeslot_list) <= len(operating_rooms):
-    # We have too few surgeries to schedule, or too many rooms as options
+    model.Add(sum(days_used()) >= data["min_days"])
+    model.Minimize(sum(days_used()))
+    solver = solver_config.create_solver()
+    status = solver.Solve(model)
+
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        timeslot_indices_by_day = list()
+        for day in data["days"]:
+            if solver.Value(y[day]):
+                daily_timeslot_indices = [
+                    timeslot_idx
+                    for timeslot_idx in data["timeslots"]
+                    if solver.Value(x[timeslot_idx, day]) > 0
+                ]
+                if len(daily_timeslot_indices):
+                    timeslot_indices_by_day.append(daily_timeslot_indices)
+        return timeslot_indices_by_day
+    logger.warning(
+        f"[Optimization] Failed to solve, status: {solver.StatusName(status)}"
+    )
+    return None
+
+
+def solve_day_bin_count_model(
+    data: Dict[str, Any], solver_config: SolverConfig
+) -> Union[List[List[int]], None]:
+    timeslots_by_duration = dict()
+    for timeslot_idx in data["timeslots"]:
+        duration = data["timeslot_durations"][timeslot_idx]
+        timeslots_by_duration.setdefault(duration, list()).append(timeslot_idx)
+    durations = sorted(timeslots_by_duration.keys())
+    model = cp_model.CpModel()
+
+    # Variables ---------------------------------------------
+    # n[b, j] = amount of timeslots of duration b assigned to **day** j.
+    n = {}
+    for b in durations:
+        max_per_day = min(len(timeslots_by_duration[b]), data["daily_limit"] // b)
+        for j in data["days"]:
+            n[(b, j)] = model.NewIntVar(0, max_per_day, f"n_{b}_{j}")
+
+    # y[j] = 1 if day `j` is used.
+    y = {}
+    for j in data["days"]:
+        y[j] = model.NewBoolVar(f"y_{j}")
+    # End Variables -----------------------------------------
+
+    # Constraints -------------------------------------------
+    # All timeslots of each duration must be scheduled.
+    for b in durations:
+        model.Add(
+            sum(n[b, day] for day in data["days"]) == len(timeslots_by_duration[b])
+        )
+
+    # The daily duration can't exceed the maximum (work day limit)
+    for day in data["days"]:
+        model.Add(sum(n[b, day] * b for b in durations) <= data["daily_limit"] * y[day])
 
-    total_surgery_duration = np.sum([slot.duration for slot in timeslot_list])
-    workdays_required = total_surgery_duration / 480
+    # Days are interchangeable, so use them in order
+    for day in data["days"][1:]:
+        model.Add(y[day] <= y[day - 1])
+    # End Constraints ---------------------------------------
+
+    # Optimization ------------------------------------------
+    def days_used():
+        return [y[day] for day in data["days"]]
+
+    model.Add(sum(days_used()) >= data["min_days"])
+    model.Minimize(sum(days_used()))
+    solver = solver_config.create_solver()
+    status = solver.Solve(model)
+
+    if status == cp_model.OPTIMAL or status == cp_model.FEASIBLE:
+        timeslot_indices_by_day = list()
+        remaining_by_duration = {b: list(timeslots_by_duration[b]) for b in durations}
+        for day in data["days"]:
+            daily_timeslot_indices = list()
+            for b in durations:
+                amount = solver.Value(n[b, day])
+                daily_timeslot_indices.extend(remaining_by_duration[b][:amount])
+                del remaining_by_duration[b][:amount]
+            if len(daily_timeslot_indices):
+                timeslot_indices_by_day.append(sorted(daily_timeslot_indices))
+        return timeslot_indices_by_day
+    logger.warning(
+        f"[Optimization] Failed to solve, status: {solver.StatusName(status)}"
+    )
+    return None
+
+
+day_packing_models = {
+    DayPackingModel.ASSIGNMENT: solve_day_assignment_model,
+    DayPackingModel.BIN_COUNTS: solve_day_bin_count_model,
+}
+
+
+def solve_room_day_distribution(
+    timeslot_durations: List[int],
+    solver_config: SolverConfig,
+    day_packing_model: DayPackingModel = DayPackingModel.ASSIGNMENT,
+) -> Union[List[List[int]], None]:
+    """
+    Solve the day packing model of a single room.
+    Only plain data goes in and out, so this can run in a worker process.
+    Returns the timeslot indices of every used day, or None if no solution was found.
+    """
+    if len(timeslot_durations) == 0:
+        return list()
+    data = build_day_optimization_data(timeslot_durations)
+    if len(data["heuristic_packing"]) == data["min_days"]:
+        logger.info(
+            f"[Optimization] Heuristic packing into {data['min_days']} days"
+            " meets the lower bound, proven optimal"
+        )
+        return data["heuristic_packing"]
+
+    logger.debug(
+        f"[Optimization] Heuristic packing uses {len(data['heuristic_packing'])} days,"
+        f" lower bound is {data['min_days']}, running the solver"
+    )
+    timeslot_indices_by_day = day_packing_models[day_packing_model](data, solver_config)
+    if timeslot_indices_by_day is None:
+        logger.warning("[Optimization] Falling back to the heuristic packing")
+        return data["heuristic_packing"]
+    return timeslot_indices_by_day
+
+
+def distribute_timeslots_to_days(
+    rooms: List[OperatingRoom],
+    solver_config: SolverConfig = None,
+    parallel: bool = False,
+    max_workers: int = None,
+    day_packing_model: DayPackingModel = DayPackingModel.ASSIGNMENT,
+):
+    """
+    For each room, build a model that will assign operations to days such that:
+        1. The total daily surgery duration will be lower than the daily operating hours
+        2. (Speculation) each day has at least two kinds of surgery (short and medium, for ex.)
+    The time budget of `solver_config` applies to each room separately.
 
-    if np.ceil(workdays_required) < len(operating_rooms):
-        max_rooms = np.round(workdays_required)
+    The rooms are independent of each other, so with `parallel` each room is solved
+    in a process pool. Results are merged back in room order, so the output is the
+    same as the serial path. Consider setting `solver_config.num_workers` so that
+    the pool does not oversubscribe the available cores.
+    """
+    if solver_config is None:
+        solver_config = SolverConfig()
+    room_durations = [
+        [timeslot.duration for timeslot in room.timeslots_to_schedule]
+        for room in rooms
+    ]
+    solve = partial(
+        solve_room_day_distribution,
+        solver_config=solver_config,
+        day_packing_model=day_packing_model,
+    )
+    if parallel and len(rooms) > 1:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            solutions = list(executor.map(solve, room_durations))
     else:
-        max_rooms = len(operating_rooms)
-
-    # max_rooms = min(len(timeslot_list) // 6, len(operating_rooms))
-    operating_rooms = operating_rooms[: int(max_rooms)]
-    logger.debug(f"Actually using {max_rooms} rooms")
-    weighted_round_robin_surgery_to_room(timeslot_list, operating_rooms)
-    # distribute_timeslots_to_operating_rooms(timeslot_list, operating_rooms)
-    distribute_timeslots_to_days(operating_rooms)
+        solutions = map(solve, room_durations)
+
+    for room, timeslot_indices_by_day in zip(rooms, solutions):
+        if timeslot_indices_by_day is None:
+            continue
+        logger.debug(f"[Optimization] For Room: {room}")
+        timeslots = room.timeslots_to_schedule
+        for day, daily_timeslot_indices in enumerate(timeslot_indices_by_day):
+            daily_timeslots = [timeslots[idx] for idx in daily_timeslot_indices]
+            logger.debug(f"Day: {day} | {daily_timeslots}")
+            room.timeslots_by_day.append(daily_timeslots)
+
+
+def perform_preliminary_scheduling(
+    timeslot_list: List[Timeslot],
+    operating_rooms: List[OperatingRoom],
+    solver_config: SolverConfig = None,
+    parallel_day_packing: bool = False,
+    day_packing_model: DayPackingModel = DayPackingModel.ASSIGNMENT,
+    joint_model: bool = False,
+    starting_day: datetime.date = None,
+    cache: PreliminarySchedulingCache = None,
+    target_horizon_days: int = None,
+) -> datetime.date:
+    """
+    Assign the timeslots to rooms, and then to days within each room.
+    Returns the expected completion date: the last day with timeslots, once the rooms
+    are scheduled from `starting_day`.
+    With `joint_model`, rooms and days are chosen together in a single model
+    (over all rooms), falling back to the two-phase approach if it finds no solution.
+
+    With a `cache`, instances with the same durations, room weekdays and starting
+    weekday are restored from a previous solution without running any solver, if it
+    was solved with the same options and solver limits.
+
+    In the two-phase approach, only a subset of the rooms is used: the fewest rooms
+    that finish within `target_horizon_days` (or as early as possible, if not given).
+    """
+    if starting_day is None:
+        starting_day = datetime.datetime.now().date()
+    if solver_config is None:
+        solver_config = SolverConfig()
+    variant = "-".join(
+        [
+            "joint" if joint_model else f"two-phase-{target_horizon_days}",
+            day_packing_model.name,
+            "parallel" if parallel_day_packing else "serial",
+            solver_config.solution_quality_key(),
+        ]
+    )
+    if cache is not None and cache.restore(
+        timeslot_list, operating_rooms, variant, starting_day
+    ):
+        return get_completion_date(operating_rooms, starting_day)
+
+    _perform_preliminary_scheduling(
+        timeslot_list,
+        operating_rooms,
+        solver_config,
+        parallel_day_packing,
+        day_packing_model,
+        joint_model,
+        starting_day,
+        target_horizon_days,
+    )
+    if cache is not None:
+        cache.store(timeslot_list, operating_rooms, variant, starting_day)
+    completion_date = get_completion_date(operating_rooms, starting_day)
+    logger.info(f"Preliminary schedule is expected to finish on {completion_date}")
+    return completion_date
+
+
+def _perform_preliminary_scheduling(
+    timeslot_list: List[Timeslot],
+    operating_rooms: List[OperatingRoom],
+    solver_config: SolverConfig,
+    parallel_day_packing: bool,
+    day_packing_model: DayPackingModel,
+    joint_model: bool,
+    starting_day: datetime.date,
+    target_horizon_days: int,
+):
+    if joint_model:
+        room_to_days = distribute_timeslots_to_rooms_and_days(
+            timeslot_list, operating_rooms, solver_config, starting_day
+        )
+        if room_to_days is not None:
+            return
+        logger.warning("Joint model failed, falling back to two-phase scheduling")
+
+    # Don't spread few surgeries over too many rooms
+    room_selection = select_operating_rooms(
+        timeslot_list, operating_rooms, starting_day, target_horizon_days
+    )
+    operating_rooms = room_selection.rooms
+    logger.debug(f"Actually using {len(operating_rooms)} rooms")
+    greedy_surgery_to_room(timeslot_list, operating_rooms)
+    # distribute_timeslots_to_operating_rooms(
+    #     timeslot_list, operating_rooms, solver_config=solver_config
+    # )
+    distribute_timeslots_to_days(
+        operating_rooms,
+        solver_config,
+        parallel=parallel_day_packing,
+        day_packing_model=day_packing_model,
+    )
@@ -3,16 +3,20 @@ import glob
 import os
 import warnings
 from random import choice
+from typing import List
 
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 from loguru import logger
 
+from operank_scheduling.algo.batch_feasibility import BatchFeasibility
+from operank_scheduling.algo.global_assignment import assign_patients_globally
 from operank_scheduling.algo.patient_assignment import (
     sort_patients_by_priority_and_duration,
     suggest_feasible_dates,
 )
+from operank_scheduling.algo.solver_config import SolverConfig
 from operank_scheduling.algo.surgery_distribution_models import (
     perform_preliminary_scheduling,
 )
@@ -23,9 +27,10 @@ from operank_scheduling.automation.metrics import (
 )
 from operank_scheduling.models.io_utilities import find_project_root
 from operank_scheduling.models.operank_models import (
+    Patient,
+    SchedulingContext,
     Timeslot,
     get_all_surgeons,
-    get_operating_room_by_name,
     schedule_patient_to_timeslot,
 )
 from operank_scheduling.models.parse_data_to_models import (
@@ -50,25 +55,22 @@ def export_schedule_as_excel(operating_rooms, filepath=None):
         ]
     )
     for room in operating_rooms:
-        for day in room.schedule:
-            for event in room.schedule[day]:
-                if isinstance(event, Timeslot):
-                    continue
-                patient = event.patient
-                surgery_data = {
-                    "Date": day,
-                    "Start Time": event.scheduled_time,
-                    "End Time": event.scheduled_time
-                    + datetime.timedelta(minutes=event.duration),
-                    "OR": room.id,
-                    "Patient ID": patient.patient_id,
-                    "Patient Name": patient.name,
-                    "Surgery": patient.surgery_name,
-                    "Surgeon": event.surgeon,
-                }
-                with warnings.catch_warnings():
-                    warnings.simplefilter("ignore", category=FutureWarning)
-                    df = df.append(surgery_data, ignore_index=True)
+        for day, event in room.iter_surgeries():
+            patient = event.patient
+            surgery_data = {
+                "Date": day,
+                "Start Time": event.scheduled_time,
+                "End Time": event.scheduled_time
+                + datetime.timedelta(minutes=event.duration),
+                "OR": room.id,
+                "Patient ID": patient.patient_id,
+                "Patient Name": patient.name,
+                "Surgery": patient.surgery_name,
+                "Surgeon": event.surgeon,
+            }
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=FutureWarning)
+                df = df.append(surgery_data, ignore_index=True)
     df.sort_values(by=["Date"], inplace=True)
     if filepath is not None:
         df.to_excel(f"{filepath}", sheet_name="OR Schedule")
@@ -84,8 +86,7 @@ full_x = list()
 full_y = list()
 
 
-def run_automation_cycle(automation_index: int):
-    failed_to_schedule = 0
+def load_automation_context() -> SchedulingContext:
     # Load surgeons
     logger.info("Loading surgeon data...")
     surgeon_list = get_all_surgeons()
@@ -128,16 +129,32 @@ def run_automation_cycle(automation_index: int):
     # )
     logger.warning("Added extra timeslots!!!!")
 
-    # Do preliminary scheduling
-    perform_preliminary_scheduling(timeslot_list, operating_rooms)
-    for room in operating_rooms:
-        room.schedule_timeslots_to_days(datetime.datetime.now().date())
+    return SchedulingContext(
+        patients=patient_list,
+        surgeries=surgery_list,
+        surgeons=surgeon_list,
+        rooms=operating_rooms,
+        timeslots=timeslot_list,
+    )
+
+
+def schedule_patients_one_by_one(
+    patient_list: List[Patient], context: SchedulingContext
+) -> int:
+    """
+    Book the patients in order, each at a random one of its suggested slots.
+    Returns the amount of patients that could not be scheduled.
+    """
+    failed_to_schedule = 0
+    # Patients without any feasible option are skipped without searching
+    feasibility = BatchFeasibility(patient_list, context)
+    feasibility.log_summary()
 
     for idx, patient in enumerate(patient_list):
         logger.info(f"Scheduling patient {idx + 1}/{len(patient_list)}")
-        timeslots_data = suggest_feasible_dates(
-            patient, surgery_list, operating_rooms, surgeon_list
-        )
+        timeslots_data = None
+        if feasibility.has_options(patient):
+            timeslots_data = suggest_feasible_dates(patient, context)
         if timeslots_data is None:
             logger.critical(
                 f"Failed to schedule patient {idx + 1} who had a priority of {patient.priority}❌"
@@ -149,17 +166,57 @@ def run_automation_cycle(automation_index: int):
             best_slot = selected_timeslot[1]
             timeslot = selected_timeslot[2]
             surgeon_name = selected_timeslot[3]
-            operating_room = get_operating_room_by_name(room.id, operating_rooms)
+            operating_room = context.get_operating_room_by_name(room.id)
             schedule_patient_to_timeslot(
                 patient,
                 best_slot,
                 timeslot,
                 operating_room,
-                surgery_list,
+                context,
                 surgeon_name,
-                surgeon_list,
             )
+            feasibility.record_booking(operating_room, best_slot.date(), surgeon_name)
             logger.info(f"Scheduled patient {idx + 1} at {best_slot}")
+    return failed_to_schedule
+
+
+def run_automation_cycle(
+    automation_index: int,
+    context: SchedulingContext = None,
+    global_assignment: bool = False,
+    solver_config: SolverConfig = None,
+):
+    """
+    Schedule all the patients of `context`, or of the example assets if not given.
+    With `global_assignment`, all patients are assigned in a single optimization model
+    instead of one by one.
+    """
+    if context is None:
+        context = load_automation_context()
+    patient_list = context.patients
+    surgery_list = context.surgeries
+    operating_rooms = context.rooms
+    timeslot_list = context.timeslots
+
+    # Do preliminary scheduling
+    starting_day = datetime.datetime.now().date()
+    perform_preliminary_scheduling(
+        timeslot_list, operating_rooms, starting_day=starting_day
+    )
+    for room in operating_rooms:
+        room.schedule_timeslots_to_days(starting_day)
+
+    if global_assignment:
+        unscheduled_patients = assign_patients_globally(
+            patient_list, context, solver_config=solver_config
+        )
+        for patient in unscheduled_patients:
+            logger.critical(
+                f"Failed to schedule {patient.name} who had a priority of {patient.priority}❌"
+            )
+        failed_to_schedule = len(unscheduled_patients)
+    else:
+        failed_to_schedule = schedule_patients_one_by_one(patient_list, context)
 
     export_schedule_as_excel(
         operating_rooms,
@@ -0,0 +1,61 @@
+import random
+import time
+import tracemalloc
+from typing import Dict
+
+import pandas as pd
+from loguru import logger
+
+from operank_scheduling.models.parse_data_to_models import parse_single_json_block
+
+"""
+Memory benchmark for the domain models of large waitlists.
+Builds the patients, surgeries and timeslots of a synthetic waitlist the same way the
+loaders do, and reports the memory they hold (as traced by `tracemalloc`) per patient.
+Run it on two revisions to compare their models.
+"""
+
+waitlist_sizes = [10_000, 100_000]
+surgery_names = ["Lap Chole", "Hernia Repair", "Mastectomy", "Gastric Bypass"]
+referrers = ["Clinic A", "Clinic B", "Clinic C"]
+
+
+def generate_patient_data(patients_amt: int, seed: int = 0):
+    rng = random.Random(seed)
+    for patient_idx in range(patients_amt):
+        yield {
+            "name": f"Patient {patient_idx}",
+            "patient_id": str(100000000 + patient_idx),
+            # Strings are parsed from text per row, so each row gets its own copies
+            "surgery_name": "".join(rng.choice(surgery_names)),
+            "referrer": "".join(rng.choice(referrers)),
+            "estimated_duration_m": rng.choice([45, 90, 150, 200]),
+            "phone_number": f"050-{patient_idx:07d}",
+            "priority": rng.randint(1, 4),
+        }
+
+
+def benchmark_waitlist(patients_amt: int) -> Dict:
+    patient_data = list(generate_patient_data(patients_amt))
+    tracemalloc.start()
+    build_start = time.time()
+    models = [parse_single_json_block(data) for data in patient_data]
+    build_time = time.time() - build_start
+    model_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "patients": len(models),
+        "build [s]": round(build_time, 3),
+        "total [MB]": round(model_bytes / 2**20, 1),
+        "bytes per patient": round(model_bytes / patients_amt),
+    }
+
+
+if __name__ == "__main__":
+    results = list()
+    for patients_amt in waitlist_sizes:
+        logger.info(f"Benchmarking a waitlist of {patients_amt} patients")
+        results.append(benchmark_waitlist(patients_amt))
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(pd.DataFrame(results))
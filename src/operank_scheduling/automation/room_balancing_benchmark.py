@@ -0,0 +1,91 @@
+import random
+import time
+from typing import Dict, List
+
+import pandas as pd
+from loguru import logger
+from ortools.sat.python import cp_model
+
+from operank_scheduling.algo.solver_config import SolverConfig
+from operank_scheduling.algo.surgery_distribution_models import (
+    RoomBalancingObjective,
+    build_room_distribution_model,
+    restructure_data,
+)
+from operank_scheduling.models.operank_models import OperatingRoom, Timeslot
+
+"""
+Scaling benchmark for the room balancing formulations of
+`distribute_timeslots_to_operating_rooms`.
+For each room count and objective, report the time until the first feasible solution
+was found and the time until optimality was proven (if within the time budget).
+"""
+
+room_counts = [5, 20, 50]
+timeslots_per_room = 8
+time_budget_s = 60.0
+
+
+class FirstSolutionTimer(cp_model.CpSolverSolutionCallback):
+    def __init__(self):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.start_time = time.time()
+        self.first_solution_time = None
+
+    def on_solution_callback(self):
+        if self.first_solution_time is None:
+            self.first_solution_time = time.time() - self.start_time
+
+
+def generate_instance(rooms_amt: int, seed: int = 0):
+    rng = random.Random(seed)
+    rooms = list()
+    for room_idx in range(rooms_amt):
+        room = OperatingRoom(id=f"o{room_idx}", properties=[])
+        # Rooms open between 1 and 5 days a week
+        room.add_non_working_days(rng.sample([0, 1, 2, 3, 6], rng.randint(0, 4)))
+        rooms.append(room)
+    timeslots = [
+        Timeslot(duration=rng.choice(Timeslot.bins[:4]))
+        for _ in range(rooms_amt * timeslots_per_room)
+    ]
+    return timeslots, rooms
+
+
+def benchmark_objective(
+    timeslots: List[Timeslot],
+    rooms: List[OperatingRoom],
+    balancing_objective: RoomBalancingObjective,
+) -> Dict:
+    data = restructure_data(timeslots, rooms)
+    build_start = time.time()
+    model, _ = build_room_distribution_model(data, balancing_objective)
+    build_time = time.time() - build_start
+
+    solver = SolverConfig(max_time_in_seconds=time_budget_s).create_solver()
+    timer = FirstSolutionTimer()
+    status = solver.Solve(model, timer)
+    model_proto = model.Proto()
+    return {
+        "rooms": len(rooms),
+        "objective": balancing_objective.name,
+        "variables": len(model_proto.variables),
+        "constraints": len(model_proto.constraints),
+        "build [s]": round(build_time, 3),
+        "first feasible [s]": timer.first_solution_time,
+        "optimal [s]": solver.WallTime() if status == cp_model.OPTIMAL else None,
+        "status": solver.StatusName(status),
+        "objective value": solver.ObjectiveValue(),
+    }
+
+
+if __name__ == "__main__":
+    results = list()
+    for rooms_amt in room_counts:
+        timeslots, rooms = generate_instance(rooms_amt)
+        for balancing_objective in RoomBalancingObjective:
+            logger.info(f"Benchmarking {balancing_objective.name} with {rooms_amt} rooms")
+            results.append(benchmark_objective(timeslots, rooms, balancing_objective))
+
+    with pd.option_context("display.max_columns", None, "display.width", 200):
+        print(pd.DataFrame(results))
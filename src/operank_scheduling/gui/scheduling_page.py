@@ -4,25 +4,18 @@ from typing import Callable, List, Tuple
 from nicegui import ui
 from loguru import logger
 
-from operank_scheduling.algo.patient_assignment import suggest_feasible_dates
 from operank_scheduling.gui.theme import AppTheme
 from operank_scheduling.gui.structs import AppState, UIScreen
 from operank_scheduling.models.operank_models import (
     Patient,
     Surgeon,
     Timeslot,
-    get_operating_room_by_name,
     schedule_patient_to_timeslot,
 )
 
 
 def fetch_valid_timeslots(patient: Patient, app_state: AppState):
-    surgery_list = app_state.surgeries
-    operating_rooms = app_state.rooms
-    surgeons = app_state.surgeons
-    timeslots_data = suggest_feasible_dates(
-        patient, surgery_list, operating_rooms, surgeons
-    )
+    timeslots_data = app_state.suggestion_prefetcher.get(patient)
     if timeslots_data is None:
         return None
     return [(slot[0].id, slot[1], slot[2], slot[3]) for slot in timeslots_data]
@@ -30,10 +23,13 @@ def fetch_valid_timeslots(patient: Patient, app_state: AppState):
 
 class PatientSchedulingScreen:
     def __init__(self, app_state: AppState, refresh_function: Callable) -> None:
-        patient = app_state.patients[
-            app_state.current_patient_idx % len(app_state.patients)
-        ]
+        patient_idx = app_state.current_patient_idx % len(app_state.patients)
+        patient = app_state.patients[patient_idx]
         available_slots = fetch_valid_timeslots(patient, app_state)
+        # Search for the following patients while this one is being scheduled
+        app_state.suggestion_prefetcher.prefetch(
+            app_state.patients[patient_idx + 1 :] + app_state.patients[:patient_idx]
+        )
         if available_slots is None:
             patient.is_skipped = True
             logger.debug(f"Skipping patient {patient.name}")
@@ -116,18 +112,23 @@ class DateSelectionCard(ui.card):
         if self.patient.is_scheduled:
             return
 
-        operating_room = get_operating_room_by_name(
-            self.operating_room_name, self.app_state.rooms
-        )
-        schedule_patient_to_timeslot(
-            self.patient,
-            self.slot_date,
-            self.timeslot,
-            operating_room,
-            self.app_state.surgeries,
-            self.surgeon_name,
-            self.app_state.surgeons,
+        operating_room = self.app_state.context.get_operating_room_by_name(
+            self.operating_room_name
         )
+        prefetcher = self.app_state.suggestion_prefetcher
+        with prefetcher.lock:
+            schedule_patient_to_timeslot(
+                self.patient,
+                self.slot_date,
+                self.timeslot,
+                operating_room,
+                self.app_state.context,
+                self.surgeon_name,
+            )
+            prefetcher.discard(self.patient)
+            prefetcher.invalidate(
+                self.operating_room_name, self.slot_date.date(), self.surgeon_name
+            )
         ui.notify(
             f"Scheduled {self.patient.name} for {self.slot_date}",
             closeBtn=True,
@@ -8,6 +8,8 @@ from nicegui import events, ui
 from operank_scheduling.algo.patient_assignment import (
     sort_patients_by_priority_and_duration,
 )
+from operank_scheduling.algo.solution_cache import PreliminarySchedulingCache
+from operank_scheduling.algo.solver_config import SolverConfig
 from operank_scheduling.algo.surgery_distribution_models import (
     perform_preliminary_scheduling,
 )
@@ -17,10 +19,12 @@ from operank_scheduling.models.operank_models import Timeslot
 from operank_scheduling.models.parse_data_to_models import (
     load_operating_rooms_from_json,
     load_operating_room_schedule_from_excel,
-    load_patients_from_json,
     load_patients_from_excel,
+    stream_patients_from_json,
 )
 
+preliminary_scheduling_cache = PreliminarySchedulingCache()
+
 
 class SetupPage:
     def __init__(self, app_state: AppState, update_cb: Callable) -> None:
@@ -71,10 +75,14 @@ class SetupPage:
                 file_content
             )
         elif upload_event.name.split(".")[-1] == "json":
-            file_content = upload_event.content.read().decode("utf-8")
-            patient_list, surgery_list, timeslot_list = load_patients_from_json(
-                file_content, mode="stream"
-            )
+            # Parse the upload in batches, instead of reading all of it at once
+            patient_list, surgery_list, timeslot_list = list(), list(), list()
+            for patients, surgeries, timeslots in stream_patients_from_json(
+                upload_event.content
+            ):
+                patient_list.extend(patients)
+                surgery_list.extend(surgeries)
+                timeslot_list.extend(timeslots)
 
         timeslot_list.extend([Timeslot(180) for _ in range(len(patient_list) // 2)])
         timeslot_list.extend([Timeslot(120) for _ in range(len(patient_list) // 2)])
@@ -111,16 +119,24 @@ class SetupPage:
             with self.app_state.canvas.classes("items-center"):
                 self.patients_table.clear()
                 ui.spinner(size="5em")
-            perform_preliminary_scheduling(
-                self.app_state.timeslots, self.app_state.rooms
+            if self.app_state.start_date is None:
+                start_date = datetime.datetime.now().date()
+            else:
+                start_date = datetime.datetime.strptime(self.app_state.start_date, "%Y-%m-%d").date()
+            self.app_state.expected_completion_date = perform_preliminary_scheduling(
+                self.app_state.timeslots,
+                self.app_state.rooms,
+                solver_config=SolverConfig.interactive(),
+                starting_day=start_date,
+                cache=preliminary_scheduling_cache,
             )
 
             for room in self.app_state.rooms:
-                if self.app_state.start_date is None:
-                    room.schedule_timeslots_to_days(datetime.datetime.now().date())
-                else:
-                    datetime_start_date = datetime.datetime.strptime(self.app_state.start_date, "%Y-%m-%d")
-                    room.schedule_timeslots_to_days(datetime_start_date)
+                room.schedule_timeslots_to_days(start_date)
+            ui.notify(
+                "Expected to finish by"
+                f" {self.app_state.expected_completion_date:%d/%m/%Y}"
+            )
 
             logger.info("Moving to scheduling phase")
             self.app_state.current_screen = UIScreen.SCHEDULING
@@ -1,11 +1,13 @@
 from enum import Enum, auto
 from typing import List
 
-from nicegui import ui
+from nicegui import app, ui
 
+from operank_scheduling.gui.suggestion_prefetch import SuggestionPrefetcher
 from operank_scheduling.models.operank_models import (
     OperatingRoom,
     Patient,
+    SchedulingContext,
     Surgeon,
     Surgery,
     Timeslot,
@@ -19,21 +21,75 @@ class UIScreen(Enum):
 
 
 class AppState:
+    """
+    The patients, timeslots, rooms, surgeons and surgeries are kept in a
+    `SchedulingContext`, either given or built from the lists.
+    """
+
     def __init__(
         self,
-        patients: List[Patient],
-        timeslots: List[Timeslot],
-        rooms: List[OperatingRoom],
-        surgeons: List[Surgeon],
-        surgeries: List[Surgery],
+        patients: List[Patient] = None,
+        timeslots: List[Timeslot] = None,
+        rooms: List[OperatingRoom] = None,
+        surgeons: List[Surgeon] = None,
+        surgeries: List[Surgery] = None,
+        context: SchedulingContext = None,
     ) -> None:
-        self.timeslots = timeslots
-        self.patients = patients
-        self.rooms = rooms
-        self.surgeons = surgeons
-        self.surgeries = surgeries
+        if context is None:
+            context = SchedulingContext(
+                patients=patients,
+                surgeries=surgeries,
+                surgeons=surgeons,
+                rooms=rooms,
+                timeslots=timeslots,
+            )
+        self.context = context
+        self.suggestion_prefetcher = SuggestionPrefetcher(context)
+        # Stop the prefetch thread when the session ends
+        app.on_shutdown(self.suggestion_prefetcher.shutdown)
         self.current_screen = UIScreen.SETUP
         self.num_scheduled_patients = 0
         self.canvas = ui.column().classes("m-auto")
         self.current_patient_idx = 0
         self.start_date = None
+        self.expected_completion_date = None
+
+    @property
+    def patients(self) -> List[Patient]:
+        return self.context.patients
+
+    @patients.setter
+    def patients(self, patients: List[Patient]) -> None:
+        self.context.patients = patients
+
+    @property
+    def timeslots(self) -> List[Timeslot]:
+        return self.context.timeslots
+
+    @timeslots.setter
+    def timeslots(self, timeslots: List[Timeslot]) -> None:
+        self.context.timeslots = timeslots
+
+    @property
+    def rooms(self) -> List[OperatingRoom]:
+        return self.context.rooms
+
+    @rooms.setter
+    def rooms(self, rooms: List[OperatingRoom]) -> None:
+        self.context.rooms = rooms
+
+    @property
+    def surgeons(self) -> List[Surgeon]:
+        return self.context.surgeons
+
+    @surgeons.setter
+    def surgeons(self, surgeons: List[Surgeon]) -> None:
+        self.context.surgeons = surgeons
+
+    @property
+    def surgeries(self) -> List[Surgery]:
+        return self.context.surgeries
+
+    @surgeries.setter
+    def surgeries(self, surgeries: List[Surgery]) -> None:
+        self.context.surgeries = surgeries
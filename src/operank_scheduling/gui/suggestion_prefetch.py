@@ -0,0 +1,131 @@
+import datetime
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, List, Tuple, Union
+
+from loguru import logger
+
+from operank_scheduling.algo.patient_assignment import suggest_feasible_dates
+from operank_scheduling.models.operank_models import (
+    OperatingRoom,
+    Patient,
+    SchedulingContext,
+    Timeslot,
+)
+
+Suggestion = Tuple[OperatingRoom, datetime.datetime, Timeslot, str]
+
+
+class SuggestionPrefetcher:
+    """
+    Computes the suggestions of upcoming patients on a thread pool, while the planner
+    is busy with the current one.
+
+    Searching and booking share `lock`, so a search never sees a half-made booking.
+    After a booking, `invalidate` drops the cached suggestions that use the booked
+    room-day or surgeon. The other cached suggestions stay bookable, since nothing
+    they depend on changed. Patients without any suggestion are searched again after
+    every booking.
+    `entries` (and the hit counters) are guarded by `entries_lock`, which is never
+    held during a search. Take it after `lock` when holding both.
+    """
+
+    def __init__(
+        self, context: SchedulingContext, lookahead: int = 5, max_workers: int = 1
+    ) -> None:
+        self.context = context
+        self.lookahead = lookahead
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="suggestion-prefetch"
+        )
+        self.lock = threading.RLock()
+        self.entries_lock = threading.Lock()
+        self.entries: Dict[int, Future] = dict()
+        # Written under the lock, as soon as a search is done
+        self.results: Dict[int, Union[List[Suggestion], None]] = dict()
+        self.hits = 0
+        self.misses = 0
+
+    def _search(self, patient: Patient) -> Union[List[Suggestion], None]:
+        with self.lock:
+            # Already searched inline by `get`, while this search was waiting
+            if patient.uuid in self.results:
+                return self.results[patient.uuid]
+            suggestions = suggest_feasible_dates(patient, self.context)
+            self.results[patient.uuid] = suggestions
+            return suggestions
+
+    def _submit(self, patient: Patient) -> Future:
+        with self.entries_lock:
+            if patient.uuid not in self.entries:
+                self.entries[patient.uuid] = self.executor.submit(self._search, patient)
+            return self.entries[patient.uuid]
+
+    def get(self, patient: Patient) -> Union[List[Suggestion], None]:
+        """
+        Suggestions for `patient`, from the cache if prefetched. A patient whose
+        search wasn't done yet is searched right away, instead of waiting behind
+        the queued lookahead searches.
+        """
+        with self.entries_lock:
+            entry = self.entries.get(patient.uuid)
+            if entry is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+            if entry is not None and entry.done() and not entry.cancelled():
+                return entry.result()
+            if entry is not None:
+                # Fails if it is already running, and then it finds our result
+                entry.cancel()
+
+        with self.lock:
+            suggestions = self._search(patient)
+            searched = Future()
+            searched.set_result(suggestions)
+            with self.entries_lock:
+                self.entries[patient.uuid] = searched
+        return suggestions
+
+    def prefetch(self, patients: List[Patient]) -> None:
+        """
+        Queue the searches of the next `lookahead` unscheduled patients.
+        """
+        upcoming_patients = [
+            patient
+            for patient in patients
+            if not (patient.is_scheduled or patient.is_skipped)
+        ][: self.lookahead]
+        for patient in upcoming_patients:
+            self._submit(patient)
+
+    def discard(self, patient: Patient) -> None:
+        with self.lock:
+            self.results.pop(patient.uuid, None)
+            with self.entries_lock:
+                self.entries.pop(patient.uuid, None)
+
+    def invalidate(self, room_id: str, day: datetime.date, surgeon_name: str) -> None:
+        """
+        Drop the entries that were affected by a booking in `room_id` on `day`
+        by `surgeon_name`. Call while holding `lock`, right after booking.
+        Searches that didn't run yet will see the booking, so only finished ones
+        are checked.
+        """
+        invalidated = list()
+        with self.lock:
+            for uuid, suggestions in list(self.results.items()):
+                if suggestions is None or any(
+                    (room.id == room_id and start_time.date() == day)
+                    or suggested_surgeon == surgeon_name
+                    for room, start_time, _, suggested_surgeon in suggestions
+                ):
+                    del self.results[uuid]
+                    invalidated.append(uuid)
+            with self.entries_lock:
+                for uuid in invalidated:
+                    self.entries.pop(uuid, None)
+        logger.debug(f"[Prefetch] Invalidated {len(invalidated)} cached suggestions")
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
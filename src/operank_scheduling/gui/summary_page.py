@@ -5,7 +5,7 @@ import pandas as pd
 from nicegui import ui
 
 from operank_scheduling.gui.structs import AppState
-from operank_scheduling.models.operank_models import OperatingRoom, Timeslot
+from operank_scheduling.models.operank_models import OperatingRoom
 
 
 class RoomSchedule:
@@ -40,26 +40,21 @@ class RoomSchedule:
             },
         ]
         rows = []
-        for day in room.schedule:
-            daily_rows = []
-            for surgery in room.schedule[day]:
-                if isinstance(surgery, Timeslot):
-                    continue
-                surgery_end_time = surgery.scheduled_time + datetime.timedelta(
-                    minutes=surgery.duration
-                )
-                daily_rows.append(
-                    {
-                        "date": f"{day}",
-                        "start": f"{surgery.scheduled_time.time()}",
-                        "end": f"{surgery_end_time.time()}",
-                        "surgeon": f"{surgery.surgeon}",
-                        "patient": f"{surgery.patient.name}",
-                        "procedure": f"{surgery.name}",
-                    }
-                )
-            daily_rows.sort(key=lambda x: x["start"])
-            rows += daily_rows
+        # Surgeries come by day and start time
+        for day, surgery in room.iter_surgeries():
+            surgery_end_time = surgery.scheduled_time + datetime.timedelta(
+                minutes=surgery.duration
+            )
+            rows.append(
+                {
+                    "date": f"{day}",
+                    "start": f"{surgery.scheduled_time.time()}",
+                    "end": f"{surgery_end_time.time()}",
+                    "surgeon": f"{surgery.surgeon}",
+                    "patient": f"{surgery.patient.name}",
+                    "procedure": f"{surgery.name}",
+                }
+            )
         ui.table(columns=table_cols, rows=rows, row_key="name", title=f"{room.id}")
 
 
@@ -91,23 +86,20 @@ def export_schedule_as_excel():
         ]
     )
     for room in export_app_state.rooms:
-        for day in room.schedule:
-            for event in room.schedule[day]:
-                if isinstance(event, Timeslot):
-                    continue
-                patient = event.patient
-                surgery_data = {
-                    "Date": day,
-                    "Start Time": event.scheduled_time,
-                    "End Time": event.scheduled_time
-                    + datetime.timedelta(minutes=event.duration),
-                    "OR": room.id,
-                    "Patient ID": patient.patient_id,
-                    "Patient Name": patient.name,
-                    "Surgery": patient.surgery_name,
-                    "Surgeon": event.surgeon,
-                }
-                df = df.append(surgery_data, ignore_index=True)
+        for day, event in room.iter_surgeries():
+            patient = event.patient
+            surgery_data = {
+                "Date": day,
+                "Start Time": event.scheduled_time,
+                "End Time": event.scheduled_time
+                + datetime.timedelta(minutes=event.duration),
+                "OR": room.id,
+                "Patient ID": patient.patient_id,
+                "Patient Name": patient.name,
+                "Surgery": patient.surgery_name,
+                "Surgeon": event.surgeon,
+            }
+            df = df.append(surgery_data, ignore_index=True)
     df.sort_values(by=["Date"], inplace=True)
     df.to_excel("Exported_Schedule.xlsx", sheet_name="OR Schedule")
     ui.notify("Exported the schedule successfully! 🚀")
@@ -4,6 +4,7 @@ from operank_scheduling.gui.scheduling_page import PatientSchedulingUI
 from operank_scheduling.gui.setup_page import SetupPage
 from operank_scheduling.gui.summary_page import OperatingRoomScheduleScreen
 from operank_scheduling.models.operank_models import (
+    SchedulingContext,
     get_all_surgeons,
 )
 from operank_scheduling.models.parse_hopital_data import load_surgeon_schedules
@@ -14,9 +15,7 @@ export_app_state = None
 
 class StateManager:
     def __init__(self) -> None:
-        self.app_state = AppState(
-            patients=[], timeslots=[], rooms=[], surgeons=[], surgeries=[]
-        )
+        self.app_state = AppState(context=SchedulingContext())
         logger.info("Loading surgeon data...")
         self.app_state.surgeons = get_all_surgeons()
         logger.info("Loading surgeon schedules...")
@@ -0,0 +1,63 @@
+import datetime
+import heapq
+from bisect import bisect_left, insort
+from itertools import islice, repeat
+from typing import Dict, Iterator, List, Tuple
+
+
+class FreeSlotIndex:
+    """
+    The free timeslots of a room, as bin duration -> sorted days that have at least
+    one free timeslot of that duration (with a count per bin and day).
+    Finding the first days with a free slot of some minimal duration takes a binary
+    search per bin duration, and days with no free slots left are never visited.
+    """
+
+    def __init__(self) -> None:
+        self.days_by_duration: Dict[int, List[datetime.date]] = dict()
+        self.counts: Dict[Tuple[int, datetime.date], int] = dict()
+
+    def __len__(self) -> int:
+        return sum(self.counts.values())
+
+    def add(self, day: datetime.date, duration: int) -> None:
+        key = (duration, day)
+        self.counts[key] = self.counts.get(key, 0) + 1
+        if self.counts[key] == 1:
+            insort(self.days_by_duration.setdefault(duration, list()), day)
+
+    def remove(self, day: datetime.date, duration: int) -> None:
+        key = (duration, day)
+        if key not in self.counts:
+            raise KeyError(f"No free {duration}m timeslot on {day}")
+        self.counts[key] -= 1
+        if self.counts[key] == 0:
+            del self.counts[key]
+            days = self.days_by_duration[duration]
+            del days[bisect_left(days, day)]
+
+    def iter_days(
+        self, min_duration: int, from_day: datetime.date = None
+    ) -> Iterator[Tuple[datetime.date, int]]:
+        """
+        Yield (day, duration) for every day with a free timeslot of at least
+        `min_duration`, by date. The duration is of the shortest such timeslot that day.
+        """
+        days_per_duration = list()
+        for duration, days in self.days_by_duration.items():
+            if duration < min_duration:
+                continue
+            start = 0 if from_day is None else bisect_left(days, from_day)
+            days_from_start = map(days.__getitem__, range(start, len(days)))
+            days_per_duration.append(zip(days_from_start, repeat(duration)))
+        last_day = None
+        # Sorted by day, then duration - so the first entry of a day is the shortest
+        for day, duration in heapq.merge(*days_per_duration):
+            if day != last_day:
+                last_day = day
+                yield day, duration
+
+    def find_days(
+        self, min_duration: int, from_day: datetime.date = None, limit: int = None
+    ) -> List[Tuple[datetime.date, int]]:
+        return list(islice(self.iter_days(min_duration, from_day), limit))
@@ -1,6 +1,10 @@
 import datetime
-from typing import List, Dict, Union, Tuple
+import sys
+from typing import Dict, Iterator, List, Tuple, Union
 
+from .free_slot_index import FreeSlotIndex
+from .room_day_schedule import RoomDaySchedule
+from .surgeon_availability import SurgeonAvailability, minute_to_time
 from .parse_hopital_data import load_surgeon_data, map_surgery_to_team
 from operank_scheduling.models.enums import surgeon_teams
 
@@ -8,13 +12,28 @@ surgery_to_team_mapping = map_surgery_to_team()
 
 
 class OperatingRoom:
+    __slots__ = (
+        "id",
+        "properties",
+        "timeslots_to_schedule",
+        "timeslots_by_day",
+        "day_indices",
+        "schedule",
+        "available_time",
+        "free_slots",
+        "non_working_days",
+    )
+
     def __init__(self, id: str, properties: List[str] = []) -> None:
         self.id = id
         self.properties = properties
         self.timeslots_to_schedule: List[Timeslot] = list()
         self.timeslots_by_day: List[List[Timeslot]] = list()
-        self.schedule: Dict[datetime.date, List[Union[Timeslot, Surgery]]] = dict()
+        # Calendar day -> its entry in `timeslots_by_day`
+        self.day_indices: Dict[datetime.date, int] = dict()
+        self.schedule: Dict[datetime.date, RoomDaySchedule] = dict()
         self.available_time: Dict[datetime.date, datetime.datetime] = dict()
+        self.free_slots = FreeSlotIndex()
         self.non_working_days = [4, 5]  # 4: Friday, 5: Saturday
 
     def __repr__(self) -> str:
@@ -25,7 +44,7 @@ class OperatingRoom:
             if day not in self.non_working_days:
                 self.non_working_days.append(day)
 
-    def _get_next_working_days(
+    def get_next_working_days(
         self, current_day: datetime.date, days_to_generate: int
     ) -> List[datetime.date]:
         workdays = list()
@@ -48,18 +67,69 @@ class OperatingRoom:
             day=starting_day_date.day,
         )
 
-        working_days = self._get_next_working_days(
+        working_days = self.get_next_working_days(
             starting_day_datetime, len(self.timeslots_by_day)
         )
 
         for day_idx, day in enumerate(working_days):
             # Add timeslots to the daily schedule, starting with longest (reverse order)
             sorted_timeslots = sorted(self.timeslots_by_day[day_idx], key=lambda x: x.duration, reverse=True)
-            self.schedule[day] = sorted_timeslots
+            self.schedule[day] = RoomDaySchedule(sorted_timeslots)
             self.available_time[day] = datetime.datetime.combine(day, datetime.time(hour=8))
+            self.day_indices[day] = day_idx
+        self.index_free_slots()
+
+    def add_timeslots_to_day(
+        self, day: datetime.date, timeslots: List["Timeslot"]
+    ) -> None:
+        """
+        Add free timeslots to a day of the schedule, opening the day if needed.
+        """
+        if day not in self.schedule:
+            self.schedule[day] = RoomDaySchedule()
+            self.available_time[day] = datetime.datetime.combine(
+                day, datetime.time(hour=8)
+            )
+            self.day_indices[day] = len(self.timeslots_by_day)
+            self.timeslots_by_day.append(list())
+        self.schedule[day].extend(timeslots)
+        for timeslot in timeslots:
+            self.free_slots.add(day, timeslot.duration)
+        if day in self.day_indices:
+            self.timeslots_by_day[self.day_indices[day]].extend(timeslots)
+
+    def index_free_slots(self):
+        """
+        Rebuild the free slot index from the schedule.
+        Only needed after editing `schedule` directly - `book_timeslot` keeps it updated.
+        """
+        self.free_slots = FreeSlotIndex()
+        for day, day_schedule in self.schedule.items():
+            for timeslot in day_schedule.free_timeslots():
+                self.free_slots.add(day, timeslot.duration)
+
+    def get_free_timeslot(
+        self, day: datetime.date, duration: int
+    ) -> Union["Timeslot", None]:
+        return self.schedule[day].get_free_timeslot(duration)
+
+    def book_timeslot(
+        self, day: datetime.date, timeslot: "Timeslot", surgery: "Surgery"
+    ) -> None:
+        self.schedule[day].book(timeslot, surgery)
+        self.free_slots.remove(day, timeslot.duration)
+
+    def iter_surgeries(self) -> Iterator[Tuple[datetime.date, "Surgery"]]:
+        """
+        Yield (day, surgery) for every booked surgery, by day and start time.
+        """
+        for day in sorted(self.schedule):
+            for surgery in self.schedule[day].surgeries():
+                yield day, surgery
 
 
 class Timeslot:
+    __slots__ = ("duration",)
     bins = [30, 60, 120, 180, 360, 480]
 
     def __init__(self, duration: int) -> None:
@@ -79,6 +149,19 @@ class Timeslot:
 
 
 class Patient:
+    __slots__ = (
+        "name",
+        "patient_id",
+        "surgery_name",
+        "referrer",
+        "duration_m",
+        "priority",
+        "phone_number",
+        "uuid",
+        "is_scheduled",
+        "is_skipped",
+    )
+
     def __init__(
         self,
         name: str,
@@ -92,8 +175,9 @@ class Patient:
     ) -> None:
         self.name = name
         self.patient_id = patient_id
-        self.surgery_name = surgery_name
-        self.referrer = referrer
+        # Repeated across the waitlist, so keep a single copy of each
+        self.surgery_name = sys.intern(surgery_name)
+        self.referrer = sys.intern(referrer)
         self.duration_m = estimated_duration_m
         self.priority = priority
         self.phone_number = phone_number
@@ -105,7 +189,58 @@ class Patient:
         self.is_scheduled = True
 
 
+class SurgeryType:
+    """
+    Metadata shared by all the surgeries of the same name.
+    """
+
+    __slots__ = ("name", "suitable_teams", "suitable_wards")
+
+    def __init__(
+        self,
+        name: str,
+        suitable_teams: Tuple[str, ...],
+        suitable_wards: Tuple[int, ...],
+    ) -> None:
+        self.name = name
+        self.suitable_teams = suitable_teams
+        self.suitable_wards = suitable_wards
+
+    def __repr__(self) -> str:
+        return f"SurgeryType ({self.name})"
+
+
+surgery_types: Dict[str, SurgeryType] = dict()
+
+
+def get_surgery_type(name: str) -> SurgeryType:
+    """
+    The shared `SurgeryType` of `name`, with its teams or wards from the mapping file.
+    """
+    if name not in surgery_types:
+        suitable_teams, suitable_wards = list(), list()
+        for value in surgery_to_team_mapping.get(name, []):
+            if value.upper() in surgeon_teams:
+                suitable_teams.append(value.upper())
+            else:
+                suitable_wards.append(int(value))
+        surgery_types[name] = SurgeryType(
+            sys.intern(name), tuple(suitable_teams), tuple(suitable_wards)
+        )
+    return surgery_types[name]
+
+
 class Surgery:
+    __slots__ = (
+        "surgery_type",
+        "duration",
+        "requirements",
+        "patient",
+        "uuid",
+        "surgeon",
+        "scheduled_time",
+    )
+
     def __init__(
         self,
         name: str,
@@ -114,42 +249,75 @@ class Surgery:
         patient: Patient,
         requirements: List[str] = list(),
     ) -> None:
-        self.name = name.upper()
+        self.surgery_type = get_surgery_type(name.upper())
         self.duration = duration_in_minutes
         self.requirements = requirements
-        self.suitable_teams = list()
-        self.suitable_wards = list()
         self.patient = patient
         self.uuid = uuid
         self.surgeon = None
-
-        self.assign_team_or_ward()
+        self.scheduled_time = None
 
     def __repr__(self) -> str:
         return f"{self.name} ({self.duration}m)"
 
+    @property
+    def name(self) -> str:
+        return self.surgery_type.name
+
+    @property
+    def suitable_teams(self) -> Tuple[str, ...]:
+        return self.surgery_type.suitable_teams
+
+    @suitable_teams.setter
+    def suitable_teams(self, suitable_teams: List[str]) -> None:
+        # Overriding the teams gives this surgery a type of its own
+        self.surgery_type = SurgeryType(
+            self.name, tuple(suitable_teams), self.suitable_wards
+        )
+
+    @property
+    def suitable_wards(self) -> Tuple[int, ...]:
+        return self.surgery_type.suitable_wards
+
+    @suitable_wards.setter
+    def suitable_wards(self, suitable_wards: List[int]) -> None:
+        self.surgery_type = SurgeryType(
+            self.name, self.suitable_teams, tuple(suitable_wards)
+        )
+
     def can_fit_in(self, timeslot: Timeslot) -> bool:
         return self.duration in timeslot
 
-    def assign_team_or_ward(self):
-        suitable_teams = surgery_to_team_mapping.get(self.name, [])
-        for value in suitable_teams:
-            if value.upper() in surgeon_teams:
-                self.suitable_teams.append(value.upper())
-            else:
-                self.suitable_wards.append(int(value))
-
     def set_time(self, date_and_time: datetime):
         self.scheduled_time = date_and_time
 
+    def can_be_performed_by(self, surgeon: "Surgeon") -> bool:
+        """
+        A surgery is performed by its suitable teams, or by its suitable wards if no
+        team was assigned to it.
+        """
+        if len(self.suitable_teams) == 0:
+            return surgeon.ward in self.suitable_wards
+        return surgeon.team in self.suitable_teams
+
 
 class Surgeon:
+    __slots__ = (
+        "name",
+        "id",
+        "ward",
+        "team",
+        "availability",
+        "occupied_times",
+        "scheduled_operations",
+    )
+
     def __init__(self, name: str, surgeon_id: int, ward: int, team: str) -> None:
         self.name = name
         self.id = surgeon_id
         self.ward = ward
         self.team = team.upper()
-        self.availability: Dict[datetime.date, List[List]] = dict()
+        self.availability = SurgeonAvailability()
         self.occupied_times: Dict[
             datetime.date, List[Tuple[Surgery, datetime.datetime]]
         ] = dict()
@@ -158,39 +326,25 @@ class Surgeon:
     def __repr__(self) -> str:
         return f"{self.name}"
 
-    def is_available_at(self, date: datetime.date):
-        return self.availability[date]
+    def is_available_at(self, date: datetime.date) -> bool:
+        return bool(self.availability.bits[date].any())
 
     def get_earliest_open_timeslot(
         self, date: datetime.date, duration_minutes: int
     ) -> Union[datetime.datetime, None]:
-        for availability_slot in self.availability[date]:
-            window_start_time = datetime.datetime.combine(date, availability_slot[0])
-            window_end_time = datetime.datetime.combine(date, availability_slot[1])
-            if (
-                window_start_time + datetime.timedelta(minutes=duration_minutes)
-                <= window_end_time
-            ):
-                return self, window_start_time
-        # Otherwise, this surgeon can not take this operation, so we return None
-        return None
+        window_start = self.availability.earliest_free_run(date, duration_minutes)
+        if window_start is None:
+            # This surgeon can not take this operation
+            return None
+        return self, datetime.datetime.combine(date, minute_to_time(window_start))
 
     def is_surgeon_available_at(
         self, date_and_time: datetime.datetime, duration_minutes: int
     ) -> Union[datetime.datetime, None]:
-        current_date = date_and_time.date()
-        for availability_slot in self.availability[current_date]:
-            # Check if the requested time is within the availability slot:
-            if not (date_and_time.time() >= availability_slot[0]) or not (date_and_time.time() <= availability_slot[0]):
-                continue
-            window_start_time = date_and_time
-            window_end_time = datetime.datetime.combine(current_date, availability_slot[1])
-            if (
-                window_start_time + datetime.timedelta(minutes=duration_minutes)
-                <= window_end_time
-            ):
-                return self, window_start_time
-        # Otherwise, this surgeon can not take this operation, so we return None
+        # Only windows that start at the requested time are considered
+        window_length = self.availability.window_length(date_and_time)
+        if window_length > 0 and window_length >= duration_minutes:
+            return self, date_and_time
         return None
 
     def add_surgery(self, surgery: Surgery, surgery_time: datetime.datetime) -> None:
@@ -199,22 +353,9 @@ class Surgeon:
             self.occupied_times[date] = list()
         self.occupied_times[date].append((surgery, surgery_time))
 
-        # Modify this availability slot
-        for slot in self.availability[date]:
-            window_start_time = datetime.datetime.combine(date, slot[0])
-            window_end_time = datetime.datetime.combine(date, slot[1])
-            if (surgery_time >= window_start_time) and (surgery_time <= window_end_time):
-                if (
-                    window_start_time + datetime.timedelta(minutes=surgery.duration)
-                    <= window_end_time
-                ):
-                    new_slot_start_time = window_start_time + datetime.timedelta(
-                        minutes=surgery.duration
-                    )
-                    # Set the slot to start after the surgery we just scheduled
-                    slot[0] = new_slot_start_time.time()
-                    self.scheduled_operations += 1
-                    break
+        # Take the surgery's minutes out of the availability window that contains it
+        if self.availability.book(surgery_time, surgery.duration):
+            self.scheduled_operations += 1
 
 
 def get_all_surgeons() -> List[Surgeon]:
@@ -239,9 +380,10 @@ def get_operating_room_by_name(
             return operating_room
 
 
-def replace_timeslot_by_surgery(schedule: List, timeslot: Timeslot, surgery: Surgery):
-    index_to_replace = schedule.index(timeslot)
-    schedule[index_to_replace] = surgery
+def replace_timeslot_by_surgery(
+    room: OperatingRoom, day: datetime.date, timeslot: Timeslot, surgery: Surgery
+):
+    room.book_timeslot(day, timeslot, surgery)
 
 
 def get_surgery_by_patient(patient: Patient, surgeries: List[Surgery]):
@@ -256,24 +398,193 @@ def get_surgeon_by_name(name: str, surgeons: List[Surgeon]) -> Surgeon:
             return surgeon
 
 
+class RoomCapabilityIndex:
+    """
+    Encodes room properties as integer bitmasks over the vocabulary of all properties,
+    so a room satisfies a set of requirements if `requirements & ~room == 0`.
+    The matching rooms are memoized per distinct set of requirements.
+    """
+
+    def __init__(self, rooms: List[OperatingRoom]) -> None:
+        self.rooms = rooms
+        self.capability_bits: Dict[str, int] = dict()
+        for room in rooms:
+            for capability in room.properties:
+                self.capability_bits.setdefault(
+                    capability, 1 << len(self.capability_bits)
+                )
+        self.room_masks = [self.encode(room.properties) for room in rooms]
+        self.matches: Dict[frozenset, Tuple[OperatingRoom, ...]] = dict()
+
+    def encode(self, capabilities: List[str]) -> int:
+        mask = 0
+        for capability in capabilities:
+            mask |= self.capability_bits[capability]
+        return mask
+
+    def find_rooms(self, requirements: List[str]) -> Tuple[OperatingRoom, ...]:
+        key = frozenset(requirements)
+        if key not in self.matches:
+            if any(requirement not in self.capability_bits for requirement in key):
+                # No room has this capability
+                self.matches[key] = tuple()
+            else:
+                required_mask = self.encode(key)
+                self.matches[key] = tuple(
+                    room
+                    for room, room_mask in zip(self.rooms, self.room_masks)
+                    if required_mask & ~room_mask == 0
+                )
+        return self.matches[key]
+
+
+class SchedulingContext:
+    """
+    Owns the patients, surgeries, surgeons and rooms of a scheduling session, and keeps
+    dict indexes over them (by uuid, surgeon name and room id) so lookups are O(1).
+    Reassigning one of the lists rebuilds its index - including after changing the
+    properties of a room.
+    """
+
+    def __init__(
+        self,
+        patients: List[Patient] = None,
+        surgeries: List[Surgery] = None,
+        surgeons: List[Surgeon] = None,
+        rooms: List[OperatingRoom] = None,
+        timeslots: List[Timeslot] = None,
+    ) -> None:
+        self.patients = patients if patients is not None else list()
+        self.surgeries = surgeries if surgeries is not None else list()
+        self.surgeons = surgeons if surgeons is not None else list()
+        self.rooms = rooms if rooms is not None else list()
+        self.timeslots = timeslots if timeslots is not None else list()
+
+    @property
+    def patients(self) -> List[Patient]:
+        return self._patients
+
+    @patients.setter
+    def patients(self, patients: List[Patient]) -> None:
+        self._patients = patients
+        self.patients_by_uuid: Dict[int, Patient] = dict()
+        for patient in patients:
+            self.patients_by_uuid.setdefault(patient.uuid, patient)
+
+    @property
+    def surgeries(self) -> List[Surgery]:
+        return self._surgeries
+
+    @surgeries.setter
+    def surgeries(self, surgeries: List[Surgery]) -> None:
+        self._surgeries = surgeries
+        self.surgeries_by_uuid: Dict[int, Surgery] = dict()
+        for surgery in surgeries:
+            self.surgeries_by_uuid.setdefault(surgery.uuid, surgery)
+
+    @property
+    def surgeons(self) -> List[Surgeon]:
+        return self._surgeons
+
+    @surgeons.setter
+    def surgeons(self, surgeons: List[Surgeon]) -> None:
+        self._surgeons = surgeons
+        self.surgeons_by_name: Dict[str, Surgeon] = dict()
+        for surgeon in surgeons:
+            self.surgeons_by_name.setdefault(surgeon.name, surgeon)
+        # Surgery type -> surgeons that can perform it, filled on first lookup
+        self.eligible_surgeons: Dict[SurgeryType, Tuple[Surgeon, ...]] = dict()
+        self.eligibility_probes: Dict[SurgeryType, Surgery] = dict()
+
+    def add_surgeon(self, surgeon: Surgeon) -> None:
+        self._surgeons.append(surgeon)
+        self.surgeons_by_name.setdefault(surgeon.name, surgeon)
+        for surgery_type, surgery in self.eligibility_probes.items():
+            if surgery.can_be_performed_by(surgeon):
+                self.eligible_surgeons[surgery_type] += (surgeon,)
+
+    def remove_surgeon(self, surgeon: Surgeon) -> None:
+        self._surgeons.remove(surgeon)
+        if self.surgeons_by_name.get(surgeon.name) is surgeon:
+            del self.surgeons_by_name[surgeon.name]
+            for other_surgeon in self._surgeons:
+                if other_surgeon.name == surgeon.name:
+                    self.surgeons_by_name[surgeon.name] = other_surgeon
+                    break
+        for surgery_type, eligible_surgeons in self.eligible_surgeons.items():
+            self.eligible_surgeons[surgery_type] = tuple(
+                s for s in eligible_surgeons if s is not surgeon
+            )
+
+    def get_eligible_surgeons(self, surgery: Surgery) -> Tuple[Surgeon, ...]:
+        """
+        The surgeons that can perform `surgery`, in roster order. Eligibility only
+        depends on the surgery type (shared by surgeries of the same name, unless
+        their teams or wards were overridden), so it is computed once per type.
+        An empty tuple means that no surgeon is eligible.
+        """
+        surgery_type = surgery.surgery_type
+        if surgery_type not in self.eligible_surgeons:
+            self.eligibility_probes[surgery_type] = surgery
+            self.eligible_surgeons[surgery_type] = tuple(
+                surgeon
+                for surgeon in self._surgeons
+                if surgery.can_be_performed_by(surgeon)
+            )
+        return self.eligible_surgeons[surgery_type]
+
+    @property
+    def rooms(self) -> List[OperatingRoom]:
+        return self._rooms
+
+    @rooms.setter
+    def rooms(self, rooms: List[OperatingRoom]) -> None:
+        self._rooms = rooms
+        self.rooms_by_id: Dict[str, OperatingRoom] = dict()
+        for room in rooms:
+            self.rooms_by_id.setdefault(room.id, room)
+        self.room_capabilities = RoomCapabilityIndex(rooms)
+
+    def get_patient_by_uuid(self, uuid: int) -> Union[Patient, None]:
+        return self.patients_by_uuid.get(uuid)
+
+    def get_surgery_by_patient(self, patient: Patient) -> Surgery:
+        surgery = self.surgeries_by_uuid.get(patient.uuid)
+        if surgery is None:
+            raise ValueError("Failed to match surgery to patient with UUID")
+        return surgery
+
+    def get_surgeon_by_name(self, name: str) -> Union[Surgeon, None]:
+        return self.surgeons_by_name.get(name)
+
+    def get_operating_room_by_name(self, name: str) -> Union[OperatingRoom, None]:
+        return self.rooms_by_id.get(name)
+
+
 def schedule_patient_to_timeslot(
     patient: Patient,
     date_and_time: datetime.datetime,
     timeslot: datetime.datetime,
     operating_room: OperatingRoom,
-    surgeries: List[Surgery],
+    surgeries: Union[List[Surgery], SchedulingContext],
     surgeon_name: Surgeon,
-    surgeons_list: List[Surgeon],
+    surgeons_list: List[Surgeon] = None,
 ):
+    """
+    `surgeries` may be a `SchedulingContext`, in which case the surgery and the surgeon
+    are looked up in its indexes and `surgeons_list` is not needed.
+    """
     try:
         surgery_date = date_and_time.date()
-        surgery = get_surgery_by_patient(patient, surgeries)
-        surgeon = get_surgeon_by_name(surgeon_name, surgeons_list)
+        if isinstance(surgeries, SchedulingContext):
+            surgery = surgeries.get_surgery_by_patient(patient)
+            surgeon = surgeries.get_surgeon_by_name(surgeon_name)
+        else:
+            surgery = get_surgery_by_patient(patient, surgeries)
+            surgeon = get_surgeon_by_name(surgeon_name, surgeons_list)
         surgery.surgeon = surgeon_name
         surgery.set_time(date_and_time)
-        replace_timeslot_by_surgery(
-            operating_room.schedule[surgery_date], timeslot, surgery
-        )
+        operating_room.book_timeslot(surgery_date, timeslot, surgery)
         operating_room.available_time[surgery_date] += datetime.timedelta(minutes=surgery.duration)
         surgeon.add_surgery(surgery, date_and_time)
         patient.mark_as_done()
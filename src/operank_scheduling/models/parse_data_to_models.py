@@ -1,6 +1,14 @@
+import codecs
 import json
+import re
+import time
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import IO, Dict, Iterator, List, TextIO, Tuple, Union
+
 import pandas as pd
-from typing import Tuple, List
+from loguru import logger
 
 from operank_scheduling.models.operank_models import (
     Patient,
@@ -30,10 +38,55 @@ To link the surgeries and patients, assign uuid.
 """
 
 auto_id = 0
+# The tail of a JSON value that was cut at the end of a block
+partial_json_token = re.compile(r'[^\s,:\[\]{}"]*')
 
+# Excel headers of the patient data, and the fields they are loaded into
+excel_patient_columns = {
+    "Name": "name",
+    "ID": "patient_id",
+    "Surgery": "surgery_name",
+    "Referrer": "referrer",
+    "Phone": "phone_number",
+    "Priority": "priority",
+}
+patient_fields = [
+    "name",
+    "patient_id",
+    "surgery_name",
+    "referrer",
+    "estimated_duration_m",
+    "phone_number",
+    "priority",
+]
+# Columns the duration model needs (in any letter case)
+duration_model_columns = [
+    {"surgery", "surgery_name"},
+    {"age"},
+    {"gender", "gender_clean"},
+]
 
-def parse_single_json_block(patient_data: dict) -> Tuple[Patient, Surgery, Timeslot]:
+
+@dataclass
+class PatientIngestion:
+    patients: List[Patient]
+    surgeries: List[Surgery]
+    timeslots: List[Timeslot]
+    stage_times: Dict[str, float] = field(default_factory=dict)
+
+
+def reserve_uuids(amount: int) -> range:
+    """
+    Take the next `amount` uuids, which link patients to their surgeries.
+    """
     global auto_id
+    uuids = range(auto_id, auto_id + amount)
+    auto_id += amount
+    return uuids
+
+
+def parse_single_json_block(patient_data: dict) -> Tuple[Patient, Surgery, Timeslot]:
+    uuid = reserve_uuids(1)[0]
     name = patient_data["name"]
     patient_id = patient_data["patient_id"]
     surgery_name = patient_data["surgery_name"].upper()
@@ -50,73 +103,281 @@ def parse_single_json_block(patient_data: dict) -> Tuple[Patient, Surgery, Times
         estimated_duration_m=estimated_duration_m,
         priority=priority,
         phone_number=phone_number,
-        uuid=auto_id,
+        uuid=uuid,
     )
 
     surgery = Surgery(
         name=surgery_name,
         duration_in_minutes=estimated_duration_m,
-        uuid=auto_id,
+        uuid=uuid,
         patient=patient,
     )
 
     timeslot = Timeslot(duration=estimated_duration_m)
-    auto_id += 1
 
     return patient, surgery, timeslot
 
 
-def load_patients_from_json(
-    jsonpath: str, mode="path"
-) -> Tuple[List[Patient], List[Surgery], List[Timeslot]]:
-    patients = list()
-    surgeries = list()
-    timeslots = list()
+def has_duration_model_columns(patient_data_df: pd.DataFrame) -> bool:
+    columns = {str(column).lower() for column in patient_data_df.columns}
+    return all(len(options & columns) for options in duration_model_columns)
+
+
+def validate_patient_columns(patient_data_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Check and normalize the patient fields for the whole table at once.
+    """
+    missing_columns = [
+        column for column in patient_fields if column not in patient_data_df.columns
+    ]
+    if len(missing_columns):
+        raise ValueError(f"Patient data is missing the columns {missing_columns}")
+    patient_data_df = patient_data_df[patient_fields]
+    missing_values = patient_data_df.isna().any(axis=1)
+    if missing_values.any():
+        raise ValueError(
+            "Patient data has missing values in rows"
+            f" {list(patient_data_df.index[missing_values])}"
+        )
+    too_long = patient_data_df["estimated_duration_m"] > Timeslot.bins[-1]
+    if too_long.any():
+        raise IndexError(
+            "Surgery is too long - no appropriate bin found, in rows"
+            f" {list(patient_data_df.index[too_long])}"
+        )
+    return patient_data_df.assign(
+        surgery_name=patient_data_df["surgery_name"].astype(str).str.upper(),
+        referrer=patient_data_df["referrer"].astype(str).str.upper(),
+    )
+
+
+def ingest_patient_table(
+    patient_data_df: pd.DataFrame,
+    stage_times: Dict[str, float] = None,
+    first_uuid: int = None,
+) -> PatientIngestion:
+    """
+    Build the patients, surgeries and timeslots of a table with the fields of
+    `patient_fields` (durations are predicted if the model's columns are given).
+    Every stage works on whole columns, and the models are built straight from them.
+    The time of each stage is added to `stage_times`.
+    The rows get consecutive uuids from `first_uuid`, or from `reserve_uuids`
+    if it isn't given.
+    """
+    stage_times = dict() if stage_times is None else stage_times
+    stage_start = time.perf_counter()
+    if has_duration_model_columns(patient_data_df):
+        # Add estimated duration based on ML model
+        estimated_data_df = estimate_surgery_durations(
+            patient_data_df.rename(columns={"surgery_name": "surgery"})
+        )
+        patient_data_df = patient_data_df.assign(
+            estimated_duration_m=estimated_data_df["estimated_duration_m"]
+        )
+        stage_times["estimate durations"] = time.perf_counter() - stage_start
+        stage_start = time.perf_counter()
+
+    patient_data_df = validate_patient_columns(patient_data_df)
+    columns = {column: patient_data_df[column].tolist() for column in patient_fields}
+    stage_times["validate"] = time.perf_counter() - stage_start
+    stage_start = time.perf_counter()
 
+    if first_uuid is None:
+        uuids = reserve_uuids(len(patient_data_df))
+    else:
+        uuids = range(first_uuid, first_uuid + len(patient_data_df))
+    stage_times["assign uuids"] = time.perf_counter() - stage_start
+    stage_start = time.perf_counter()
+
+    patients = [
+        Patient(
+            name=name,
+            patient_id=patient_id,
+            surgery_name=surgery_name,
+            referrer=referrer,
+            estimated_duration_m=duration,
+            priority=priority,
+            phone_number=phone_number,
+            uuid=uuid,
+        )
+        for (
+            name,
+            patient_id,
+            surgery_name,
+            referrer,
+            duration,
+            phone_number,
+            priority,
+            uuid,
+        ) in zip(*columns.values(), uuids)
+    ]
+    surgeries = [
+        Surgery(
+            name=surgery_name, duration_in_minutes=duration, uuid=uuid, patient=patient
+        )
+        for surgery_name, duration, uuid, patient in zip(
+            columns["surgery_name"], columns["estimated_duration_m"], uuids, patients
+        )
+    ]
+    timeslots = [
+        Timeslot(duration=duration) for duration in columns["estimated_duration_m"]
+    ]
+    stage_times["build models"] = time.perf_counter() - stage_start
+    return PatientIngestion(patients, surgeries, timeslots, stage_times)
+
+
+def log_stage_times(ingestion: PatientIngestion) -> None:
+    stage_times = ", ".join(
+        f"{stage}: {seconds:.3f}s" for stage, seconds in ingestion.stage_times.items()
+    )
+    logger.info(f"Loaded {len(ingestion.patients)} patients ({stage_times})")
+
+
+def ingest_patients_from_json(
+    jsonpath: str, mode="path", first_uuid: int = None
+) -> PatientIngestion:
+    stage_start = time.perf_counter()
     if mode == "path":
         with open(jsonpath, "r") as json_fp:
             all_patients = json.load(json_fp)
     elif mode == "stream":
         all_patients = json.loads(jsonpath)
-    full_patient_data = all_patients["patients"]
-    patient_data_df = pd.DataFrame.from_dict(full_patient_data)
-    full_patient_data = estimate_surgery_durations(
-        patient_data_df
-    )  # Add estimated duration based on ML model
+    patient_data_df = pd.DataFrame.from_records(all_patients["patients"])
+    stage_times = {"read": time.perf_counter() - stage_start}
+    return ingest_patient_table(patient_data_df, stage_times, first_uuid)
+
+
+def load_patients_from_json(
+    jsonpath: str, mode="path"
+) -> Tuple[List[Patient], List[Surgery], List[Timeslot]]:
+    ingestion = ingest_patients_from_json(jsonpath, mode)
+    log_stage_times(ingestion)
+    return ingestion.patients, ingestion.surgeries, ingestion.timeslots
+
+
+def iter_json_array(
+    text_stream: TextIO, key: str = "patients", read_size: int = 2**16
+) -> Iterator:
+    """
+    Yield the values of the array under `key`, reading `text_stream` in blocks of
+    `read_size` characters, so only the current value is kept in memory.
+    Assumes that the first occurrence of `"<key>": [` in the text starts the array.
+    Raises a ValueError with the offset of the first invalid value.
+    """
+    decoder = json.JSONDecoder()
+    array_start = re.compile(rf'"{re.escape(key)}"\s*:\s*\[')
+    buffer = ""
+    read_chars = 0
+    while True:
+        match = array_start.search(buffer)
+        if match is not None:
+            buffer = buffer[match.end() :]
+            break
+        block = text_stream.read(read_size)
+        if not block:
+            raise ValueError(f'No "{key}" array was found')
+        read_chars += len(block)
+        # Keep the tail from the last two quotes on, since a split `"<key>" : [` starts
+        # at one of them (the key's closing quote may already be in the buffer)
+        last_quote = buffer.rfind('"')
+        key_start = buffer.rfind('"', 0, max(last_quote, 0))
+        if key_start == -1:
+            key_start = last_quote
+        buffer = (buffer[key_start:] if key_start != -1 else "") + block
+
+    position = 0
+    at_end = False
+    while True:
+        # Skip to the next value of the array
+        while position < len(buffer) and buffer[position] in " \t\r\n,":
+            position += 1
+        if position < len(buffer) and buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError as error:
+            # Only a value that was cut by the end of the buffer may still be valid
+            if not (
+                error.msg.startswith("Unterminated string")
+                or partial_json_token.fullmatch(buffer, error.pos)
+            ):
+                offset = read_chars - len(buffer) + error.pos
+                raise ValueError(
+                    f'Invalid value in the "{key}" array at offset {offset}:'
+                    f" {error.msg}"
+                ) from None
+            end = None
+        # A number or literal is only complete once a delimiter follows it, since the
+        # next block may continue it (like `12` of `123` or `-6.5` of `-6.5e2`)
+        if end is not None and (
+            at_end or not partial_json_token.fullmatch(buffer, end)
+        ):
+            position = end
+            yield item
+            continue
+        if at_end:
+            raise ValueError(f'The "{key}" array ended unexpectedly')
+        block = text_stream.read(read_size)
+        at_end = len(block) == 0
+        read_chars += len(block)
+        buffer = buffer[position:] + block
+        position = 0
+
+
+def stream_patients_from_json(
+    json_source: Union[str, Path, IO],
+    chunk_size: int = 1000,
+    read_size: int = 2**16,
+    first_uuid: int = None,
+) -> Iterator[Tuple[List[Patient], List[Surgery], List[Timeslot]]]:
+    """
+    Load the patients of a JSON file in batches of up to `chunk_size`.
+    The `patients` array is parsed incrementally and each batch goes through
+    `ingest_patient_table` (and the duration model) on its own, so memory is bounded by
+    the chunk size rather than the file size.
+    `json_source` is a path, or a text or binary file object (which is left open).
+    With `first_uuid`, the batches get consecutive uuids from it.
+    """
+    if isinstance(json_source, (str, Path)):
+        with open(json_source, "r", encoding="utf-8") as json_fp:
+            yield from stream_patients_from_json(
+                json_fp, chunk_size, read_size, first_uuid
+            )
+        return
+    if isinstance(json_source.read(0), bytes):
+        # Unlike `io.TextIOWrapper`, works on any object with `read` (like uploads
+        # spooled to temporary files), and doesn't close it
+        json_source = codecs.getreader("utf-8")(json_source)
+
+    records = iter_json_array(json_source, "patients", read_size)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if len(chunk) == 0:
+            return
+        ingestion = ingest_patient_table(
+            pd.DataFrame.from_records(chunk), first_uuid=first_uuid
+        )
+        if first_uuid is not None:
+            first_uuid += len(chunk)
+        logger.debug(f"Loaded a batch of {len(ingestion.patients)} patients")
+        yield ingestion.patients, ingestion.surgeries, ingestion.timeslots
 
-    for single_patient_data in full_patient_data:
-        patient, surgery, timeslot = parse_single_json_block(single_patient_data)
-        patients.append(patient)
-        surgeries.append(surgery)
-        timeslots.append(timeslot)
 
-    return patients, surgeries, timeslots
+def ingest_patients_from_excel(
+    excelpath: str, first_uuid: int = None
+) -> PatientIngestion:
+    stage_start = time.perf_counter()
+    patient_data_df = pd.read_excel(excelpath).rename(columns=excel_patient_columns)
+    stage_times = {"read": time.perf_counter() - stage_start}
+    return ingest_patient_table(patient_data_df, stage_times, first_uuid)
 
 
 def load_patients_from_excel(
     excelpath: str,
 ) -> Tuple[List[Patient], List[Surgery], List[Timeslot]]:
-    patients = list()
-    surgeries = list()
-    timeslots = list()
-    df = pd.read_excel(excelpath)
-    df = estimate_surgery_durations(df)  # Add estimated duration based on ML model
-
-    for _, row in df.iterrows():
-        patient_data = {
-            "name": row["Name"],
-            "patient_id": row["ID"],
-            "surgery_name": row["Surgery"],
-            "referrer": row["Referrer"],
-            "estimated_duration_m": row["estimated_duration_m"],
-            "phone_number": row["Phone"],
-            "priority": row["Priority"],
-        }
-        patient, surgery, timeslot = parse_single_json_block(patient_data)
-        patients.append(patient)
-        surgeries.append(surgery)
-        timeslots.append(timeslot)
-    return patients, surgeries, timeslots
+    ingestion = ingest_patients_from_excel(excelpath)
+    log_stage_times(ingestion)
+    return ingestion.patients, ingestion.surgeries, ingestion.timeslots
 
 
 def load_operating_room_schedule_from_excel(excelpath: str):
@@ -0,0 +1,133 @@
+import datetime
+from bisect import insort
+from itertools import count
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+
+class RoomDaySchedule:
+    """
+    The timeslots of a room on one day, as an inventory:
+        - Every timeslot gets a stable handle when it is added, and keeps it after
+          being booked, so booking replaces the entry of a handle in O(1).
+        - Open capacity is kept as bin duration -> handles of the free timeslots, so
+          finding a free timeslot of at least some duration takes O(#bins).
+        - Booked surgeries are kept sorted by their start time.
+    Iterating over it yields the entries (free timeslots and booked surgeries) in the
+    order their timeslots were added, like the list it replaces.
+    """
+
+    def __init__(self, timeslots: Iterable = ()) -> None:
+        self.entries: Dict[int, object] = dict()
+        self.handles: Dict[int, int] = dict()  # id(timeslot) -> handle
+        # Ordered dicts as ordered sets, so the first added timeslot of a bin is used
+        self.free_by_bin: Dict[int, Dict[int, None]] = dict()
+        self.booked: List[Tuple[datetime.datetime, int, object]] = list()
+        self.next_handle = count()
+        for timeslot in timeslots:
+            self.add(timeslot)
+
+    def __iter__(self) -> Iterator:
+        return iter(self.entries.values())
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, entry) -> bool:
+        if id(entry) in self.handles:
+            return True
+        return any(surgery is entry for surgery in self.surgeries())
+
+    def __repr__(self) -> str:
+        return f"RoomDaySchedule ({list(self.entries.values())})"
+
+    def add(self, timeslot) -> int:
+        handle = next(self.next_handle)
+        self.entries[handle] = timeslot
+        self.handles[id(timeslot)] = handle
+        self.free_by_bin.setdefault(timeslot.duration, dict())[handle] = None
+        return handle
+
+    def extend(self, timeslots: Iterable) -> None:
+        for timeslot in timeslots:
+            self.add(timeslot)
+
+    def get_handle(self, timeslot) -> int:
+        handle = self.handles.get(id(timeslot))
+        if handle is None:
+            raise ValueError(f"{timeslot} is not a free timeslot of this day")
+        return handle
+
+    def remove(self, timeslot) -> None:
+        """
+        Take a free timeslot out of the day.
+        """
+        handle = self.get_handle(timeslot)
+        del self.handles[id(timeslot)]
+        del self.entries[handle]
+        self._take_capacity(timeslot.duration, handle)
+
+    def book(self, slot: Union[int, object], surgery) -> int:
+        """
+        Replace a free timeslot (or the timeslot of a handle) by `surgery`.
+        The surgery should already have its `scheduled_time`. Returns the handle.
+        """
+        handle = slot if isinstance(slot, int) else self.get_handle(slot)
+        timeslot = self.entries[handle]
+        if self.handles.get(id(timeslot)) != handle:
+            raise ValueError(f"Timeslot {handle} was already booked")
+        del self.handles[id(timeslot)]
+        self.entries[handle] = surgery
+        self._take_capacity(timeslot.duration, handle)
+        start_time = surgery.scheduled_time or datetime.datetime.max
+        insort(self.booked, (start_time, handle, surgery))
+        return handle
+
+    def _take_capacity(self, duration: int, handle: int) -> None:
+        free_handles = self.free_by_bin[duration]
+        del free_handles[handle]
+        if len(free_handles) == 0:
+            del self.free_by_bin[duration]
+
+    def bin_counts(self) -> Dict[int, int]:
+        return {
+            duration: len(handles) for duration, handles in self.free_by_bin.items()
+        }
+
+    def free_timeslots(self) -> Iterator:
+        for handle, entry in self.entries.items():
+            if self.handles.get(id(entry)) == handle:
+                yield entry
+
+    def surgeries(self) -> Iterator:
+        """
+        The booked surgeries, by start time.
+        """
+        for _, _, surgery in self.booked:
+            yield surgery
+
+    def get_free_timeslot(self, duration: int):
+        """
+        A free timeslot of exactly `duration` (the first added), or None.
+        """
+        free_handles = self.free_by_bin.get(duration)
+        if not free_handles:
+            return None
+        return self.entries[next(iter(free_handles))]
+
+    def find_free_timeslot(self, min_duration: int):
+        """
+        The shortest free timeslot of at least `min_duration`, or None.
+        """
+        fitting_bins = [bin for bin in self.free_by_bin if bin >= min_duration]
+        if len(fitting_bins) == 0:
+            return None
+        return self.get_free_timeslot(min(fitting_bins))
+
+    def free_minutes(self) -> int:
+        return sum(bin * len(handles) for bin, handles in self.free_by_bin.items())
+
+    def used_minutes(self) -> int:
+        """
+        Minutes taken by the free timeslots and the booked surgeries.
+        """
+        return sum(entry.duration for entry in self.entries.values())
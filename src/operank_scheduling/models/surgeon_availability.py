@@ -0,0 +1,135 @@
+import datetime
+from collections.abc import MutableMapping
+from typing import Dict, Iterator, List, Union
+
+import numpy as np
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def time_to_minute(time: datetime.time) -> int:
+    if time == datetime.time.max:
+        return MINUTES_PER_DAY
+    return time.hour * 60 + time.minute
+
+
+def minute_to_time(minute: int) -> datetime.time:
+    if minute >= MINUTES_PER_DAY:
+        return datetime.time.max
+    return datetime.time(hour=minute // 60, minute=minute % 60)
+
+
+def windows_to_bits(windows: List[List[datetime.time]]) -> np.ndarray:
+    bits = np.zeros(MINUTES_PER_DAY, dtype=bool)
+    for window_start, window_end in windows:
+        bits[time_to_minute(window_start) : time_to_minute(window_end)] = True
+    return bits
+
+
+def find_runs(bits: np.ndarray) -> np.ndarray:
+    """
+    The (start, end) minutes of every run of free minutes, as an array of shape (n, 2).
+    """
+    edges = np.diff(bits.astype(np.int8), prepend=0, append=0)
+    return np.stack([np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)], axis=1)
+
+
+def bits_to_windows(bits: np.ndarray) -> List[List[datetime.time]]:
+    return [
+        [minute_to_time(start), minute_to_time(end)] for start, end in find_runs(bits)
+    ]
+
+
+class SurgeonAvailability(MutableMapping):
+    """
+    The free minutes of a surgeon, as date -> boolean array with a bit per minute.
+    Reads and writes of `availability[day]` still use lists of [start, end] windows,
+    but searching a window and booking are array operations on the bits.
+    """
+
+    def __init__(self) -> None:
+        self.bits: Dict[datetime.date, np.ndarray] = dict()
+
+    def __getitem__(self, day: datetime.date) -> List[List[datetime.time]]:
+        return bits_to_windows(self.bits[day])
+
+    def __setitem__(
+        self, day: datetime.date, windows: Union[List[List], np.ndarray]
+    ) -> None:
+        if isinstance(windows, np.ndarray):
+            self.bits[day] = windows.astype(bool, copy=True)
+        else:
+            self.bits[day] = windows_to_bits(windows)
+
+    def __delitem__(self, day: datetime.date) -> None:
+        del self.bits[day]
+
+    def __iter__(self) -> Iterator[datetime.date]:
+        return iter(self.bits)
+
+    def __len__(self) -> int:
+        return len(self.bits)
+
+    def earliest_free_run(
+        self, day: datetime.date, duration_minutes: int
+    ) -> Union[int, None]:
+        """
+        Start minute of the first window of at least `duration_minutes`, if any.
+        """
+        runs = find_runs(self.bits[day])
+        long_enough = np.flatnonzero(runs[:, 1] - runs[:, 0] >= duration_minutes)
+        if len(long_enough) == 0:
+            return None
+        return int(runs[long_enough[0], 0])
+
+    def window_length(self, start_time: datetime.datetime) -> int:
+        """
+        Length in minutes of the window that starts exactly at `start_time`, or 0 if no
+        window starts then.
+        """
+        bits = self.bits[start_time.date()]
+        start = time_to_minute(start_time.time())
+        if start >= MINUTES_PER_DAY or not bits[start]:
+            return 0
+        if start > 0 and bits[start - 1]:
+            # In the middle of a window
+            return 0
+        taken = np.flatnonzero(~bits[start:])
+        return int(taken[0]) if len(taken) > 0 else MINUTES_PER_DAY - start
+
+    def book(self, start_time: datetime.datetime, duration_minutes: int) -> bool:
+        """
+        Clear the minutes of a surgery, if they are all free. Returns whether it did.
+        """
+        bits = self.bits[start_time.date()]
+        start = time_to_minute(start_time.time())
+        booked_minutes = bits[start : start + duration_minutes]
+        if len(booked_minutes) < duration_minutes or not booked_minutes.all():
+            return False
+        booked_minutes[:] = False
+        return True
+
+
+def surgeons_available_at(
+    surgeons: List, start_time: datetime.datetime, duration_minutes: int
+) -> np.ndarray:
+    """
+    Which of the surgeons have a window of at least `duration_minutes` starting exactly
+    at `start_time` (see `Surgeon.is_surgeon_available_at`), as a boolean array
+    computed for all the surgeons at once. Surgeons that don't work that day are False.
+    """
+    day = start_time.date()
+    start = time_to_minute(start_time.time())
+    end = start + duration_minutes
+    available = np.zeros(len(surgeons), dtype=bool)
+    working = [
+        idx for idx, surgeon in enumerate(surgeons) if day in surgeon.availability.bits
+    ]
+    if len(working) == 0 or end > MINUTES_PER_DAY or duration_minutes <= 0:
+        return available
+    day_bits = np.stack([surgeons[idx].availability.bits[day] for idx in working])
+    can_start = day_bits[:, start:end].all(axis=1)
+    if start > 0:
+        can_start &= ~day_bits[:, start - 1]
+    available[working] = can_start
+    return available
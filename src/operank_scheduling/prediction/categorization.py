@@ -1,3 +1,6 @@
+import numpy as np
+import pandas as pd
+
 """
 These conversions must match the ones done on the data that was
 used to train the model.
@@ -50,3 +53,32 @@ def gender_category(x):
         return -1
     elif x[0] == "Female":
         return 1
+
+
+# Column-wise versions of the conversions above, for whole DataFrames at once
+age_bin_edges = [
+    (0, 10),
+    (10, 20),
+    (20, 30),
+    (40, 50),
+    (50, 60),
+    (60, 70),
+    (70, 80),
+    (80, 90),
+    (90, 100),
+]
+
+
+def age_bins(ages: np.ndarray) -> np.ndarray:
+    ages = np.asarray(ages, dtype=float)
+    conditions = [(low < ages) & (ages <= high) for low, high in age_bin_edges]
+    return np.select(conditions, range(-5, 4), default=4)
+
+
+def gender_categories(genders: pd.Series) -> pd.Series:
+    return genders.map({"Male": -1, "Female": 1})
+
+
+def bins_to_durations(predicted_bins: np.ndarray) -> np.ndarray:
+    predicted_bins = np.asarray(predicted_bins, dtype=int)
+    return np.select([predicted_bins == 0, predicted_bins == 1], [60, 120], default=180)
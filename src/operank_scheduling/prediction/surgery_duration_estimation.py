@@ -5,9 +5,9 @@ import xgboost as xgb
 
 from operank_scheduling.models.io_utilities import find_project_root
 from operank_scheduling.prediction.categorization import (
-    age_bin,
-    bin_to_duration,
-    gender_category,
+    age_bins,
+    bins_to_durations,
+    gender_categories,
 )
 from loguru import logger
 
@@ -29,27 +29,28 @@ def convert_columns_to_lowercase(in_df: pd.DataFrame) -> None:
 def estimate_surgery_durations(patient_data: pd.DataFrame) -> pd.DataFrame:
     """
     Run all patients through the model and predict the surgery duration.
+    The features are converted column-wise, without visiting the rows in Python.
     """
-    patient_data_to_modify = pd.DataFrame.copy(patient_data)
+    patient_data_to_modify = pd.DataFrame.copy(patient_data, deep=False)
     convert_columns_to_lowercase(patient_data_to_modify)
     if "gender_clean" not in list(patient_data_to_modify.columns):
         patient_data_to_modify.rename(columns={"gender" : "gender_clean"}, inplace=True)
-    patient_data_to_modify["age"] = patient_data_to_modify.apply(
-        lambda row: age_bin(row["age"]), axis=1
-    )
 
-    patient_data_to_modify["surgery"] = patient_data_to_modify.apply(
-        lambda row: surgery_to_category[(row["surgery"]).upper()], axis=1
-    )
-    patient_data_to_modify["gender_clean"] = patient_data_to_modify.apply(
-        lambda row: gender_category([row["gender_clean"]]), axis=1
+    surgery_names = patient_data_to_modify["surgery"].astype(str).str.upper()
+    surgery_categories = surgery_names.map(surgery_to_category)
+    unknown_surgeries = surgery_names[surgery_categories.isna()]
+    if len(unknown_surgeries):
+        raise KeyError(unknown_surgeries.iloc[0])
+    model_data = pd.DataFrame(
+        {
+            "gender_clean": gender_categories(patient_data_to_modify["gender_clean"]),
+            "age": age_bins(patient_data_to_modify["age"]),
+            "surgery": surgery_categories,
+        }
     )
-    model_data = patient_data_to_modify[["gender_clean", "age", "surgery"]]
     logger.debug("Estimating surgery durations...")
     predicted_duration_categories = model.predict(xgb.DMatrix(model_data))
-    surgery_durations = [
-        bin_to_duration(int(prediction)) for prediction in predicted_duration_categories
-    ]
+    surgery_durations = bins_to_durations(predicted_duration_categories)
     patient_data = patient_data.assign(estimated_duration_m=surgery_durations)
     logger.debug("Added predictions to data ⭐")
     return patient_data
@@ -1,4 +1,11 @@
-from operank_scheduling.algo.algo_helpers import intersection_size, lazy_permute
+from operank_scheduling.algo.algo_helpers import (
+    best_fit_decreasing,
+    first_fit_decreasing,
+    intersection_size,
+    l1_lower_bound,
+    l2_lower_bound,
+    lazy_permute,
+)
 
 
 def test_intersection_size():
@@ -19,3 +26,23 @@ def test_lazy_permute():
     ]
     assert lazy_permute([]) == []
     assert lazy_permute([1]) == []
+
+
+def test_first_fit_decreasing():
+    assert first_fit_decreasing([], 10) == []
+    bins = first_fit_decreasing([2, 5, 4, 7, 1, 3, 8], 10)
+    assert [sorted(b) for b in bins] == [[0, 6], [3, 5], [1, 2, 4]]
+
+
+def test_best_fit_decreasing():
+    assert best_fit_decreasing([], 10) == []
+    bins = best_fit_decreasing([6, 5, 4, 4], 10)
+    assert [sorted(b) for b in bins] == [[0, 2], [1, 3]]
+
+
+def test_bin_packing_lower_bounds():
+    assert l1_lower_bound([360] * 9, 480) == 7
+    assert l2_lower_bound([360] * 9, 480) == 9
+    assert l1_lower_bound([300, 300, 200, 200, 200], 480) == 3
+    assert l2_lower_bound([300, 300, 200, 200, 200], 480) == 4
+    assert l2_lower_bound([60] * 8, 480) == 1
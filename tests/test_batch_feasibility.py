@@ -0,0 +1,95 @@
+import datetime
+import random
+
+from operank_scheduling.algo.batch_feasibility import BatchFeasibility
+from operank_scheduling.algo.patient_assignment import suggest_feasible_dates
+from operank_scheduling.algo.surgery_distribution_models import (
+    distribute_timeslots_to_days,
+    greedy_surgery_to_room,
+)
+from operank_scheduling.models.operank_models import (
+    OperatingRoom,
+    Patient,
+    SchedulingContext,
+    Surgeon,
+    Surgery,
+    Timeslot,
+    schedule_patient_to_timeslot,
+)
+
+
+def create_context(rng: random.Random) -> SchedulingContext:
+    patients, surgeries = list(), list()
+    for uuid in range(20):
+        duration = rng.choice([45, 90, 150, 200])
+        patient = Patient(
+            name=f"Patient {uuid}",
+            patient_id=str(uuid),
+            surgery_name="a",
+            referrer="a",
+            estimated_duration_m=duration,
+            priority=1,
+            phone_number="050-1234567",
+            uuid=uuid,
+        )
+        surgery = Surgery(
+            name="a",
+            duration_in_minutes=duration,
+            uuid=uuid,
+            patient=patient,
+            requirements=rng.choice([[], ["robot"]]),
+        )
+        surgery.suitable_teams = [rng.choice(["A", "B", "C"])]
+        patients.append(patient)
+        surgeries.append(surgery)
+
+    rooms = [
+        OperatingRoom(id="o1", properties=[]),
+        OperatingRoom(id="o2", properties=["robot"]),
+    ]
+    greedy_surgery_to_room([Timeslot(60 * rng.randint(1, 4)) for _ in range(24)], rooms)
+    distribute_timeslots_to_days(rooms)
+    for room in rooms:
+        room.schedule_timeslots_to_days(datetime.date(2023, 1, 1))
+
+    surgeons = [
+        Surgeon(name=f"Dr. {team}", surgeon_id=idx, ward=1, team=team)
+        for idx, team in enumerate(["a", "b"])
+    ]
+    for surgeon in surgeons:
+        for day in {day for room in rooms for day in room.schedule}:
+            start_hour = rng.choice([8, 10])
+            surgeon.availability[day] = [
+                [datetime.time(hour=start_hour), datetime.time(hour=16)]
+            ]
+    return SchedulingContext(patients, surgeries, surgeons, rooms)
+
+
+def test_batch_feasibility_matches_suggestions():
+    rng = random.Random(0)
+    context = create_context(rng)
+    feasibility = BatchFeasibility(context.patients, context)
+    matrix = feasibility.feasibility_matrix()
+    assert matrix.shape == (20, len(feasibility.room_days), 2)
+    for patient_idx, patient in enumerate(context.patients):
+        suggestions = suggest_feasible_dates(patient, context)
+        assert matrix[patient_idx].any() == (suggestions is not None)
+
+    for patient in context.patients:
+        suggestions = suggest_feasible_dates(patient, context)
+        assert feasibility.has_options(patient) == (suggestions is not None)
+        if suggestions is None:
+            continue
+        # Book the first suggestion, and keep the arrays up to date
+        room, best_slot, timeslot, surgeon_name = suggestions[0]
+        schedule_patient_to_timeslot(
+            patient, best_slot, timeslot, room, context, surgeon_name
+        )
+        feasibility.record_booking(room, best_slot.date(), surgeon_name)
+
+    rebuilt_feasibility = BatchFeasibility(context.patients, context)
+    assert (
+        rebuilt_feasibility.feasibility_matrix() == feasibility.feasibility_matrix()
+    ).all()
+    starts = feasibility.earliest_start_matrix()
+    assert (~feasibility.feasibility_matrix() == (starts != starts)).all()
@@ -0,0 +1,122 @@
+import datetime
+import random
+
+from operank_scheduling.algo.global_assignment import (
+    assign_patients_globally,
+    greedy_assignment,
+    restructure_assignment_data,
+)
+from operank_scheduling.algo.solver_config import SolverConfig
+from operank_scheduling.models.operank_models import (
+    OperatingRoom,
+    Patient,
+    SchedulingContext,
+    Surgeon,
+    Surgery,
+    Timeslot,
+)
+
+
+def create_patient(uuid: int, duration: int, priority: int):
+    patient = Patient(
+        name=f"Patient {uuid}",
+        patient_id=str(uuid),
+        surgery_name="a",
+        referrer="a",
+        estimated_duration_m=duration,
+        priority=priority,
+        phone_number="050-1234567",
+        uuid=uuid,
+    )
+    surgery = Surgery(name="a", duration_in_minutes=duration, uuid=uuid, patient=patient)
+    surgery.suitable_teams = ["A"]
+    return patient, surgery
+
+
+def test_global_assignment_schedules_patients_greedy_blocks():
+    # The urgent short surgery takes the only long slot on the first day when booked
+    # greedily, leaving no slot for the long one
+    first_day = datetime.date(2023, 1, 1)
+    room = OperatingRoom(id="o1", properties=[])
+    room.timeslots_by_day = [[Timeslot(180)], [Timeslot(60)]]
+    room.schedule_timeslots_to_days(first_day)
+    surgeon = Surgeon(name="Dr. A", surgeon_id=1, ward=1, team="a")
+    for day in room.schedule:
+        surgeon.availability[day] = [[datetime.time(hour=8), datetime.time(hour=16)]]
+    (urgent_patient, urgent_surgery), (patient, surgery) = (
+        create_patient(1, 50, priority=1),
+        create_patient(2, 150, priority=2),
+    )
+    context = SchedulingContext(
+        patients=[urgent_patient, patient],
+        surgeries=[urgent_surgery, surgery],
+        surgeons=[surgeon],
+        rooms=[room],
+    )
+
+    data = restructure_assignment_data(context.patients, context)
+    assert len(greedy_assignment(data)) == 1
+
+    unscheduled_patients = assign_patients_globally(
+        context.patients, context, SolverConfig.deterministic()
+    )
+    assert unscheduled_patients == []
+    assert urgent_patient.is_scheduled and patient.is_scheduled
+    assert surgery.scheduled_time == datetime.datetime(2023, 1, 1, 8)
+    assert urgent_surgery.scheduled_time.date() > first_day
+    assert len(room.free_slots) == 0
+    # The surgeon's windows now start after the surgeries
+    for day in room.schedule:
+        assert surgeon.availability[day][-1][0] > datetime.time(hour=8)
+
+
+def test_global_assignment_is_consistent():
+    rng = random.Random(0)
+    rooms = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(2)]
+    for room in rooms:
+        room.timeslots_by_day = [
+            [Timeslot(rng.choice([60, 120, 180])) for _ in range(3)] for _ in range(4)
+        ]
+        room.schedule_timeslots_to_days(datetime.date(2023, 1, 1))
+    surgeons = [
+        Surgeon(name=f"Dr. {i}", surgeon_id=i, ward=1, team="a") for i in range(2)
+    ]
+    for surgeon in surgeons:
+        for day in rooms[0].schedule:
+            surgeon.availability[day] = [
+                [datetime.time(hour=8), datetime.time(hour=rng.choice([12, 16]))]
+            ]
+    patients, surgeries = zip(
+        *[
+            create_patient(uuid, rng.choice([30, 60, 100, 150]), rng.randint(1, 3))
+            for uuid in range(30)
+        ]
+    )
+    context = SchedulingContext(list(patients), list(surgeries), surgeons, rooms)
+    greedy_amount = len(
+        greedy_assignment(restructure_assignment_data(context.patients, context))
+    )
+
+    unscheduled_patients = assign_patients_globally(
+        context.patients, context, SolverConfig(max_time_in_seconds=2.0)
+    )
+    assert len(context.patients) - len(unscheduled_patients) >= greedy_amount
+    for surgeon in surgeons:
+        for day, surgeries_at_day in surgeon.occupied_times.items():
+            surgery_times = sorted(
+                (time, time + datetime.timedelta(minutes=surgery.duration))
+                for surgery, time in surgeries_at_day
+            )
+            for (_, end), (next_start, _) in zip(surgery_times, surgery_times[1:]):
+                assert end <= next_start
+            assert surgery_times[-1][1].time() <= datetime.time(hour=16)
+    for room in rooms:
+        for day, entries in room.schedule.items():
+            booked = [entry for entry in entries if isinstance(entry, Surgery)]
+            booked.sort(key=lambda surgery: surgery.scheduled_time)
+            # Back to back from 8:00
+            expected_start = datetime.datetime.combine(day, datetime.time(hour=8))
+            for surgery in booked:
+                assert surgery.scheduled_time == expected_start
+                expected_start += datetime.timedelta(minutes=surgery.duration)
+            assert room.available_time[day] == expected_start
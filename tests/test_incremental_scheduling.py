@@ -0,0 +1,108 @@
+import datetime
+
+import pytest
+
+from operank_scheduling.algo.incremental_scheduling import reschedule_incrementally
+from operank_scheduling.algo.surgery_distribution_models import (
+    distribute_timeslots_to_days,
+    greedy_surgery_to_room,
+)
+from operank_scheduling.models.operank_models import (
+    OperatingRoom,
+    Surgery,
+    Timeslot,
+)
+
+
+@pytest.fixture
+def scheduled_rooms():
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(30)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(2)]
+    greedy_surgery_to_room(timeslot_list, or_list)
+    distribute_timeslots_to_days(or_list)
+    starting_day = datetime.date(2023, 1, 1)
+    for operating_room in or_list:
+        operating_room.schedule_timeslots_to_days(starting_day)
+
+    # Book the first timeslot of the first day
+    room = or_list[0]
+    first_day = min(room.schedule)
+    timeslot = next(room.schedule[first_day].free_timeslots())
+    surgery = Surgery(
+        name="Colostomy", duration_in_minutes=timeslot.duration, uuid=1, patient=None
+    )
+    room.book_timeslot(first_day, timeslot, surgery)
+    return or_list, starting_day, surgery
+
+
+def test_incremental_rescheduling(scheduled_rooms):
+    or_list, starting_day, surgery = scheduled_rooms
+    schedules_before = {
+        room: {day: list(entries) for day, entries in room.schedule.items()}
+        for room in or_list
+    }
+    removed_timeslot = next(
+        entry
+        for entry in or_list[1].schedule[max(or_list[1].schedule)]
+        if isinstance(entry, Timeslot)
+    )
+    added_timeslots = [Timeslot(duration=60), Timeslot(duration=180)]
+
+    affected_days = reschedule_incrementally(
+        or_list,
+        added_timeslots=added_timeslots,
+        removed_timeslots=[removed_timeslot],
+        starting_day=starting_day,
+    )
+
+    all_entries = [
+        entry for room in or_list for day in room.schedule.values() for entry in day
+    ]
+    assert surgery in all_entries
+    assert removed_timeslot not in all_entries
+    for timeslot in added_timeslots:
+        assert timeslot in all_entries
+    for room in or_list:
+        for day, day_schedule in room.schedule.items():
+            entries = list(day_schedule)
+            assert sum(entry.duration for entry in entries) <= 480
+            if day not in affected_days.get(room, []):
+                assert entries == schedules_before[room].get(day, [])
+            else:
+                # Entries that were already in place are never moved
+                kept_entries = [
+                    entry
+                    for entry in schedules_before[room].get(day, [])
+                    if entry is not removed_timeslot
+                ]
+                assert entries[: len(kept_entries)] == kept_entries
+
+
+def test_incremental_rescheduling_prefers_existing_days():
+    starting_day = datetime.date(2023, 1, 1)
+    busy_room = OperatingRoom(id="o0", properties=[])
+    empty_room = OperatingRoom(id="o1", properties=[])
+    greedy_surgery_to_room([Timeslot(duration=240)], [busy_room])
+    distribute_timeslots_to_days([busy_room])
+    busy_room.schedule_timeslots_to_days(starting_day)
+    (existing_day,) = busy_room.schedule
+    # The empty room is less loaded, but the busy room still has room on its day
+    added_timeslot = Timeslot(duration=120)
+
+    affected_days = reschedule_incrementally(
+        [busy_room, empty_room],
+        added_timeslots=[added_timeslot],
+        starting_day=starting_day,
+    )
+
+    assert affected_days == {busy_room: [existing_day]}
+    assert list(busy_room.schedule) == [existing_day]
+    assert len(empty_room.schedule) == 0
+    assert added_timeslot in busy_room.schedule[existing_day]
+    assert added_timeslot in busy_room.timeslots_by_day[0]
+    free_slot_counts = {
+        duration: count
+        for (duration, day), count in busy_room.free_slots.counts.items()
+        if day == existing_day
+    }
+    assert free_slot_counts == busy_room.schedule[existing_day].bin_counts()
@@ -1,16 +1,44 @@
 import datetime
+import io
+import json
+import random
+import tempfile
+
+import pandas as pd
+import xgboost as xgb
+from operank_scheduling.models.free_slot_index import FreeSlotIndex
 from operank_scheduling.models.operank_models import (
+    OperatingRoom,
+    SchedulingContext,
+    Surgeon,
     Surgery,
     Timeslot,
     get_all_surgeons,
+    replace_timeslot_by_surgery,
 )
 from operank_scheduling.models.parse_data_to_models import (
+    ingest_patients_from_excel,
+    ingest_patients_from_json,
     parse_single_json_block,
     load_patients_from_json,
+    iter_json_array,
     load_operating_rooms_from_json,
+    stream_patients_from_json,
+)
+from operank_scheduling.prediction.categorization import (
+    age_bin,
+    age_bins,
+    bin_to_duration,
+    gender_categories,
+    gender_category,
+)
+from operank_scheduling.prediction.surgery_duration_estimation import (
+    model as duration_model,
+    surgery_to_category,
 )
 
 from operank_scheduling.models.parse_hopital_data import load_surgeon_schedules
+from operank_scheduling.models.room_day_schedule import RoomDaySchedule
 from operank_scheduling.models.io_utilities import find_project_root
 import pytest
 
@@ -33,6 +61,116 @@ def test_timeslot_surgery_interaction():
     assert s.can_fit_in(t2) is True
 
 
+def test_scheduling_context_lookups():
+    patient_block_example_list = [
+        {
+            "name": f"Patient {i}",
+            "patient_id": f"00000000{i}",
+            "surgery_name": "Colostomy",
+            "referrer": "Dr. Referrer",
+            "estimated_duration_m": 60,
+            "priority": 1,
+            "phone_number": "050-1234567",
+        }
+        for i in range(3)
+    ]
+    patients, surgeries, _ = zip(
+        *[parse_single_json_block(block) for block in patient_block_example_list]
+    )
+    surgeons = [Surgeon(name="Dr. A", surgeon_id=1, ward=1, team="a")]
+    rooms = [OperatingRoom(id="o1"), OperatingRoom(id="o2")]
+    context = SchedulingContext(list(patients), list(surgeries), surgeons, rooms)
+
+    for patient, surgery in zip(patients, surgeries):
+        assert context.get_surgery_by_patient(patient) is surgery
+        assert context.get_patient_by_uuid(patient.uuid) is patient
+    assert context.get_surgeon_by_name("Dr. A") is surgeons[0]
+    assert context.get_operating_room_by_name("o2") is rooms[1]
+    assert context.get_operating_room_by_name("o3") is None
+
+    # Reassigning a list rebuilds its index
+    context.rooms = [OperatingRoom(id="o3")]
+    assert context.get_operating_room_by_name("o2") is None
+    assert context.get_operating_room_by_name("o3") is context.rooms[0]
+
+    context.surgeries = []
+    with pytest.raises(ValueError):
+        context.get_surgery_by_patient(patients[0])
+
+
+def test_free_slot_index():
+    days = [datetime.date(2023, 1, day) for day in range(1, 5)]
+    index = FreeSlotIndex()
+    index.add(days[2], 60)
+    index.add(days[0], 120)
+    index.add(days[0], 60)
+    index.add(days[1], 180)
+    index.add(days[1], 180)
+
+    assert index.find_days(30) == [(days[0], 60), (days[1], 180), (days[2], 60)]
+    assert index.find_days(90) == [(days[0], 120), (days[1], 180)]
+    assert index.find_days(30, from_day=days[1], limit=1) == [(days[1], 180)]
+    assert index.find_days(240) == []
+
+    index.remove(days[1], 180)
+    assert index.find_days(150) == [(days[1], 180)]
+    index.remove(days[1], 180)
+    assert index.find_days(150) == []
+    assert len(index) == 3
+    with pytest.raises(KeyError):
+        index.remove(days[1], 180)
+
+
+def test_room_day_schedule():
+    timeslots = [Timeslot(180), Timeslot(60), Timeslot(60), Timeslot(120)]
+    day_schedule = RoomDaySchedule(timeslots)
+    assert day_schedule.bin_counts() == {180: 1, 60: 2, 120: 1}
+    assert day_schedule.find_free_timeslot(45) is timeslots[1]
+    assert day_schedule.find_free_timeslot(100) is timeslots[3]
+    assert day_schedule.find_free_timeslot(200) is None
+
+    late_surgery = Surgery(name="a", duration_in_minutes=50, uuid=0, patient=None)
+    late_surgery.set_time(datetime.datetime(2023, 1, 1, 12))
+    early_surgery = Surgery(name="a", duration_in_minutes=170, uuid=1, patient=None)
+    early_surgery.set_time(datetime.datetime(2023, 1, 1, 8))
+    handle = day_schedule.book(timeslots[1], late_surgery)
+    day_schedule.book(timeslots[0], early_surgery)
+
+    # Entries keep their place, surgeries come by start time
+    assert list(day_schedule) == [early_surgery, late_surgery] + timeslots[2:]
+    assert list(day_schedule.surgeries()) == [early_surgery, late_surgery]
+    assert list(day_schedule.free_timeslots()) == timeslots[2:]
+    assert day_schedule.bin_counts() == {60: 1, 120: 1}
+    assert late_surgery in day_schedule and timeslots[1] not in day_schedule
+    assert day_schedule.used_minutes() == 170 + 50 + 60 + 120
+    with pytest.raises(ValueError):
+        day_schedule.book(handle, early_surgery)
+
+    day_schedule.remove(timeslots[2])
+    assert day_schedule.find_free_timeslot(45) is timeslots[3]
+    assert len(day_schedule) == 3
+
+
+def test_replace_timeslot_by_surgery_updates_free_slots():
+    room = OperatingRoom(id="o1")
+    room.timeslots_by_day = [[Timeslot(180), Timeslot(60), Timeslot(60)]]
+    room.schedule_timeslots_to_days(datetime.date(2023, 1, 2))
+    (day,) = room.schedule
+    timeslot = room.schedule[day].get_free_timeslot(60)
+    surgery = Surgery(name="a", duration_in_minutes=50, uuid=0, patient=None)
+    surgery.set_time(datetime.datetime(2023, 1, 2, 8))
+
+    replace_timeslot_by_surgery(room, day, timeslot, surgery)
+
+    free_slot_counts = {
+        duration: count
+        for (duration, free_day), count in room.free_slots.counts.items()
+        if free_day == day
+    }
+    assert free_slot_counts == room.schedule[day].bin_counts() == {180: 1, 60: 1}
+    assert list(room.schedule[day].surgeries()) == [surgery]
+
+
 def test_parse_patient_data():
     patient_block_example_list = [
         {
@@ -65,6 +203,186 @@ def test_parse_patient_data():
     assert patients[0].uuid is not patients[1].uuid
 
 
+def test_surgeries_share_their_type():
+    surgery = Surgery(name="hernia", duration_in_minutes=60, uuid=0, patient=None)
+    same_surgery = Surgery(name="HERNIA", duration_in_minutes=90, uuid=1, patient=None)
+    assert surgery.surgery_type is same_surgery.surgery_type
+    assert not hasattr(surgery, "__dict__")
+
+    # Overriding the teams of one surgery doesn't affect the others
+    same_surgery.suitable_teams = ["BREAST"]
+    assert same_surgery.suitable_teams == ("BREAST",)
+    assert surgery.suitable_teams != same_surgery.suitable_teams
+    assert same_surgery.name == "HERNIA"
+
+
+def test_ingest_patients_from_excel(tmp_path):
+    rng = random.Random(0)
+    patients_amt = 50
+    patient_data_df = pd.DataFrame(
+        {
+            "Name": [f"Patient {idx}" for idx in range(patients_amt)],
+            "ID": [f"{idx:09d}" for idx in range(patients_amt)],
+            "Surgery": [
+                rng.choice(["Appendectomy", "Anal Fistulectomy"])
+                for _ in range(patients_amt)
+            ],
+            "Referrer": ["Dr. Referrer"] * patients_amt,
+            "Phone": ["050-1234567"] * patients_amt,
+            "Priority": [rng.randint(1, 4) for _ in range(patients_amt)],
+            # Bin edges, the unbinned 30-40 range and ages past 100
+            "Age": [0, 10, 30, 35, 40, 100, 101, 130]
+            + [rng.randint(1, 99) for _ in range(patients_amt - 8)],
+            "Gender": ["Other"]
+            + [rng.choice(["Male", "Female"]) for _ in range(patients_amt - 1)],
+        }
+    )
+    excel_path = tmp_path / "patients.xlsx"
+    patient_data_df.to_excel(excel_path, index=False)
+
+    ingestion = ingest_patients_from_excel(excel_path, first_uuid=1000)
+    assert list(ingestion.stage_times) == [
+        "read",
+        "estimate durations",
+        "validate",
+        "assign uuids",
+        "build models",
+    ]
+    uuids = [patient.uuid for patient in ingestion.patients]
+    assert uuids == list(range(1000, 1000 + patients_amt))
+
+    # The column-wise features and durations match the row-wise conversions
+    excel_df = pd.read_excel(excel_path)
+    expected_features = pd.DataFrame(
+        {
+            "gender_clean": [gender_category([gender]) for gender in excel_df["Gender"]],
+            "age": [age_bin(age) for age in excel_df["Age"]],
+            "surgery": [
+                surgery_to_category[surgery.upper()] for surgery in excel_df["Surgery"]
+            ],
+        }
+    )
+    assert list(age_bins(excel_df["Age"])) == list(expected_features["age"])
+    pd.testing.assert_series_equal(
+        gender_categories(excel_df["Gender"]),
+        expected_features["gender_clean"],
+        check_dtype=False,
+        check_names=False,
+    )
+    expected_durations = [
+        bin_to_duration(int(prediction))
+        for prediction in duration_model.predict(xgb.DMatrix(expected_features))
+    ]
+    for patient, surgery, timeslot, expected_duration, (_, row) in zip(
+        ingestion.patients,
+        ingestion.surgeries,
+        ingestion.timeslots,
+        expected_durations,
+        excel_df.iterrows(),
+    ):
+        assert surgery.patient is patient and surgery.uuid == patient.uuid
+        assert patient.surgery_name == row["Surgery"].upper()
+        assert patient.referrer == "DR. REFERRER"
+        assert (patient.name, patient.patient_id) == (row["Name"], row["ID"])
+        assert patient.priority == row["Priority"]
+        assert surgery.duration == expected_duration
+        assert timeslot.duration == Timeslot(expected_duration).duration
+
+
+def test_ingest_patients_from_json():
+    ingestion = ingest_patients_from_json(
+        root_dir / "assets" / "example_patient_data.json"
+    )
+    # Without the duration model's columns, the given durations are used
+    assert "estimate durations" not in ingestion.stage_times
+    assert [surgery.duration for surgery in ingestion.surgeries][:2] == [45, 25]
+    next_ingestion = ingest_patients_from_json(
+        root_dir / "assets" / "example_patient_data.json"
+    )
+    assert next_ingestion.patients[0].uuid == ingestion.patients[-1].uuid + 1
+
+
+def test_stream_patients_from_json(tmp_path):
+    records = [
+        {
+            # Brackets and the array's key inside strings shouldn't confuse the parser
+            "name": f'Patient {idx} ["patients": ]',
+            "patient_id": f"{idx:09d}",
+            "surgery_name": "Colostomy",
+            "referrer": "Dr. Referrer",
+            "estimated_duration_m": 30 + idx % 200,
+            "phone_number": "050-1234567",
+            "priority": 1 + idx % 4,
+        }
+        for idx in range(2500)
+    ]
+    json_path = tmp_path / "patients.json"
+    with open(json_path, "w") as json_fp:
+        json.dump({"source": "test", "patients": records}, json_fp, indent=4)
+
+    batches = list(stream_patients_from_json(json_path, chunk_size=1000, read_size=97))
+    assert [len(patients) for patients, _, _ in batches] == [1000, 1000, 500]
+    patients = [patient for batch, _, _ in batches for patient in batch]
+    surgeries = [surgery for _, batch, _ in batches for surgery in batch]
+    assert [patient.name for patient in patients] == [data["name"] for data in records]
+    assert [surgery.duration for surgery in surgeries] == [
+        data["estimated_duration_m"] for data in records
+    ]
+    uuids = [patient.uuid for patient in patients]
+    assert uuids == list(range(uuids[0], uuids[0] + len(records)))
+
+    # Uploads come as binary file objects
+    compact_json = json.dumps({"patients": records[:3]}, separators=(",", ":"))
+    [(patients, _, _)] = stream_patients_from_json(io.BytesIO(compact_json.encode()))
+    assert [patient.patient_id for patient in patients] == [
+        "000000000",
+        "000000001",
+        "000000002",
+    ]
+    with pytest.raises(ValueError):
+        list(stream_patients_from_json(io.StringIO('{"patients": [{"name": "a"}')))
+
+    # Uploads are spooled to temporary files, which are left open
+    with tempfile.SpooledTemporaryFile() as spooled_file:
+        spooled_file.write(json.dumps({"patients": records[:2]}).encode())
+        spooled_file.seek(0)
+        [(patients, _, _)] = stream_patients_from_json(spooled_file, read_size=5)
+        assert [patient.name for patient in patients] == [
+            data["name"] for data in records[:2]
+        ]
+        assert not spooled_file.closed
+
+
+@pytest.mark.parametrize("read_size", [1, 2, 3, 5, 64])
+def test_iter_json_array_with_small_reads(read_size):
+    json_text = (
+        '{"source": "a \\"quoted\\" name", "patients"  :  '
+        '[{"a": 1}, [2], 12, 345, -6.5e2, true, null, "b\\u00e9c"]}'
+    )
+    items = iter_json_array(io.StringIO(json_text), read_size=read_size)
+    assert list(items) == [{"a": 1}, [2], 12, 345, -650.0, True, None, "b\u00e9c"]
+
+
+@pytest.mark.parametrize("read_size", [1, 3, 64])
+def test_iter_json_array_stops_at_invalid_values(read_size):
+    class CountingStream(io.StringIO):
+        read_chars = 0
+
+        def read(self, size=-1):
+            block = super().read(size)
+            self.read_chars += len(block)
+            return block
+
+    json_text = '{"patients": [{"a": 1}, {bad}, ' + '{"a": 2}, ' * 1000 + "]}"
+    stream = CountingStream(json_text)
+    items = iter_json_array(stream, read_size=read_size)
+    assert next(items) == {"a": 1}
+    with pytest.raises(ValueError, match=f"offset {json_text.index('bad')}"):
+        next(items)
+    # The rest of the file was never read
+    assert stream.read_chars < json_text.index("bad") + 64 + read_size
+
+
 def test_get_all_surgeons():
     get_all_surgeons()
 
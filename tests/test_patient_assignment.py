@@ -1,6 +1,7 @@
 import pytest
 from typing import List, Tuple
 import datetime
+import random
 
 from operank_scheduling.algo.patient_assignment import (
     get_surgery_by_patient,
@@ -10,6 +11,7 @@ from operank_scheduling.algo.patient_assignment import (
     find_suitable_surgeons,
     find_suitable_operating_rooms,
     find_suitable_timeslots,
+    select_top_suggestions,
     sort_patients_by_priority_and_duration,
 )
 
@@ -27,11 +29,13 @@ from operank_scheduling.algo.surgery_distribution_models import (
 
 from operank_scheduling.models.operank_models import (
     Patient,
+    SchedulingContext,
     Surgery,
     OperatingRoom,
     Surgeon,
     Timeslot,
     get_all_surgeons,
+    schedule_patient_to_timeslot,
 )
 
 from operank_scheduling.models.io_utilities import find_project_root
@@ -221,3 +225,158 @@ def test_find_suitable_timeslots(schedule_patients):
         suitable_rooms = find_suitable_operating_rooms(procedure, operating_rooms)
         suitable_surgeons = find_suitable_surgeons(procedure, surgeon_list)
         _ = find_suitable_timeslots(procedure, suitable_rooms, suitable_surgeons)
+
+
+def test_surgeon_eligibility_index():
+    surgeons = [
+        Surgeon(name="Dr. A", surgeon_id=1, ward=1, team="breast"),
+        Surgeon(name="Dr. B", surgeon_id=2, ward=2, team="colon"),
+    ]
+    context = SchedulingContext(surgeons=list(surgeons))
+    by_team = Surgery(name="a", duration_in_minutes=60, uuid=1, patient=None)
+    by_team.suitable_teams = ["BREAST"]
+    by_ward = Surgery(name="b", duration_in_minutes=60, uuid=2, patient=None)
+    by_ward.suitable_wards = [2]
+    unmatched = Surgery(name="c", duration_in_minutes=60, uuid=3, patient=None)
+    unmatched.suitable_teams = ["VASCULAR"]
+
+    assert find_suitable_surgeons(by_team, context) == [surgeons[0]]
+    assert find_suitable_surgeons(by_ward, context) == [surgeons[1]]
+    assert find_suitable_surgeons(unmatched, context) == []
+    assert find_suitable_surgeons(unmatched, surgeons) == []
+    assert context.eligible_surgeons[unmatched.surgery_type] == ()
+
+    # Roster changes update the cached results
+    new_surgeon = Surgeon(name="Dr. C", surgeon_id=3, ward=3, team="vascular")
+    context.add_surgeon(new_surgeon)
+    assert find_suitable_surgeons(unmatched, context) == [new_surgeon]
+    context.remove_surgeon(surgeons[0])
+    assert find_suitable_surgeons(by_team, context) == []
+    assert context.get_surgeon_by_name("Dr. A") is None
+
+
+def test_surgeon_eligibility_with_overridden_teams():
+    surgeons = [
+        Surgeon(name="Dr. A", surgeon_id=1, ward=1, team="breast"),
+        Surgeon(name="Dr. B", surgeon_id=2, ward=2, team="colon"),
+    ]
+    context = SchedulingContext(surgeons=list(surgeons))
+    shared = Surgery(name="a", duration_in_minutes=60, uuid=1, patient=None)
+    overridden = Surgery(name="a", duration_in_minutes=60, uuid=2, patient=None)
+    overridden.suitable_teams = ["COLON"]
+    assert shared.surgery_type is not overridden.surgery_type
+
+    shared_surgeons = find_suitable_surgeons(shared, context)
+    assert find_suitable_surgeons(overridden, context) == [surgeons[1]]
+    # Looked up in any order, the other surgery of the same name is unaffected
+    assert find_suitable_surgeons(shared, context) == shared_surgeons
+    assert shared_surgeons == find_suitable_surgeons(shared, surgeons)
+
+
+def test_find_suitable_operating_rooms_by_capabilities():
+    rooms = [
+        OperatingRoom(id="o1", properties=[]),
+        OperatingRoom(id="o2", properties=["robot"]),
+        OperatingRoom(id="o3", properties=["robot", "c-arm"]),
+    ]
+    context = SchedulingContext(rooms=rooms)
+    requirements_to_rooms = [
+        ([], rooms),
+        (["robot"], rooms[1:]),
+        (["c-arm", "robot"], rooms[2:]),
+        (["laparoscopy tower"], []),
+    ]
+    for requirements, expected_rooms in requirements_to_rooms:
+        procedure = Surgery(
+            name="a",
+            duration_in_minutes=60,
+            uuid=1,
+            patient=None,
+            requirements=requirements,
+        )
+        assert find_suitable_operating_rooms(procedure, context) == expected_rooms
+        assert find_suitable_operating_rooms(procedure, rooms) == expected_rooms
+    assert len(context.room_capabilities.matches) == len(requirements_to_rooms)
+
+
+def test_find_suitable_timeslots_after_booking():
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(12)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(2)]
+    distribute_timeslots_to_operating_rooms(timeslot_list, or_list)
+    distribute_timeslots_to_days(or_list)
+    for operating_room in or_list:
+        operating_room.schedule_timeslots_to_days(datetime.date(2023, 1, 1))
+    surgeon = Surgeon(name="Dr. A", surgeon_id=1, ward=1, team="a")
+    for day in {day for room in or_list for day in room.schedule}:
+        surgeon.availability[day] = [[datetime.time(hour=8), datetime.time(hour=16)]]
+    patient = Patient(
+        priority=1,
+        name="a",
+        patient_id="a",
+        surgery_name="a",
+        referrer="a",
+        estimated_duration_m=50,
+        phone_number="050-1234567",
+        uuid=1,
+    )
+    procedure = Surgery(name="a", duration_in_minutes=50, uuid=1, patient=patient)
+
+    suggestions = find_suitable_timeslots(procedure, or_list, [surgeon])
+    assert 0 < len(suggestions) <= 3
+    for room, best_slot, timeslot, surgeon_name in suggestions:
+        assert timeslot in room.schedule[best_slot.date()]
+        assert procedure.can_fit_in(timeslot)
+
+    room, best_slot, timeslot, surgeon_name = suggestions[0]
+    schedule_patient_to_timeslot(
+        patient, best_slot, timeslot, room, [procedure], surgeon_name, [surgeon]
+    )
+    assert procedure in room.schedule[best_slot.date()]
+    free_slots = sum(
+        isinstance(entry, Timeslot) for day in room.schedule.values() for entry in day
+    )
+    assert len(room.free_slots) == free_slots
+    for room, best_slot, timeslot, _ in find_suitable_timeslots(
+        procedure, or_list, [surgeon]
+    ):
+        assert timeslot in room.schedule[best_slot.date()]
+
+
+def test_select_top_suggestions_matches_pairwise_selection():
+    def reference_selection(suggestions, surgeons):
+        # The original quadratic implementation
+        deduplicated, seen_datetimes = [], []
+        for suggestion in suggestions:
+            if suggestion[1] not in seen_datetimes:
+                seen_datetimes.append(suggestion[1])
+                same_date = [
+                    x for x in suggestions if x[1].date() == suggestion[1].date()
+                ]
+                deduplicated.append(min(same_date, key=lambda x: x[2].duration))
+        load = {surgeon.name: surgeon.scheduled_operations for surgeon in surgeons}
+        minimal_load = min(load[x[3]] for x in deduplicated)
+        preferred = [x for x in deduplicated if load[x[3]] == minimal_load]
+        minimal_duration = min(x[2].duration for x in preferred)
+        minimal = [x for x in preferred if x[2].duration == minimal_duration]
+        return minimal[:3] if len(minimal) > 2 else preferred[:3]
+
+    rng = random.Random(0)
+    rooms = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+    surgeons = [
+        Surgeon(name=f"Dr. {i}", surgeon_id=i, ward=1, team="a") for i in range(4)
+    ]
+    for _ in range(50):
+        for surgeon in surgeons:
+            surgeon.scheduled_operations = rng.randint(0, 2)
+        suggestions = [
+            (
+                rng.choice(rooms),
+                datetime.datetime(2023, 1, rng.randint(1, 5), rng.choice([8, 10])),
+                Timeslot(duration=rng.choice([60, 120, 180])),
+                rng.choice(surgeons).name,
+            )
+            for _ in range(rng.randint(1, 40))
+        ]
+        assert select_top_suggestions(suggestions, surgeons) == reference_selection(
+            suggestions, surgeons
+        )
@@ -1,10 +1,36 @@
 import datetime
 
 import pytest
+from loguru import logger
+from ortools.sat.python import cp_model
+
+from operank_scheduling.algo.intermediate_solutions_cb import SolutionTelemetryCallback
+from operank_scheduling.algo.joint_scheduling_model import (
+    distribute_timeslots_to_rooms_and_days,
+    restructure_joint_data,
+)
+from operank_scheduling.algo.room_selection import (
+    estimate_completion_date,
+    select_operating_rooms,
+)
+from operank_scheduling.algo.solution_cache import PreliminarySchedulingCache
+from operank_scheduling.algo.solver_config import SolverConfig
 
 from operank_scheduling.algo.surgery_distribution_models import (
+    DayPackingModel,
+    RoomBalancingObjective,
+    add_room_assignment_hint,
+    build_day_optimization_data,
+    build_room_distribution_model,
+    day_packing_models,
     distribute_timeslots_to_days,
     distribute_timeslots_to_operating_rooms,
+    evaluate_balancing_objective,
+    get_normalized_room_loads,
+    greedy_surgery_to_room,
+    perform_preliminary_scheduling,
+    restructure_data,
+    solve_room_day_distribution,
 )
 from operank_scheduling.models.operank_models import OperatingRoom, Timeslot
 from operank_scheduling.models.parse_data_to_models import (
@@ -47,3 +73,374 @@ def test_scheduling_on_real_operating_rooms():
     distribute_timeslots_to_days(or_list)
     for operating_room in or_list:
         operating_room.schedule_timeslots_to_days(datetime.datetime.now().date())
+
+
+@pytest.mark.parametrize("balancing_objective", list(RoomBalancingObjective))
+def test_room_balancing_objectives(balancing_objective):
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(12)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+    distribute_timeslots_to_operating_rooms(timeslot_list, or_list, balancing_objective)
+    scheduled = [ts for room in or_list for ts in room.timeslots_to_schedule]
+    assert len(scheduled) == len(timeslot_list)
+    # Rooms with identical availability and total duration divisible by 3 balance perfectly
+    room_durations = [
+        sum(ts.duration for ts in room.timeslots_to_schedule) for room in or_list
+    ]
+    assert max(room_durations) == min(room_durations)
+
+
+def test_solver_config_is_applied():
+    solver_config = SolverConfig(
+        num_workers=4, max_time_in_seconds=2.5, relative_gap_limit=0.1, random_seed=7
+    )
+    solver = solver_config.apply_to(cp_model.CpSolver())
+    assert solver.parameters.num_search_workers == 4
+    assert solver.parameters.max_time_in_seconds == 2.5
+    assert solver.parameters.relative_gap_limit == pytest.approx(0.1)
+    assert solver.parameters.random_seed == 7
+    assert solver.parameters.interleave_search
+
+
+def test_preliminary_scheduling_with_solver_config():
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(20)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+    perform_preliminary_scheduling(
+        timeslot_list, or_list, solver_config=SolverConfig.interactive()
+    )
+    for room in or_list:
+        scheduled = [ts for day in room.timeslots_by_day for ts in day]
+        assert len(scheduled) == len(room.timeslots_to_schedule)
+
+
+def test_parallel_day_packing_matches_serial():
+    def make_rooms():
+        rooms = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+        for room_idx, room in enumerate(rooms):
+            room.timeslots_to_schedule = [
+                Timeslot(duration=60 * ((i % 3) + 1)) for i in range(6 + room_idx)
+            ]
+        return rooms
+
+    solver_config = SolverConfig.deterministic()
+    solver_config.num_workers = 1
+    serial_rooms = make_rooms()
+    parallel_rooms = make_rooms()
+    distribute_timeslots_to_days(serial_rooms, solver_config)
+    distribute_timeslots_to_days(parallel_rooms, solver_config, parallel=True)
+    for serial_room, parallel_room in zip(serial_rooms, parallel_rooms):
+        serial_days = [[ts.duration for ts in day] for day in serial_room.timeslots_by_day]
+        parallel_days = [
+            [ts.duration for ts in day] for day in parallel_room.timeslots_by_day
+        ]
+        assert serial_days == parallel_days
+
+
+def test_bin_count_day_packing_model():
+    timeslot_durations = [Timeslot.bins[i % 4] for i in range(400)]
+    data = build_day_optimization_data(timeslot_durations)
+    timeslot_indices_by_day = day_packing_models[DayPackingModel.BIN_COUNTS](
+        data, SolverConfig.interactive()
+    )
+    scheduled = [idx for day in timeslot_indices_by_day for idx in day]
+    assert sorted(scheduled) == list(range(len(timeslot_durations)))
+    for day in timeslot_indices_by_day:
+        assert sum(timeslot_durations[idx] for idx in day) <= 480
+    assert len(timeslot_indices_by_day) == -(-sum(timeslot_durations) // 480)
+
+
+@pytest.mark.parametrize("time_budget", [0.001, 1.0])
+def test_warm_start_is_never_worse_than_initial_assignment(time_budget):
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(24)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+    or_list[0].add_non_working_days([0, 1])
+    # Everything in a single room is complete and feasible, but badly balanced
+    initial_assignment = {or_list[0]: list(timeslot_list)}
+    initial_durations = [sum(ts.duration for ts in timeslot_list) // 3, 0, 0]
+    room_to_timeslot = distribute_timeslots_to_operating_rooms(
+        timeslot_list,
+        or_list,
+        RoomBalancingObjective.SPREAD,
+        SolverConfig(max_time_in_seconds=time_budget),
+        initial_assignment=initial_assignment,
+    )
+    assert sum(len(ts) for ts in room_to_timeslot.values()) == len(timeslot_list)
+    normalized_durations = [
+        sum(ts.duration for ts in room_to_timeslot[room])
+        // (7 - len(room.non_working_days))
+        for room in or_list
+    ]
+    assert evaluate_balancing_objective(
+        normalized_durations, RoomBalancingObjective.SPREAD
+    ) <= evaluate_balancing_objective(initial_durations, RoomBalancingObjective.SPREAD)
+
+
+def test_room_assignment_hint_with_unknown_timeslots():
+    timeslot_list = [Timeslot(duration=60) for _ in range(6)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(2)]
+    # Covers every timeslot, plus one that isn't being scheduled
+    initial_assignment = {
+        or_list[0]: timeslot_list[:3] + [Timeslot(duration=60)],
+        or_list[1]: timeslot_list[3:],
+    }
+    data = restructure_data(timeslot_list, or_list)
+    model, x = build_room_distribution_model(data, RoomBalancingObjective.SPREAD)
+    initial_objective = add_room_assignment_hint(
+        model,
+        x,
+        data,
+        timeslot_list,
+        or_list,
+        initial_assignment,
+        RoomBalancingObjective.SPREAD,
+    )
+    assert initial_objective is None
+
+    room_to_timeslot = distribute_timeslots_to_operating_rooms(
+        timeslot_list,
+        or_list,
+        RoomBalancingObjective.SPREAD,
+        SolverConfig(max_time_in_seconds=1.0),
+        initial_assignment=initial_assignment,
+    )
+    assigned = [ts for timeslots in room_to_timeslot.values() for ts in timeslots]
+    assert sorted(map(id, assigned)) == sorted(map(id, timeslot_list))
+
+
+def test_day_packing_skips_solver_when_heuristic_is_optimal(monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("Solver should not be called")
+
+    monkeypatch.setitem(day_packing_models, DayPackingModel.ASSIGNMENT, fail)
+    # 360-minute timeslots can't share a day, L2 proves the 9 days of FFD optimal
+    timeslot_indices_by_day = solve_room_day_distribution([360] * 9, SolverConfig())
+    assert len(timeslot_indices_by_day) == 9
+
+
+def test_solution_telemetry_sampling():
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(30)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(4)]
+    telemetry = SolutionTelemetryCallback(buffer_size=3)
+    distribute_timeslots_to_operating_rooms(
+        timeslot_list,
+        or_list,
+        solver_config=SolverConfig(num_workers=1, max_time_in_seconds=2.0),
+        telemetry=telemetry,
+    )
+    samples = telemetry.samples
+    assert 0 < len(samples) <= 3
+    assert len(samples) == min(3, telemetry.solution_count)
+    for sample in samples:
+        assert sum(sample.room_durations) == sum(ts.duration for ts in timeslot_list)
+        assert sample.best_bound <= sample.objective
+    elapsed_times = [sample.elapsed_time for sample in samples]
+    assert elapsed_times == sorted(elapsed_times)
+
+
+def test_joint_room_and_day_model():
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(24)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+    or_list[0].add_non_working_days([0, 1, 2])
+    starting_day = datetime.date(2023, 1, 1)
+    perform_preliminary_scheduling(
+        timeslot_list,
+        or_list,
+        SolverConfig(max_time_in_seconds=2.0),
+        joint_model=True,
+        starting_day=starting_day,
+    )
+    scheduled = [ts for room in or_list for day in room.timeslots_by_day for ts in day]
+    assert sorted(map(id, scheduled)) == sorted(map(id, timeslot_list))
+    total_duration = sum(ts.duration for ts in timeslot_list)
+    assert sum(len(room.timeslots_by_day) for room in or_list) == -(-total_duration // 480)
+    for room in or_list:
+        for day in room.timeslots_by_day:
+            assert sum(ts.duration for ts in day) <= 480
+        room.schedule_timeslots_to_days(starting_day)
+        for day in room.schedule:
+            assert day.weekday() not in room.non_working_days
+
+
+def test_joint_model_without_working_days():
+    timeslot_list = [Timeslot(duration=60) for _ in range(4)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(2)]
+    for room in or_list:
+        room.add_non_working_days(list(range(7)))
+    with pytest.raises(ValueError):
+        restructure_joint_data(timeslot_list, or_list, datetime.date(2023, 1, 1))
+
+    # A closed room is left empty
+    open_room = OperatingRoom(id="o2", properties=[])
+    distribute_timeslots_to_rooms_and_days(
+        timeslot_list,
+        or_list + [open_room],
+        SolverConfig(max_time_in_seconds=2.0),
+        datetime.date(2023, 1, 1),
+    )
+    assert all(len(room.timeslots_by_day) == 0 for room in or_list)
+    assert sum(len(day) for day in open_room.timeslots_by_day) == len(timeslot_list)
+
+
+def test_joint_model_makespan_ignores_unused_rooms():
+    timeslot_list = [Timeslot(duration=60)]
+    # Starting on a Sunday, the second room only opens on Thursday
+    or_list = [
+        OperatingRoom(id="o0", properties=[]),
+        OperatingRoom(id="o1", properties=[]),
+    ]
+    or_list[0].non_working_days = []
+    or_list[1].non_working_days = [0, 1, 2, 4, 5, 6]
+    messages = list()
+    sink_id = logger.add(messages.append, format="{message}", level="INFO")
+    try:
+        distribute_timeslots_to_rooms_and_days(
+            timeslot_list,
+            or_list,
+            SolverConfig(max_time_in_seconds=2.0),
+            datetime.date(2023, 1, 1),
+        )
+    finally:
+        logger.remove(sink_id)
+    assert or_list[0].timeslots_by_day == [timeslot_list]
+    assert any("finishing after 1 calendar days" in message for message in messages)
+
+
+def test_preliminary_scheduling_cache(tmp_path, monkeypatch):
+    def make_instance():
+        timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(20)]
+        or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+        return timeslot_list, or_list
+
+    cache = PreliminarySchedulingCache(max_entries=1, cache_dir=tmp_path)
+    timeslot_list, or_list = make_instance()
+    perform_preliminary_scheduling(timeslot_list, or_list, cache=cache)
+    assert cache.misses == 1
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Solver should not be called")
+
+    monkeypatch.setattr(
+        "operank_scheduling.algo.surgery_distribution_models._perform_preliminary_scheduling",
+        fail,
+    )
+    # A fresh cache reads the solution back from disk
+    for cache in [cache, PreliminarySchedulingCache(cache_dir=tmp_path)]:
+        new_timeslot_list, new_or_list = make_instance()
+        perform_preliminary_scheduling(new_timeslot_list, new_or_list, cache=cache)
+        assert cache.hits == 1
+        for room, new_room in zip(or_list, new_or_list):
+            assert [[ts.duration for ts in day] for day in room.timeslots_by_day] == [
+                [ts.duration for ts in day] for day in new_room.timeslots_by_day
+            ]
+            for day in new_room.timeslots_by_day:
+                for timeslot in day:
+                    assert any(timeslot is ts for ts in new_timeslot_list)
+                    assert any(timeslot is ts for ts in new_room.timeslots_to_schedule)
+
+
+def test_preliminary_scheduling_cache_misses_other_calendars():
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(20)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+    starting_day = datetime.date(2023, 1, 1)
+    cache = PreliminarySchedulingCache()
+    cache.store(timeslot_list, or_list, "joint", starting_day)
+    assert cache.restore(timeslot_list, or_list, "joint", starting_day) is True
+
+    next_day = starting_day + datetime.timedelta(days=1)
+    assert cache.restore(timeslot_list, or_list, "joint", next_day) is False
+    # Same amount of working days, but on other weekdays
+    or_list[0].non_working_days = [0, 1]
+    assert cache.restore(timeslot_list, or_list, "joint", starting_day) is False
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_preliminary_scheduling_cache_misses_other_solver_options():
+    def make_instance():
+        timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(20)]
+        or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+        return timeslot_list, or_list
+
+    cache = PreliminarySchedulingCache()
+    starting_day = datetime.date(2023, 1, 1)
+    perform_preliminary_scheduling(
+        *make_instance(),
+        SolverConfig.interactive(),
+        starting_day=starting_day,
+        cache=cache,
+    )
+    perform_preliminary_scheduling(
+        *make_instance(),
+        SolverConfig.deterministic(),
+        starting_day=starting_day,
+        cache=cache,
+    )
+    perform_preliminary_scheduling(
+        *make_instance(),
+        SolverConfig.interactive(),
+        day_packing_model=DayPackingModel.BIN_COUNTS,
+        starting_day=starting_day,
+        cache=cache,
+    )
+    assert (cache.hits, cache.misses) == (0, 3)
+    perform_preliminary_scheduling(
+        *make_instance(),
+        SolverConfig.interactive(),
+        starting_day=starting_day,
+        cache=cache,
+    )
+    assert cache.hits == 1
+
+
+def test_greedy_room_assignment_keeps_all_timeslots():
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(23)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(3)]
+    or_list[0].add_non_working_days([0, 1, 2])
+    room_to_timeslot = greedy_surgery_to_room(timeslot_list, or_list)
+    scheduled = [ts for room in or_list for ts in room.timeslots_to_schedule]
+    assert sorted(map(id, scheduled)) == sorted(map(id, timeslot_list))
+    loads = get_normalized_room_loads(room_to_timeslot)
+    # Longest-first placement keeps the spread within the longest timeslot per day
+    assert max(loads.values()) - min(loads.values()) <= 180
+    # The room open 2 days a week gets less work than the rooms open 5 days a week
+    assert len(room_to_timeslot[or_list[0]]) < len(room_to_timeslot[or_list[1]])
+
+
+def test_select_operating_rooms():
+    # 20 full days of work
+    timeslot_list = [Timeslot(duration=480) for _ in range(20)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(6)]
+    for room in or_list[:3]:
+        # Only open on Sundays
+        room.add_non_working_days([0, 1, 2, 3])
+    starting_day = datetime.date(2023, 1, 1)  # Sunday
+
+    all_rooms_completion = estimate_completion_date(or_list, 20, starting_day)
+    selection = select_operating_rooms(timeslot_list, or_list, starting_day)
+    assert selection.required_room_days == 20
+    assert len(selection.rooms) < len(or_list)
+    assert selection.expected_completion_date == all_rooms_completion
+
+    # Rooms that are open more often within the horizon are preferred
+    selection = select_operating_rooms(
+        timeslot_list, or_list, starting_day, target_horizon_days=14
+    )
+    assert selection.rooms == or_list[3:5]
+    assert selection.expected_completion_date <= datetime.date(2023, 1, 14)
+
+
+@pytest.mark.parametrize("joint_model", [False, True])
+def test_preliminary_scheduling_returns_completion_date(joint_model):
+    timeslot_list = [Timeslot(duration=60 * ((i % 3) + 1)) for i in range(30)]
+    or_list = [OperatingRoom(id=f"o{i}", properties=[]) for i in range(4)]
+    starting_day = datetime.date(2023, 1, 1)
+    completion_date = perform_preliminary_scheduling(
+        timeslot_list,
+        or_list,
+        SolverConfig(max_time_in_seconds=2.0),
+        joint_model=joint_model,
+        starting_day=starting_day,
+        target_horizon_days=14,
+    )
+    for room in or_list:
+        room.schedule_timeslots_to_days(starting_day)
+    assert completion_date == max(day for room in or_list for day in room.schedule)
+    assert completion_date <= datetime.date(2023, 1, 14)
@@ -0,0 +1,136 @@
+import datetime
+import random
+import threading
+
+from operank_scheduling.algo.patient_assignment import suggest_feasible_dates
+from operank_scheduling.algo.surgery_distribution_models import (
+    distribute_timeslots_to_days,
+    greedy_surgery_to_room,
+)
+from operank_scheduling.gui.suggestion_prefetch import SuggestionPrefetcher
+from operank_scheduling.models.operank_models import (
+    OperatingRoom,
+    Patient,
+    SchedulingContext,
+    Surgeon,
+    Surgery,
+    Timeslot,
+    schedule_patient_to_timeslot,
+)
+
+
+def create_context(rng: random.Random) -> SchedulingContext:
+    patients, surgeries = list(), list()
+    for uuid in range(12):
+        duration = rng.choice([45, 90, 150])
+        patient = Patient(
+            name=f"Patient {uuid}",
+            patient_id=str(uuid),
+            surgery_name="a",
+            referrer="a",
+            estimated_duration_m=duration,
+            priority=1,
+            phone_number="050-1234567",
+            uuid=uuid,
+        )
+        # Team A works in o1 and team B in o2, so their suggestions never overlap
+        team, requirement = rng.choice([("A", "laser"), ("B", "robot")])
+        surgery = Surgery(
+            name=f"surgery {team}",
+            duration_in_minutes=duration,
+            uuid=uuid,
+            patient=patient,
+            requirements=[requirement],
+        )
+        surgery.suitable_teams = [team]
+        patients.append(patient)
+        surgeries.append(surgery)
+
+    rooms = [
+        OperatingRoom(id="o1", properties=["laser"]),
+        OperatingRoom(id="o2", properties=["robot"]),
+    ]
+    greedy_surgery_to_room([Timeslot(60 * rng.randint(1, 3)) for _ in range(16)], rooms)
+    distribute_timeslots_to_days(rooms)
+    for room in rooms:
+        room.schedule_timeslots_to_days(datetime.date(2023, 1, 1))
+
+    surgeons = [
+        Surgeon(name=f"Dr. {team}", surgeon_id=idx, ward=1, team=team)
+        for idx, team in enumerate(["A", "B"])
+    ]
+    for surgeon in surgeons:
+        for day in {day for room in rooms for day in room.schedule}:
+            surgeon.availability[day] = [
+                [datetime.time(hour=8), datetime.time(hour=16)]
+            ]
+    return SchedulingContext(patients, surgeries, surgeons, rooms)
+
+
+def test_prefetched_suggestions_stay_valid():
+    context = create_context(random.Random(0))
+    prefetcher = SuggestionPrefetcher(context, lookahead=len(context.patients))
+    prefetcher.prefetch(context.patients)
+    first_patient = context.patients[0]
+    suggestions = prefetcher.get(first_patient)
+    assert suggestions == suggest_feasible_dates(first_patient, context)
+    for patient in context.patients[1:]:
+        prefetcher.get(patient)
+    assert prefetcher.hits == len(context.patients)
+
+    cached_results = dict(prefetcher.results)
+    room, best_slot, timeslot, surgeon_name = suggestions[0]
+    with prefetcher.lock:
+        schedule_patient_to_timeslot(
+            first_patient, best_slot, timeslot, room, context, surgeon_name
+        )
+        prefetcher.discard(first_patient)
+        prefetcher.invalidate(room.id, best_slot.date(), surgeon_name)
+
+    assert first_patient.uuid not in prefetcher.results
+    assert 0 < len(prefetcher.results) < len(cached_results) - 1
+    for uuid, cached_suggestions in cached_results.items():
+        if uuid == first_patient.uuid:
+            continue
+        affected = any(
+            (cached_room.id, start_time.date()) == (room.id, best_slot.date())
+            or cached_surgeon == surgeon_name
+            for cached_room, start_time, _, cached_surgeon in cached_suggestions
+        )
+        assert (uuid in prefetcher.results) != affected
+        if affected:
+            continue
+        # Whatever was kept can still be booked
+        for cached_room, start_time, cached_timeslot, cached_surgeon in (
+            cached_suggestions
+        ):
+            assert cached_timeslot in cached_room.schedule[start_time.date()]
+            surgeon = context.get_surgeon_by_name(cached_surgeon)
+            assert surgeon.is_surgeon_available_at(
+                start_time, context.surgeries_by_uuid[uuid].duration
+            )
+    prefetcher.shutdown()
+
+
+def test_current_patient_skips_queued_searches():
+    context = create_context(random.Random(1))
+    prefetcher = SuggestionPrefetcher(context, lookahead=len(context.patients))
+    # Keep the worker busy, so every prefetched search stays queued
+    release_worker = threading.Event()
+    prefetcher.executor.submit(release_worker.wait)
+    prefetcher.prefetch(context.patients)
+
+    current_patient = context.patients[-1]
+    suggestions = prefetcher.get(current_patient)
+    assert suggestions == suggest_feasible_dates(current_patient, context)
+    assert prefetcher.entries[current_patient.uuid].done()
+    assert not any(
+        prefetcher.entries[patient.uuid].done() for patient in context.patients[:-1]
+    )
+
+    release_worker.set()
+    for patient in context.patients[:-1]:
+        prefetcher.entries[patient.uuid].result()
+    assert prefetcher.get(current_patient) == suggestions
+    assert prefetcher.hits == 2
+    prefetcher.shutdown()
@@ -0,0 +1,69 @@
+import datetime
+import random
+
+from operank_scheduling.models.operank_models import Surgeon, Surgery
+from operank_scheduling.models.surgeon_availability import surgeons_available_at
+
+
+def test_surgeon_availability_bits():
+    day = datetime.date(2023, 1, 1)
+    surgeon = Surgeon(name="Dr. A", surgeon_id=0, ward=1, team="A")
+    surgeon.availability[day] = [
+        [datetime.time(hour=8), datetime.time(hour=10)],
+        [datetime.time(hour=12), datetime.time(hour=16)],
+    ]
+    assert surgeon.availability[day] == [
+        [datetime.time(hour=8), datetime.time(hour=10)],
+        [datetime.time(hour=12), datetime.time(hour=16)],
+    ]
+    _, earliest_start = surgeon.get_earliest_open_timeslot(day, 180)
+    assert earliest_start == datetime.datetime(2023, 1, 1, 12)
+    assert surgeon.get_earliest_open_timeslot(day, 300) is None
+
+    # Only the start of a window counts
+    assert surgeon.is_surgeon_available_at(datetime.datetime(2023, 1, 1, 12), 240)
+    assert not surgeon.is_surgeon_available_at(datetime.datetime(2023, 1, 1, 13), 60)
+
+    surgery = Surgery(name="a", duration_in_minutes=90, uuid=0, patient=None)
+    surgeon.add_surgery(surgery, datetime.datetime(2023, 1, 1, 13))
+    assert surgeon.scheduled_operations == 1
+    assert surgeon.availability[day] == [
+        [datetime.time(hour=8), datetime.time(hour=10)],
+        [datetime.time(hour=12), datetime.time(hour=13)],
+        [datetime.time(hour=14, minute=30), datetime.time(hour=16)],
+    ]
+    # Overlapping the booked surgery
+    surgeon.add_surgery(surgery, datetime.datetime(2023, 1, 1, 12))
+    assert surgeon.scheduled_operations == 1
+
+
+def test_surgeons_available_at_matches_single_surgeon_queries():
+    rng = random.Random(0)
+    day = datetime.date(2023, 1, 1)
+    surgeons = [
+        Surgeon(name=f"Dr. {idx}", surgeon_id=idx, ward=1, team="A")
+        for idx in range(8)
+    ]
+    for surgeon in surgeons[1:]:
+        surgeon.availability[day] = [
+            [datetime.time(hour=8), datetime.time(hour=rng.choice([12, 16]))]
+        ]
+        for _ in range(3):
+            duration = rng.choice([30, 60])
+            surgery = Surgery(
+                name="a", duration_in_minutes=duration, uuid=0, patient=None
+            )
+            surgery_time = datetime.datetime(2023, 1, 1, rng.randint(8, 13))
+            surgeon.add_surgery(surgery, surgery_time)
+
+    for hour in range(7, 17):
+        for minute in [0, 30]:
+            start_time = datetime.datetime(2023, 1, 1, hour, minute)
+            for duration in [30, 60, 120]:
+                available = surgeons_available_at(surgeons, start_time, duration)
+                assert not available[0]
+                for surgeon, is_available in zip(surgeons[1:], available[1:]):
+                    assert is_available == (
+                        surgeon.is_surgeon_available_at(start_time, duration)
+                        is not None
+                    )